@@ -13,8 +13,9 @@ import src.features.build_features_and_labels as ft
 import src.visualization.exploratory_analysis as exp
 import src.models.testing as test
 import src.visualization.test_results as test_results
-from src.models.deployment import Deployer
+from src.models.deployment import Deployer, MultiSeriesDeployer
 import src.visualization.deployment_results as deploy_results
+from src.utils.timing import tracer
 
 #
 # parser = argparse.ArgumentParser()
@@ -31,24 +32,85 @@ process = 'deploy'
 
 # please choose between 'T10Y2Y' and 'T10Y3M'
 series_key = 'T10Y2Y'
+# series deployed side by side by the 'deploy_all' process
+series_keys = ['T10Y2Y', 'T10Y3M', 'T10Y1Y', 'T10Y6M', 'T10YFF']
+
+# set to 'float32' to fit the models on single-precision features, which
+# halves the memory of the feature matrix and of every scaled fold
+feature_dtype = 'float64'
+# set to True for the daily deploy to only score dates that are not in the
+# saved predictions, reusing the saved artifact, instead of re-running every test
+incremental = False
+# number of processes that draw the exploratory plots (1 draws them serially)
+exploratory_workers = 1
+
+# set to True to time every stage, and export a Chrome trace and a summary
+trace = False
+# set to True to also record memory per stage, and flag large DataFrame copies
+trace_memory = False
+
+
+def main():
+   """
+   Runs the chosen process. Worker processes (started by the 'deploy_all'
+   process) re-import this script on Windows, so it only runs when the
+   script is run directly, and the workers do not re-run it.
+   """
+   if trace or trace_memory:
+      tracer.enable(memory=trace_memory)
+
+   if process == 'backtest':
+      # the backtest needs the secondary features and 'Dates' column of the saved
+      # final dataset, which create_final_dataset does not build, so it is read
+      # once and handed to both stages
+      df = pd.read_json(path.data_final)
+      exploratory_analysis = exp.ExploratoryAnalysis()
+      exploratory_analysis.workers = exploratory_workers
+      explore_data = exploratory_analysis.explore_dataset(df)
+      backtester = test.Backtester()
+      backtester.feature_dtype = feature_dtype
+      prediction_store = backtester.run_test_procedures(df)
+      plot_backtest = test_results.TestResultPlots().plot_test_results(prediction_store)
+      backtester.writer.wait()
+
+   elif process == 'deploy':
+      data = mk.MakeDataset().get_all_data(series_key)
+      fd = ft.FinalizeDataset(data)
+      df = fd.create_final_dataset()
+      dd = Deployer(df)
+      dd.feature_dtype = feature_dtype
+      dd.incremental = incremental
+      dd.run_test_procedures()
+      # plot_deploy = deploy_results.TestResultPlots().plot_test_results()
+      result = pd.read_json(path.deployment_svm_test_results)
+      smoothed_prediction = deploy_results.TestResultPlots().update_smoothed_prediction(
+         result, 'Pred_{}'.format(dd.output_names[0]))
+
+   elif process == 'deploy_all':
+      data = mk.MakeDataset().get_all_series_data(series_keys)
+      fd = ft.FinalizeDataset(data)
+      df = fd.create_multi_series_dataset(series_keys)
+      multi_series_deployer = MultiSeriesDeployer(df, series_keys)
+      multi_series_deployer.feature_dtype = feature_dtype
+      multi_series_deployer.incremental = incremental
+      result = multi_series_deployer.run_test_procedures()
+
+   if trace:
+      tracer.export_chrome_trace(path.pipeline_trace)
+      summary = tracer.export_summary(path.pipeline_timing_summary)
+      print('\nTiming summary (trace saved to {}):'.format(path.pipeline_trace))
+      print(summary.to_string(index=False))
+
+   if trace_memory:
+      memory_summary = tracer.export_memory_report(path.pipeline_memory_summary,
+                                                   path.pipeline_memory_copies)
+      print('\nMemory summary (copies saved to {}):'.format(path.pipeline_memory_copies))
+      print(memory_summary.to_string(index=False))
+
+
+if __name__ == '__main__':
+   main()
 
-if process == 'backtest':
-   data = mk.MakeDataset().get_all_data(series_key)
-   fd = ft.FinalizeDataset(data)
-   df = fd.create_final_dataset()
-   explore_data = exp.ExploratoryAnalysis().explore_dataset()
-   backtest = test.Backtester().run_test_procedures()
-   plot_backtest = test_results.TestResultPlots().plot_test_results()
-    
-elif process == 'deploy':
-   data = mk.MakeDataset().get_all_data(series_key)
-   fd = ft.FinalizeDataset(data)
-   df = fd.create_final_dataset()
-   dd = Deployer(df)
-   dd.run_test_procedures()
-   # plot_deploy = deploy_results.TestResultPlots().plot_test_results()
-   result = pd.read_json(path.deployment_svm_test_results)
-   
 
 #MIT License
 #
@@ -21,6 +21,8 @@ data_secondary = (str(os.getcwd()) +
 data_secondary_most_recent = (str(os.getcwd()) +
                               '\\data\\interim\\secondary_dataset_most_recent.json')
 data_final = (str(os.getcwd()) + '\\data\\processed\\final_dataset.csv')
+exploratory_correlations = (str(os.getcwd()) +
+                            '\\data\\processed\\exploratory_correlations.json')
 exploratory_plots = (str(os.getcwd()) + '\\reports\\figures\\exploratory.pdf')
 test_results_plots = (str(os.getcwd()) + '\\reports\\figures\\test_results.pdf')
 deployment_results_plots = (str(os.getcwd()) + '\\reports\\figures\\deployment_results.pdf')
@@ -30,8 +32,10 @@ pred_model_metadata = (str(os.getcwd()) +
                        '\\models\\model_metadata\\pred_metadata.json')
 prediction_errors = (str(os.getcwd()) +
                      '\\models\\model_metadata\\prediction_errors.json')
-full_predictions = (str(os.getcwd()) +
-                    '\\models\\model_metadata\\full_predictions.json')
+prediction_store = (str(os.getcwd()) +
+                    '\\models\\model_metadata\\prediction_store')
+gp_kernel_cache = (str(os.getcwd()) +
+                   '\\models\\model_metadata\\gp_kernel_cache.json')
 knn_test_results = (str(os.getcwd()) +
                     '\\models\\testing_data\\knn_test_results.json')
 elastic_net_test_results = (str(os.getcwd()) +
@@ -54,7 +58,17 @@ deployment_full_predictions = (str(os.getcwd()) +
                                '\\models\\model_metadata\\deployment_full_predictions.json')
 deployment_svm_test_results = (str(os.getcwd()) +
                                '\\models\\testing_data\\deployment_svm_test_results.json')
+deployment_multi_series_results = (str(os.getcwd()) +
+                                   '\\models\\testing_data\\deployment_multi_series_results.json')
 deployment_chart_data = (str(os.getcwd()) + '\\reports\\deployment_chart.csv')
+deployment_artifacts = (str(os.getcwd()) + '\\models\\deployment_artifacts')
+deployment_smoother_state = (str(os.getcwd()) +
+                             '\\models\\model_metadata\\deployment_smoother_state.json')
+pipeline_trace = (str(os.getcwd()) + '\\reports\\pipeline_trace.json')
+pipeline_timing_summary = (str(os.getcwd()) + '\\reports\\pipeline_timing_summary.csv')
+pipeline_memory_summary = (str(os.getcwd()) + '\\reports\\pipeline_memory_summary.csv')
+pipeline_memory_copies = (str(os.getcwd()) + '\\reports\\pipeline_memory_copies.csv')
+benchmark_results = (str(os.getcwd()) + '\\reports\\benchmark_results.json')
 
 #MIT License
 #
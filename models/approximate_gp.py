@@ -0,0 +1,157 @@
+"""
+This module runs a low-rank (Nystroem) approximation of a Gaussian Process
+classifier, for training histories too long for the exact model.
+"""
+import numpy as np
+
+
+class NystroemGaussianProcessClassifier:
+    """
+    Approximates sklearn's GaussianProcessClassifier with a rank-m Nystroem
+    feature map. Kernel hyperparameters are learned by an exact fit on m
+    inducing points, after which the Laplace approximation is solved in the
+    m-dimensional feature space. Time is O(n * m^2) and memory O(n * m),
+    instead of O(n^3) and O(n^2).
+    """
+
+
+    def __init__(self, kernel, rank=500, optimizer='fmin_l_bfgs_b',
+                 max_iter_predict=100, random_state=123):
+        """
+        kernel: an sklearn Gaussian Process kernel, with hyperparameter bounds
+
+        rank: number of inducing points (the rank of the approximation)
+
+        optimizer: kernel optimiser, passed to the exact fit on the inducing
+        points
+
+        max_iter_predict: passed to the exact fit on the inducing points
+
+        random_state: random seed for choosing the inducing points
+        """
+        self.kernel = kernel
+        self.rank = rank
+        self.optimizer = optimizer
+        self.max_iter_predict = max_iter_predict
+        self.random_state = random_state
+        self.kernel_ = None
+        self.classes_ = []
+        self.inducing_points = None
+        self.feature_map = None
+        self.weights = None
+        self.weights_covariance = None
+
+
+    def choose_inducing_points(self, X, y):
+        """
+        Chooses a class-stratified random sample of "rank" training rows.
+
+        X: array, scaled training features
+
+        y: array, training labels
+        """
+        random_state = np.random.RandomState(self.random_state)
+        if len(X) <= self.rank:
+            return(np.arange(len(X)))
+        indices = []
+        for label in self.classes_:
+            label_indices = np.flatnonzero(y == label)
+            sample_size = max(1, int(round(self.rank * len(label_indices) / len(X))))
+            indices.append(random_state.choice(label_indices,
+                                               size=min(sample_size, len(label_indices)),
+                                               replace=False))
+        return(np.sort(np.concatenate(indices)))
+
+
+    def transform(self, X):
+        """
+        Maps features into the Nystroem feature space, so that
+        transform(X) @ transform(Y).T approximates kernel_(X, Y).
+
+        X: array, scaled features
+        """
+        return(self.kernel_(X, self.inducing_points) @ self.feature_map)
+
+
+    def fit(self, X, y):
+        """
+        Learns kernel hyperparameters on the inducing points, then fits the
+        approximate model on every training row.
+
+        X: array, scaled training features
+
+        y: iterable, training labels
+        """
+        from scipy.linalg import eigh
+        from sklearn.gaussian_process import GaussianProcessClassifier
+        from sklearn.linear_model import LogisticRegression
+
+        X = np.asarray(X)
+        y = np.asarray(y)
+        self.classes_ = np.unique(y)
+        inducing_indices = self.choose_inducing_points(X, y)
+        self.inducing_points = X[inducing_indices]
+        inducing_gauss = GaussianProcessClassifier(kernel=self.kernel,
+                                                   optimizer=self.optimizer,
+                                                   max_iter_predict=self.max_iter_predict,
+                                                   random_state=self.random_state)
+        inducing_gauss.fit(X=self.inducing_points, y=y[inducing_indices])
+        self.kernel_ = inducing_gauss.kernel_
+
+        eigenvalues, eigenvectors = eigh(self.kernel_(self.inducing_points))
+        keep = eigenvalues > 1e-10 * eigenvalues.max()
+        self.feature_map = eigenvectors[:, keep] / np.sqrt(eigenvalues[keep])
+        features = self.transform(X)
+
+        # a unit Gaussian prior on the feature weights is the same as a GP
+        # prior with the approximate kernel, so the (L2, C=1) logistic
+        # regression solution is the Laplace approximation's posterior mode
+        logistic = LogisticRegression(C=1.0, fit_intercept=False,
+                                      solver='lbfgs', max_iter=1000)
+        logistic.fit(features, y == self.classes_[1])
+        self.weights = logistic.coef_[0]
+        latent = features @ self.weights
+        pi = 1 / (1 + np.exp(-latent))
+        precision = (features.T * (pi * (1 - pi))) @ features
+        precision[np.diag_indices_from(precision)] += 1
+        self.weights_covariance = np.linalg.inv(precision)
+        return(self)
+
+
+    def predict_proba(self, X):
+        """
+        Returns an (n_samples, 2) array of class probabilities, averaging the
+        sigmoid over the approximate posterior of the latent function
+        (as GaussianProcessClassifier does).
+
+        X: array, scaled features
+        """
+        features = self.transform(np.asarray(X))
+        latent_mean = features @ self.weights
+        latent_variance = np.einsum('ij,jk,ik->i', features,
+                                    self.weights_covariance, features)
+        kappa = 1 / np.sqrt(1 + np.pi * latent_variance / 8)
+        positive_probs = 1 / (1 + np.exp(-kappa * latent_mean))
+        return(np.column_stack([1 - positive_probs, positive_probs]))
+
+#MIT License
+#
+#Copyright (c) 2019 Terrence Zhang
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
\ No newline at end of file
@@ -0,0 +1,175 @@
+"""
+This module calibrates Support Vector Machine scores into probabilities.
+"""
+import numpy as np
+
+
+def fit_sigmoid(scores, y):
+    """
+    Fits Platt's sigmoid P(y=1 | s) = 1 / (1 + exp(-(a * s + b))) to decision
+    scores in a single vectorized optimisation. Returns (a, b).
+
+    scores: array, decision_function scores
+
+    y: array of booleans, True for the positive class
+    """
+    from scipy.optimize import minimize
+
+    scores = np.asarray(scores, dtype=float)
+    y = np.asarray(y, dtype=bool)
+    positive_count = y.sum()
+    negative_count = len(y) - positive_count
+    # Platt's smoothed targets, which keep the fit finite when the classes
+    # are perfectly separated (or when only one class is present)
+    targets = np.where(y, (positive_count + 1) / (positive_count + 2),
+                       1 / (negative_count + 2))
+
+    def objective(params):
+        logits = params[0] * scores + params[1]
+        loss = np.sum(np.logaddexp(0, logits) - targets * logits)
+        residuals = 1 / (1 + np.exp(-logits)) - targets
+        gradient = np.array([np.dot(residuals, scores), residuals.sum()])
+        return(loss, gradient)
+
+    initial_b = np.log((positive_count + 1) / (negative_count + 1))
+    result = minimize(objective, x0=np.array([0.0, initial_b]), jac=True,
+                      method='BFGS')
+    return(result.x[0], result.x[1])
+
+
+def get_calibration_cutoff(y, holdout_fraction, max_holdout_fraction=0.5):
+    """
+    Returns the first row of the calibration hold-out: the latest cut-off
+    that holds out at least "holdout_fraction" of the rows, and leaves both
+    classes on either side of it. The hold-out is grown, up to
+    "max_holdout_fraction" of the rows, to reach back to the last instance of
+    the rarer class. Returns len(y) when no such cut-off exists, to calibrate
+    on the training scores themselves.
+
+    y: array, training labels in chronological order
+
+    holdout_fraction, max_holdout_fraction: shares of the rows
+    """
+    classes = np.unique(y)
+    if len(classes) < 2:
+        return(len(y))
+    first_rows = [np.argmax(y == label) for label in classes]
+    last_rows = [len(y) - 1 - np.argmax(y[::-1] == label) for label in classes]
+    cutoff = int(round(len(y) * (1 - holdout_fraction)))
+    # the hold-out holds both classes up to the earliest of their last rows,
+    # and the SVM's rows hold both classes from the latest of their first rows
+    cutoff = min(cutoff, min(last_rows))
+    if cutoff <= max(first_rows) or cutoff < len(y) * (1 - max_holdout_fraction):
+        return(len(y))
+    return(cutoff)
+
+
+class CalibratedSVC:
+    """
+    An RBF Support Vector Machine that is fit once, and whose decision_function
+    scores are mapped to probabilities by a sigmoid or isotonic fit on a
+    held-out tail of the (chronologically ordered) training window.
+
+    This replaces SVC(probability=True), which re-fits the SVM five more times
+    for libsvm's internal Platt scaling.
+
+    Probabilities are never exactly 0 or 1: isotonic ones are bounded by
+    Platt's smoothed targets (1 / (negatives + 2) at the low end), so that a
+    log-loss grid search ranks hyperparameters on the SVM's scores rather
+    than on clipping penalties.
+    """
+
+
+    def __init__(self, method='sigmoid', holdout_fraction=0.2, **svc_params):
+        """
+        method: 'sigmoid' or 'isotonic'
+
+        holdout_fraction: share of the most recent training rows held out to
+        fit the calibration
+
+        svc_params: keyword arguments passed on to sklearn's SVC
+        """
+        if method not in ('sigmoid', 'isotonic'):
+            raise ValueError('Unknown calibration method: {}'.format(method))
+        self.method = method
+        self.holdout_fraction = holdout_fraction
+        self.svc_params = svc_params
+        self.svc = None
+        self.calibrator = None
+        self.classes_ = []
+        self.support_ = []
+
+
+    def fit(self, X, y):
+        """
+        Fits the SVM on the earlier training rows, then fits the calibration
+        on the held-out later rows (see get_calibration_cutoff).
+
+        X: array, scaled training features in chronological order
+
+        y: iterable, training labels
+        """
+        from sklearn.svm import SVC
+        from sklearn.isotonic import IsotonicRegression
+
+        X = np.asarray(X)
+        y = np.asarray(y)
+        cutoff = get_calibration_cutoff(y, self.holdout_fraction)
+
+        self.svc = SVC(probability=False, **self.svc_params)
+        self.svc.fit(X=X[:cutoff], y=y[:cutoff])
+        self.classes_ = self.svc.classes_
+        self.support_ = self.svc.support_
+
+        calibration_x = X[cutoff:] if cutoff < len(X) else X
+        calibration_y = y[cutoff:] if cutoff < len(X) else y
+        scores = self.svc.decision_function(calibration_x)
+        is_positive = calibration_y == self.classes_[1]
+        if self.method == 'sigmoid':
+            self.calibrator = fit_sigmoid(scores, is_positive)
+        else:
+            positive_count = is_positive.sum()
+            negative_count = len(is_positive) - positive_count
+            self.calibrator = IsotonicRegression(y_min=1 / (negative_count + 2),
+                                                 y_max=(positive_count + 1) / (positive_count + 2),
+                                                 out_of_bounds='clip')
+            self.calibrator.fit(scores, is_positive.astype(float))
+        return(self)
+
+
+    def predict_proba(self, X):
+        """
+        Returns an (n_samples, 2) array of class probabilities, in the same
+        layout as SVC.predict_proba.
+
+        X: array, scaled features
+        """
+        scores = self.svc.decision_function(X)
+        if self.method == 'sigmoid':
+            a, b = self.calibrator
+            positive_probs = 1 / (1 + np.exp(-(a * scores + b)))
+        else:
+            positive_probs = self.calibrator.predict(scores)
+        return(np.column_stack([1 - positive_probs, positive_probs]))
+
+#MIT License
+#
+#Copyright (c) 2019 Terrence Zhang
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
\ No newline at end of file
@@ -0,0 +1,181 @@
+"""
+This module scores what-if scenarios (paths of future feature values) with
+the deployed SVM, without refitting it.
+"""
+import os
+import numpy as np
+import pandas as pd
+
+import RecessionPredictor_paths as path
+from src.models.deployment import get_artifact_paths, get_series_feature_names
+
+
+class ScenarioScorer:
+    """
+    Scores a (scenarios x days) array of feature paths through the deployed
+    model's fitted scaler and SVM, in chunks, and summarizes the resulting
+    probabilities as fan quantiles.
+    """
+    
+    
+    def __init__(self, scaler=None, model=None):
+        """
+        scaler, model: the deployed model's fitted scaler and SVM. When not
+        given, they are loaded from a deployment artifact by load_artifact
+        
+        output_name: the deployed output whose model is used
+        
+        series_key: the deployed series whose artifact load_artifact reads,
+        as given to Deployer (None for the default series)
+        
+        chunk_size: number of (scenario, day) values scored per batch, which
+        bounds memory regardless of the number of scenarios
+        
+        quantiles: quantiles of the probability fan
+        """
+        self.scaler = scaler
+        self.model = model
+        self.output_name = 'Recession_in_12mo'
+        self.series_key = None
+        self.chunk_size = 100000
+        self.quantiles = [0.05, 0.25, 0.5, 0.75, 0.95]
+    
+    
+    def load_artifact(self, artifact_path=None):
+        """
+        Loads the fitted scaler and SVM from a deployment artifact.
+        
+        artifact_path: string, the artifact to load. Defaults to the most
+        recently written artifact of the series that was fitted on the
+        series' features
+        """
+        import joblib
+        
+        if artifact_path is not None:
+            artifact = joblib.load(artifact_path)
+        else:
+            feature_names = get_series_feature_names(self.series_key)
+            for artifact_path in get_artifact_paths(self.series_key):
+                artifact = joblib.load(artifact_path)
+                if artifact.get('Feature Names') == feature_names:
+                    break
+            else:
+                raise LookupError('No deployment artifact for series {} in {}'.format(
+                                  self.series_key, path.deployment_artifacts))
+        fitted_svm = artifact['Fitted Models'][self.output_name]['SVM']
+        self.scaler = fitted_svm['Scaler']
+        self.model = fitted_svm['Model']
+    
+    
+    def constant_paths(self, value, day_count, scenario_count=1):
+        """
+        Returns paths that hold one value for every day, e.g. a spread that
+        stays inverted at -0.5.
+        
+        value: float, the value to hold
+        
+        day_count: int, number of days in each path
+        
+        scenario_count: int, number of (identical) paths
+        """
+        return(np.full((scenario_count, day_count), float(value)))
+    
+    
+    def block_bootstrap_paths(self, history, scenario_count, day_count,
+                              block_length=20, start_value=None,
+                              random_state=123):
+        """
+        Generates paths by resampling blocks of consecutive historical
+        changes (which keeps their short-term autocorrelation), in one
+        vectorized pass.
+        
+        history: iterable, historical values in chronological order
+        
+        scenario_count: int, number of paths
+        
+        day_count: int, number of days in each path
+        
+        block_length: int, number of consecutive changes in each block
+        
+        start_value: float, where every path starts. Defaults to the last
+        historical value
+        
+        random_state: int, the random seed
+        """
+        history = np.asarray(history, dtype=float)
+        changes = np.diff(history)
+        block_length = min(block_length, len(changes))
+        if start_value is None:
+            start_value = history[-1]
+        random_state = np.random.RandomState(random_state)
+        block_count = -(-day_count // block_length)
+        block_starts = random_state.randint(0, len(changes) - block_length + 1,
+                                            size=(scenario_count, block_count))
+        change_indices = (block_starts[:, :, None]
+                          + np.arange(block_length)[None, None, :])
+        change_indices = change_indices.reshape(scenario_count, -1)[:, :day_count]
+        return(start_value + np.cumsum(changes[change_indices], axis=1))
+    
+    
+    def score_paths(self, paths):
+        """
+        Returns the positive class probability for every (scenario, day), as
+        a (scenarios x days) array. Scored in chunks of "chunk_size" values.
+        
+        paths: (scenarios x days) array of feature values, or a
+        (scenarios x days x features) array for several features
+        """
+        if self.model is None:
+            self.load_artifact()
+        paths = np.asarray(paths, dtype=float)
+        feature_count = self.scaler.mean_.shape[0]
+        values = paths.reshape(-1, feature_count)
+        probabilities = np.empty(len(values))
+        for chunk_start in range(0, len(values), self.chunk_size):
+            chunk = values[chunk_start: chunk_start + self.chunk_size]
+            probabilities[chunk_start: chunk_start + len(chunk)] = (
+                self.model.predict_proba(self.scaler.transform(chunk))[:, 1])
+        return(probabilities.reshape(paths.shape[:2]))
+    
+    
+    def get_fan_quantiles(self, probabilities):
+        """
+        Returns a dataframe of the probability quantiles across scenarios,
+        with one row per day and one column per quantile.
+        
+        probabilities: (scenarios x days) array, as returned by score_paths
+        """
+        fan = np.quantile(probabilities, self.quantiles, axis=0).T
+        return(pd.DataFrame(fan, columns=self.quantiles,
+                            index=pd.RangeIndex(1, fan.shape[0] + 1, name='Day')))
+    
+    
+    def run_scenarios(self, paths):
+        """
+        Scores the paths, and returns their probability fan quantiles.
+        
+        paths: see score_paths
+        """
+        return(self.get_fan_quantiles(self.score_paths(paths)))
+
+#MIT License
+#
+#Copyright (c) 2019 Terrence Zhang
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
\ No newline at end of file
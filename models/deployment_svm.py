@@ -2,9 +2,11 @@
 This module runs a deployment version of an SVM model.
 """
 import pandas as pd
-from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import log_loss
 
+from src.utils.timing import span
+from models.feature_store import get_model_scaler, get_model_store
+
 
 class SupportVectorMachine:
     """
@@ -16,6 +18,25 @@ class SupportVectorMachine:
         C_range: range of of C values to use during grid-search
         
         gamma_range: range of gamma values to use during grid-search
+        
+        calibration_method: how SVM scores become probabilities. 'libsvm'
+        (the reference) uses SVC's internal 5-fold Platt scaling, while
+        'sigmoid' and 'isotonic' fit the SVM once and calibrate its
+        decision_function scores on a held-out tail of the training window
+        
+        calibration_holdout: share of the training window held out for
+        'sigmoid' and 'isotonic' calibration
+        
+        prefix_scaler: optional shared PrefixScaler, off which the scaling
+        parameters of every training window are read. When none is
+        provided, one is fit on the feature store on first use
+        
+        feature_store: optional shared FeatureStore of the final dataset.
+        When none is provided, one is built from "full_df" on first use
+        
+        fitted_scaler, fitted_model: the scaler and SVM fit by
+        run_svm_prediction. When both are provided (e.g. loaded from a
+        deployment artifact), prediction reuses them instead of refitting
         """
         self.cv_params = {}
         self.cv_start = ''
@@ -26,6 +47,8 @@ class SupportVectorMachine:
         self.training_y = pd.DataFrame()
         self.testing_y = pd.DataFrame()
         self.full_df = pd.DataFrame()
+        self.prefix_scaler = None
+        self.feature_store = None
         self.log_loss_weights = []
         self.feature_names = []
         self.svm_optimal_params = {}
@@ -43,6 +66,10 @@ class SupportVectorMachine:
         self.gamma_range = []
         self.metadata = {}
         self.support_vector_count_as_percent = -1
+        self.calibration_method = 'libsvm'
+        self.calibration_holdout = 0.2
+        self.fitted_scaler = None
+        self.fitted_model = None
 
     def calculate_log_loss_weights(self):
         """
@@ -62,71 +89,88 @@ class SupportVectorMachine:
         for sample in self.testing_y:
             self.log_loss_weights.append(class_weights[str(sample)])
 
-    def get_cv_indices(self):
+    def get_fitted_scaler(self, training_stop):
         """
-        Gets indices for rows to be used during cross-validation.
+        Returns a StandardScaler fit on the training rows (those before
+        "training_stop"), read off the prefix scaler.
+        
+        training_stop: int, index of the first row after the training window
         """
-        if self.full_df['date'][0] > self.full_df['date'][len(self.full_df) - 1]:
-            self.full_df = self.full_df[::-1]
-        date_condition = ((self.full_df['date'] <= self.cv_end) &
-                          (self.full_df['date'] >= self.cv_start))
-        self.cv_indices = list(self.full_df[date_condition].index)
+        return(get_model_scaler(self, 'date').get_scaler(training_stop))
 
-    def run_svm_cv(self):
+    def build_svm(self, C, gamma, random_state):
         """
-        Runs cross-validation by grid-searching through C and gamma values.
+        Creates an (unfitted) RBF SVM that outputs probabilities using the
+        chosen calibration method.
+        
+        C: float, the C value
+        
+        gamma: float, the gamma value
+        
+        random_state: int, the random seed
         """
         from sklearn.svm import SVC
+        from models.calibration import CalibratedSVC
         
+        svc_params = {'C': C, 'kernel': 'rbf', 'gamma': gamma, 'tol': 1e-3,
+                      'random_state': random_state,
+                      'class_weight': 'balanced'}
+        if self.calibration_method == 'libsvm':
+            return(SVC(probability=True, **svc_params))
+        return(CalibratedSVC(method=self.calibration_method,
+                             holdout_fraction=self.calibration_holdout,
+                             **svc_params))
+
+    def run_svm_cv(self):
+        """
+        Runs cross-validation by grid-searching through C and gamma values.
+        """
         default_gamma = 1 / len(self.feature_names)
         self.gamma_range = [multiplier * default_gamma
                             for multiplier in [0.25]]
         for C in self.C_range:
             for gamma in self.gamma_range:
-                all_predicted_probs = pd.DataFrame()
-                all_testing_y = pd.Series()
-                dates = list()
-                self.log_loss_weights = []
-                for test_name in range(1, self.test_name + 1):
-                    self.cv_start = self.cv_params[test_name]['cv_start']
-                    self.cv_end = self.cv_params[test_name]['cv_end']
-                    self.get_cv_indices()
-                    training_x = self.full_df.loc[: (self.cv_indices[0] - 1),
-                                                  self.feature_names]
-                    self.training_y = self.full_df.loc[: (self.cv_indices[0] - 1),
-                                                       self.output_name]
-                    scaler = StandardScaler()
-                    scaler.fit(training_x)
-                    training_x_scaled = scaler.transform(training_x)
-                    svm = SVC(C=C, kernel='rbf', gamma=gamma, probability=True,
-                              tol=1e-3, random_state=123,
-                              class_weight='balanced')
-                    svm.fit(X=training_x_scaled, y=self.training_y)
-                    svm_count = len(svm.support_) / len(training_x_scaled)
-                    testing_x = self.full_df[self.feature_names].loc[self.cv_indices]
-                    testing_x_scaled = scaler.transform(testing_x)
-                    self.testing_y = self.full_df[self.output_name].loc[self.cv_indices]
-                    self.calculate_log_loss_weights()
+                with span('SVM', 'grid point', C=C, gamma=gamma):
+                    all_predicted_probs = pd.DataFrame()
+                    all_testing_y = pd.Series()
+                    dates = list()
+                    self.log_loss_weights = []
+                    for test_name in range(1, self.test_name + 1):
+                        self.cv_start = self.cv_params[test_name]['cv_start']
+                        self.cv_end = self.cv_params[test_name]['cv_end']
+                        self.cv_indices = get_model_store(self, 'date').get_indices(self.cv_start, self.cv_end)
+                        self.training_y = self.feature_store.get_labels(self.output_name, 0,
+                                                                        self.cv_indices[0])
+                        prefix_scaler = get_model_scaler(self, 'date')
+                        training_x_scaled, testing_x_scaled = prefix_scaler.scale_fold(self.cv_indices[0],
+                                                                                       self.cv_indices)
+                        svm = self.build_svm(C=C, gamma=gamma, random_state=123)
+                        svm.fit(X=training_x_scaled, y=self.training_y)
+                        svm_count = len(svm.support_) / len(training_x_scaled)
+                        self.testing_y = self.feature_store.get_labels(self.output_name, self.cv_indices[0],
+                                                                       self.cv_indices[-1] + 1)
+                        self.calculate_log_loss_weights()
                     
-                    predicted_probs = pd.DataFrame(svm.predict_proba(X=testing_x_scaled))
-                    all_predicted_probs = all_predicted_probs.append(predicted_probs,
-                                                                     ignore_index=True)
-                    all_testing_y = all_testing_y.append(self.testing_y)
-                    date_to_append = self.full_df['date'].loc[self.cv_indices].tolist()
-                    dates = dates.append(date_to_append)
+                        predicted_probs = pd.DataFrame(svm.predict_proba(X=testing_x_scaled))
+                        all_predicted_probs = all_predicted_probs.append(predicted_probs,
+                                                                         ignore_index=True)
+                        all_testing_y = all_testing_y.append(self.testing_y)
+                        date_to_append = self.feature_store.get_dates(self.cv_indices[0],
+                                                                      self.cv_indices[-1] + 1)
+                        dates = dates.append(date_to_append)
                         
-                log_loss_score = log_loss(y_true=all_testing_y,
-                                          y_pred=all_predicted_probs,
-                                          sample_weight=self.log_loss_weights)
-                if log_loss_score < self.best_cv_score:
-                    self.best_cv_score = log_loss_score
-                    self.optimal_C = C
-                    self.optimal_gamma = gamma
-                    self.support_vector_count_as_percent = round(svm_count, 3)
+                    log_loss_score = log_loss(y_true=all_testing_y,
+                                              y_pred=all_predicted_probs,
+                                              sample_weight=self.log_loss_weights)
+                    if log_loss_score < self.best_cv_score:
+                        self.best_cv_score = log_loss_score
+                        self.optimal_C = C
+                        self.optimal_gamma = gamma
+                        self.support_vector_count_as_percent = round(svm_count, 3)
 
-                    self.svm_cv_predictions['date'] = dates
-                    self.svm_cv_predictions['True'] = all_testing_y.to_list()
-                    self.svm_cv_predictions['Predicted'] = all_predicted_probs[1].to_list()
+                        self.svm_cv_predictions['date'] = dates
+                        self.svm_cv_predictions['True'] = all_testing_y.to_list()
+                        self.svm_cv_predictions['Predicted'] = all_predicted_probs[1].to_list()
             
         self.svm_optimal_params['C'] = self.optimal_C
         self.svm_optimal_params['Gamma'] = self.optimal_gamma
@@ -138,34 +182,39 @@ class SupportVectorMachine:
         """
         Performs prediction on the hold-out sample.
         """
-        from sklearn.svm import SVC
-        
         self.optimal_C = self.svm_optimal_params['C']
         self.optimal_gamma = self.svm_optimal_params['Gamma']
         all_predicted_probs = pd.DataFrame()
         all_testing_y = pd.Series()
         dates = []
-        training_x = self.full_df.loc[: (self.pred_indices[0] - 1),
-                                      self.feature_names]
-        self.training_y = self.full_df.loc[: (self.pred_indices[0] - 1),
-                                           self.output_name]
-        scaler = StandardScaler()
-        scaler.fit(training_x)
-        training_x_scaled = scaler.transform(training_x)
-        svm = SVC(C=self.optimal_C, kernel='rbf', gamma=self.optimal_gamma,
-                  probability=True, tol=1e-3, random_state=42,
-                  class_weight='balanced')
-        svm.fit(X=training_x_scaled, y=self.training_y)
-        self.support_vector_count_as_percent = len(svm.support_) / len(training_x_scaled)
+        self.feature_store = get_model_store(self, 'date')
+        if self.fitted_scaler is None or self.fitted_model is None:
+            self.training_y = self.feature_store.get_labels(self.output_name, 0,
+                                                            self.pred_indices[0])
+            prefix_scaler = get_model_scaler(self, 'date')
+            training_x_scaled, testing_x_scaled = prefix_scaler.scale_fold(self.pred_indices[0],
+                                                                           self.pred_indices)
+            svm = self.build_svm(C=self.optimal_C, gamma=self.optimal_gamma,
+                                 random_state=42)
+            svm.fit(X=training_x_scaled, y=self.training_y)
+            self.fitted_scaler = self.get_fitted_scaler(self.pred_indices[0])
+            self.fitted_model = svm
+        else:
+            svm = self.fitted_model
+            testing_x = self.feature_store.get_features(self.pred_indices[0],
+                                                        self.pred_indices[-1] + 1)
+            testing_x_scaled = self.fitted_scaler.transform(testing_x)
+        self.support_vector_count_as_percent = (len(svm.support_)
+            / self.fitted_scaler.n_samples_seen_)
 
-        testing_x = self.full_df[self.feature_names].loc[self.pred_indices]
-        testing_x_scaled = scaler.transform(testing_x)
-        self.testing_y = self.full_df[self.output_name].loc[self.pred_indices]
+        self.testing_y = self.feature_store.get_labels(self.output_name, self.pred_indices[0],
+                                                       self.pred_indices[-1] + 1)
         predicted_probs = pd.DataFrame(svm.predict_proba(X=testing_x_scaled))
         all_predicted_probs = all_predicted_probs.append(predicted_probs,
                                                          ignore_index=True)
         all_testing_y = all_testing_y.append(self.testing_y)
-        dates.extend(self.full_df['date'].loc[self.pred_indices])
+        dates.extend(self.feature_store.get_dates(self.pred_indices[0],
+                                                  self.pred_indices[-1] + 1))
         dates_out = list(map(lambda x: str(x), dates))
         self.svm_predictions['date'] = dates_out
         self.svm_predictions['True'] = all_testing_y.to_list()
@@ -2,9 +2,11 @@
 This module runs an Elastic Net model.
 """
 import pandas as pd
-from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import log_loss
 
+from src.utils.timing import span
+from models.feature_store import get_model_scaler, get_model_store
+
 
 class ElasticNet:
     """
@@ -17,6 +19,13 @@ class ElasticNet:
         alpha_range: range of alpha values to use during grid-search
         
         l1_ratio_range: range of l1_ratio values to use during grid-search
+        
+        prefix_scaler: optional shared PrefixScaler, off which the scaling
+        parameters of every training window are read. When none is
+        provided, one is fit on the feature store on first use
+        
+        feature_store: optional shared FeatureStore of the final dataset.
+        When none is provided, one is built from "full_df" on first use
         """
         self.cv_params = {}
         self.cv_start = ''
@@ -27,6 +36,8 @@ class ElasticNet:
         self.training_y = pd.DataFrame()
         self.testing_y = pd.DataFrame()
         self.full_df = pd.DataFrame()
+        self.prefix_scaler = None
+        self.feature_store = None
         self.log_loss_weights = []
         self.feature_names = []
         self.feature_dict = {}
@@ -71,19 +82,6 @@ class ElasticNet:
             self.log_loss_weights.append(class_weights[str(sample)])
 
 
-    def get_cv_indices(self):
-        """
-        Gets indices for rows to be used during cross-validation.
-        """
-        if self.full_df['Dates'][0] > self.full_df['Dates'][len(self.full_df) - 1]:
-            self.full_df = self.full_df[::-1]
-        self.full_df.reset_index(inplace=True)
-        self.full_df.drop('index', axis=1, inplace=True)
-        date_condition = ((self.full_df['Dates'] <= self.cv_end) &
-                          (self.full_df['Dates'] >= self.cv_start))
-        self.cv_indices = list(self.full_df[date_condition].index)
-
-
     def run_elastic_net_cv(self):
         """
         Runs cross-validation by grid-searching through alpha and l1_ratio values.
@@ -92,52 +90,51 @@ class ElasticNet:
         
         for alpha in self.alpha_range:
             for l1_ratio in self.l1_ratio_range:
-                all_predicted_probs = pd.DataFrame()
-                all_testing_y = pd.Series()
-                dates = []
-                self.log_loss_weights = []
-                for test_name in range(1, self.test_name + 1):
-                    self.cv_start = self.cv_params[test_name]['cv_start']
-                    self.cv_end = self.cv_params[test_name]['cv_end']
-                    self.get_cv_indices()
-                    training_x = self.full_df.loc[: (self.cv_indices[0] - 1),
-                                                  self.feature_names]
-                    self.training_y = self.full_df.loc[: (self.cv_indices[0] - 1),
-                                                       self.output_name]
-                    scaler = StandardScaler()
-                    scaler.fit(training_x)
-                    training_x_scaled = scaler.transform(training_x)
-                    testing_x = self.full_df[self.feature_names].loc[self.cv_indices]
-                    testing_x_scaled = scaler.transform(testing_x)
-                    elastic_net = SGDClassifier(loss='log', penalty='elasticnet',
-                                                alpha=alpha, l1_ratio=l1_ratio,
-                                                max_iter=1000, tol=1e-3,
-                                                random_state=123,
-                                                class_weight='balanced')
-                    elastic_net.fit(X=training_x_scaled, y=self.training_y)
+                with span('Elastic_Net', 'grid point', alpha=alpha, l1_ratio=l1_ratio):
+                    all_predicted_probs = pd.DataFrame()
+                    all_testing_y = pd.Series()
+                    dates = []
+                    self.log_loss_weights = []
+                    for test_name in range(1, self.test_name + 1):
+                        self.cv_start = self.cv_params[test_name]['cv_start']
+                        self.cv_end = self.cv_params[test_name]['cv_end']
+                        self.cv_indices = get_model_store(self).get_indices(self.cv_start, self.cv_end)
+                        self.training_y = self.feature_store.get_labels(self.output_name, 0,
+                                                                        self.cv_indices[0])
+                        prefix_scaler = get_model_scaler(self)
+                        training_x_scaled, testing_x_scaled = prefix_scaler.scale_fold(self.cv_indices[0],
+                                                                                       self.cv_indices)
+                        elastic_net = SGDClassifier(loss='log', penalty='elasticnet',
+                                                    alpha=alpha, l1_ratio=l1_ratio,
+                                                    max_iter=1000, tol=1e-3,
+                                                    random_state=123,
+                                                    class_weight='balanced')
+                        elastic_net.fit(X=training_x_scaled, y=self.training_y)
                     
-                    self.testing_y = self.full_df[self.output_name].loc[self.cv_indices]
-                    self.calculate_log_loss_weights()
+                        self.testing_y = self.feature_store.get_labels(self.output_name, self.cv_indices[0],
+                                                                       self.cv_indices[-1] + 1)
+                        self.calculate_log_loss_weights()
     
-                    coefficients = pd.DataFrame(elastic_net.coef_).T
-                    coefficients.rename(columns=self.feature_dict, inplace=True)
-                    predicted_probs = pd.DataFrame(elastic_net.predict_proba(X=testing_x_scaled))
-                    all_predicted_probs = all_predicted_probs.append(predicted_probs,
-                                                                     ignore_index=True)
-                    all_testing_y = all_testing_y.append(self.testing_y)   
-                    dates.extend(self.full_df['Dates'].loc[self.cv_indices])
+                        coefficients = pd.DataFrame(elastic_net.coef_).T
+                        coefficients.rename(columns=self.feature_dict, inplace=True)
+                        predicted_probs = pd.DataFrame(elastic_net.predict_proba(X=testing_x_scaled))
+                        all_predicted_probs = all_predicted_probs.append(predicted_probs,
+                                                                         ignore_index=True)
+                        all_testing_y = all_testing_y.append(self.testing_y)   
+                        dates.extend(self.feature_store.get_dates(self.cv_indices[0],
+                                                                  self.cv_indices[-1] + 1))
                     
-                log_loss_score = log_loss(y_true=all_testing_y,
-                                          y_pred=all_predicted_probs,
-                                          sample_weight=self.log_loss_weights)
-                if log_loss_score < self.best_cv_score:
-                    self.best_cv_score = log_loss_score
-                    self.optimal_alpha = alpha
-                    self.optimal_l1_ratio = l1_ratio
-                    self.coefficients = coefficients.to_dict()
-                    self.elastic_net_cv_predictions['Dates'] = dates
-                    self.elastic_net_cv_predictions['True'] = all_testing_y.to_list()
-                    self.elastic_net_cv_predictions['Predicted'] = all_predicted_probs[1].to_list()
+                    log_loss_score = log_loss(y_true=all_testing_y,
+                                              y_pred=all_predicted_probs,
+                                              sample_weight=self.log_loss_weights)
+                    if log_loss_score < self.best_cv_score:
+                        self.best_cv_score = log_loss_score
+                        self.optimal_alpha = alpha
+                        self.optimal_l1_ratio = l1_ratio
+                        self.coefficients = coefficients.to_dict()
+                        self.elastic_net_cv_predictions['Dates'] = dates
+                        self.elastic_net_cv_predictions['True'] = all_testing_y.to_list()
+                        self.elastic_net_cv_predictions['Predicted'] = all_predicted_probs[1].to_list()
             
         self.elastic_net_optimal_params['Alpha'] = self.optimal_alpha
         self.elastic_net_optimal_params['L1_Ratio'] = self.optimal_l1_ratio
@@ -157,13 +154,12 @@ class ElasticNet:
         all_testing_y = pd.Series()
         dates = []
         self.log_loss_weights = []
-        training_x = self.full_df.loc[: (self.pred_indices[0] - 1),
-                                      self.feature_names]
-        scaler = StandardScaler()
-        scaler.fit(training_x)
-        training_x_scaled = scaler.transform(training_x)
-        self.training_y = self.full_df.loc[: (self.pred_indices[0] - 1),
-                                           self.output_name]
+        prefix_scaler = get_model_scaler(self)
+        training_x_scaled, testing_x_scaled = prefix_scaler.scale_fold(self.cv_indices[0],
+                                                                       self.cv_indices)
+        self.feature_store = get_model_store(self)
+        self.training_y = self.feature_store.get_labels(self.output_name, 0,
+                                                        self.pred_indices[0])
         elastic_net = SGDClassifier(loss='log', penalty='elasticnet',
                                     alpha=self.optimal_alpha,
                                     l1_ratio=self.optimal_l1_ratio,
@@ -174,15 +170,15 @@ class ElasticNet:
         self.coefficients = pd.DataFrame(elastic_net.coef_).T
         self.coefficients.rename(columns=self.feature_dict, inplace=True)
 
-        testing_x = self.full_df[self.feature_names].loc[self.pred_indices]
-        testing_x_scaled = scaler.transform(testing_x)
-        self.testing_y = self.full_df[self.output_name].loc[self.pred_indices]
+        self.testing_y = self.feature_store.get_labels(self.output_name, self.pred_indices[0],
+                                                       self.pred_indices[-1] + 1)
         self.calculate_log_loss_weights()
         predicted_probs = pd.DataFrame(elastic_net.predict_proba(X=testing_x_scaled))
         all_predicted_probs = all_predicted_probs.append(predicted_probs,
                                                          ignore_index=True)
         all_testing_y = all_testing_y.append(self.testing_y)
-        dates.extend(self.full_df['Dates'].loc[self.pred_indices])
+        dates.extend(self.feature_store.get_dates(self.pred_indices[0],
+                                                  self.pred_indices[-1] + 1))
             
         self.elastic_net_pred_error = log_loss(y_true=all_testing_y,
                                                y_pred=all_predicted_probs,
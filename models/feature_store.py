@@ -0,0 +1,256 @@
+"""
+This module holds the final dataset as read-only arrays, which models and
+worker processes read by row range without copying or modifying it.
+"""
+import os
+import json
+import numpy as np
+import pandas as pd
+
+from models.prefix_scaler import PrefixScaler
+from src.utils.dates import get_window, to_datetime64
+
+
+class FeatureStore:
+    """
+    Features, labels and dates of the final dataset, in chronological order:
+    features are one contiguous (rows, features) float64 (or float32) matrix,
+    labels one (rows, outputs) int8 matrix, and dates one sorted
+    datetime64[D] array, in which any date window resolves to a range of rows
+    by binary search. Every array is read-only, and every getter returns a
+    view of a range of rows, so one store can be shared by every model, test
+    and thread. A store that was saved is memory-mapped on load,
+    and pickles as its directory, so worker processes map the same files
+    instead of receiving a copy.
+    """
+    
+    
+    def __init__(self):
+        """
+        feature_names, output_names: the labels of the feature and label
+        columns
+        
+        features, labels, dates: read-only arrays, one row per date
+        
+        date_strings: whether the dataframe's dates were 'YYYY-MM-DD'
+        strings, which "get_dates" then returns them as
+        
+        directory, mmap_mode: where and how the store was loaded, if it was
+        loaded from disk
+        """
+        self.feature_names = []
+        self.output_names = []
+        self.features = None
+        self.labels = None
+        self.dates = None
+        self.date_strings = False
+        self.directory = None
+        self.mmap_mode = None
+    
+    
+    def from_dataframe(self, df, feature_names, output_names, date_column='Dates',
+                       feature_dtype='float64'):
+        """
+        Builds the store from a dataframe in either date order. The dataframe
+        itself is left untouched.
+        
+        df: dataframe, the final dataset
+        
+        feature_names, output_names: names of the feature and label columns
+        
+        date_column: name of the date column
+        
+        feature_dtype: dtype of the feature matrix. 'float32' halves its
+        memory, at single precision
+        """
+        self.feature_names = list(feature_names)
+        self.output_names = list(output_names)
+        self.date_strings = not pd.api.types.is_datetime64_any_dtype(df[date_column])
+        dates = to_datetime64(df[date_column]).astype('datetime64[D]')
+        order = np.argsort(dates, kind='stable')
+        self.features = np.ascontiguousarray(df[self.feature_names].to_numpy(dtype=feature_dtype)[order])
+        self.labels = np.ascontiguousarray(df[self.output_names].to_numpy(dtype=np.int8)[order])
+        self.dates = dates[order]
+        for array in (self.features, self.labels, self.dates):
+            array.setflags(write=False)
+        return(self)
+    
+    
+    def save(self, directory):
+        """
+        Saves each array as a .npy file, plus the column labels as json.
+        
+        directory: string, where to save the store
+        """
+        os.makedirs(directory, exist_ok=True)
+        for name in ['features', 'labels', 'dates']:
+            np.save(os.path.join(directory, '{}.npy'.format(name)), getattr(self, name))
+        with open(os.path.join(directory, 'labels.json'), 'w') as file:
+            json.dump({'feature_names': self.feature_names,
+                       'output_names': self.output_names,
+                       'date_strings': self.date_strings}, file)
+    
+    
+    def load(self, directory, mmap_mode='r'):
+        """
+        Loads a store saved by "save". Arrays are memory-mapped read-only, so
+        processes that load the same store share its pages.
+        
+        directory: string, where the store was saved
+        
+        mmap_mode: passed to numpy.load (None reads arrays into memory)
+        """
+        with open(os.path.join(directory, 'labels.json'), 'r') as file:
+            labels = json.load(file)
+        self.feature_names = labels['feature_names']
+        self.output_names = labels['output_names']
+        self.date_strings = labels['date_strings']
+        for name in ['features', 'labels', 'dates']:
+            array = np.load(os.path.join(directory, '{}.npy'.format(name)), mmap_mode=mmap_mode)
+            array.setflags(write=False)
+            setattr(self, name, array)
+        self.directory = directory
+        self.mmap_mode = mmap_mode
+        return(self)
+    
+    
+    def __getstate__(self):
+        """
+        Pickles a memory-mapped store as its directory, so that sending it to
+        a worker process does not copy the arrays.
+        """
+        if self.directory is not None and self.mmap_mode is not None:
+            return({'directory': self.directory, 'mmap_mode': self.mmap_mode})
+        return(self.__dict__)
+    
+    
+    def __setstate__(self, state):
+        """
+        Restores a pickled store, memory-mapping it again if it was.
+        """
+        if 'features' not in state:
+            self.__init__()
+            self.load(state['directory'], state['mmap_mode'])
+            return
+        self.__dict__.update(state)
+        for array in (self.features, self.labels, self.dates):
+            array.setflags(write=False)
+    
+    
+    def get_row_count(self):
+        """
+        Returns the number of rows (dates).
+        """
+        return(len(self.dates))
+    
+    
+    def get_window(self, start=None, end=None):
+        """
+        Returns the (start, stop) rows of dates from "start" to "end",
+        inclusive, by binary search.
+        
+        start, end: dates ('YYYY-MM-DD' strings or timestamps), or None for
+        no bound
+        """
+        return(get_window(self.dates, start, end))
+    
+    
+    def get_indices(self, start, end):
+        """
+        Returns the row indices of dates from "start" to "end", inclusive, as
+        a range.
+        
+        start, end: dates ('YYYY-MM-DD' strings or timestamps)
+        """
+        return(range(*self.get_window(start, end)))
+    
+    
+    def get_features(self, start=0, stop=None):
+        """
+        Returns a read-only view of the features of rows [start, stop).
+        
+        start, stop: ints, the rows to read (stop=None reads to the end)
+        """
+        return(self.features[start:stop])
+    
+    
+    def get_labels(self, output_name, start=0, stop=None):
+        """
+        Returns the labels of one output for rows [start, stop), as a series
+        over a read-only view, indexed by row number.
+        
+        output_name: name of the output
+        
+        start, stop: ints, the rows to read (stop=None reads to the end)
+        """
+        labels = self.labels[start:stop, self.output_names.index(output_name)]
+        return(pd.Series(labels, index=pd.RangeIndex(start, start + len(labels)),
+                         name=output_name, copy=False))
+    
+    
+    def get_dates(self, start=0, stop=None):
+        """
+        Returns the dates of rows [start, stop) as a list, as they were in
+        the dataframe (strings, or timestamps for a datetime column).
+        
+        start, stop: ints, the rows to read (stop=None reads to the end)
+        """
+        dates = self.dates[start:stop]
+        if self.date_strings:
+            return(np.datetime_as_string(dates, unit='D').tolist())
+        return(list(pd.DatetimeIndex(dates)))
+
+
+def get_model_store(model, date_column='Dates'):
+    """
+    Returns a model's feature store: the shared one, when one was provided,
+    or else one built (once) from the model's "full_df", "feature_names" and
+    "output_name".
+    
+    model: a model with "feature_store", "full_df", "feature_names" and
+    "output_name" attributes
+    
+    date_column: name of the date column of "full_df"
+    """
+    if model.feature_store is None:
+        model.feature_store = FeatureStore().from_dataframe(model.full_df, model.feature_names,
+                                                            [model.output_name],
+                                                            date_column=date_column)
+    return(model.feature_store)
+
+
+def get_model_scaler(model, date_column='Dates'):
+    """
+    Returns a model's prefix scaler: the shared one, when one was provided,
+    or else one fit (once) on the model's feature store.
+    
+    model: a model, as for "get_model_store", with a "prefix_scaler" attribute
+    
+    date_column: name of the date column of "full_df"
+    """
+    if model.prefix_scaler is None:
+        model.prefix_scaler = PrefixScaler().fit(get_model_store(model, date_column).get_features())
+    return(model.prefix_scaler)
+        
+        
+#MIT License
+#
+#Copyright (c) 2019 Terrence Zhang
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
\ No newline at end of file
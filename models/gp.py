@@ -1,10 +1,14 @@
 """
 This module runs a Gaussian Process model.
 """
+import json
+import os
 import pandas as pd
-from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import log_loss
 
+import RecessionPredictor_paths as path
+from models.feature_store import get_model_scaler, get_model_store
+
 
 class GaussianProcess:
     """
@@ -13,6 +17,26 @@ class GaussianProcess:
 
     
     def __init__(self):
+        """
+        approximation_rank: None fits the exact Gaussian Process. An integer
+        fits a Nystroem approximation of that rank instead, which keeps
+        memory bounded by rank x training rows on long (e.g. daily) histories
+        
+        warm_start: whether to seed each fit's kernel optimiser with the
+        previous fit's length scale and alpha (or, for the first fit, with the
+        kernel cached by the last run for this output and feature set)
+        
+        kernel_max_iter: None runs the kernel optimiser to convergence. An
+        integer caps its L-BFGS iterations, which is usually enough when
+        warm-starting
+        
+        prefix_scaler: optional shared PrefixScaler, off which the scaling
+        parameters of every training window are read. When none is
+        provided, one is fit on the feature store on first use
+        
+        feature_store: optional shared FeatureStore of the final dataset.
+        When none is provided, one is built from "full_df" on first use
+        """
         self.cv_params = {}
         self.cv_start = ''
         self.cv_end = ''
@@ -22,6 +46,8 @@ class GaussianProcess:
         self.training_y = pd.DataFrame()
         self.testing_y = pd.DataFrame()
         self.full_df = pd.DataFrame()
+        self.prefix_scaler = None
+        self.feature_store = None
         self.log_loss_weights = []
         self.feature_names = []
         self.gauss_optimal_params = {}
@@ -34,6 +60,9 @@ class GaussianProcess:
         self.metadata = {}
         self.length_scale = -1
         self.alpha = -1
+        self.approximation_rank = None
+        self.warm_start = False
+        self.kernel_max_iter = None
 
 
     def calculate_log_loss_weights(self):
@@ -55,27 +84,103 @@ class GaussianProcess:
             self.log_loss_weights.append(class_weights[str(sample)])
         
     
-    def get_cv_indices(self):
+    def bounded_kernel_optimizer(self, obj_func, initial_theta, bounds):
         """
-        Gets indices for rows to be used during cross-validation.
+        L-BFGS kernel optimiser that stops after "kernel_max_iter" iterations.
+        Follows sklearn's optimizer(obj_func, initial_theta, bounds) interface.
         """
-        if self.full_df['Dates'][0] > self.full_df['Dates'][len(self.full_df) - 1]:
-            self.full_df = self.full_df[::-1]
-        self.full_df.reset_index(inplace=True)
-        self.full_df.drop('index', axis=1, inplace=True)
-        date_condition = ((self.full_df['Dates'] <= self.cv_end) &
-                          (self.full_df['Dates'] >= self.cv_start))
-        self.cv_indices = list(self.full_df[date_condition].index)
+        from scipy.optimize import minimize
+        
+        result = minimize(obj_func, initial_theta, method='L-BFGS-B',
+                          jac=True, bounds=bounds,
+                          options={'maxiter': self.kernel_max_iter})
+        return(result.x, result.fun)
     
     
-    def run_gauss_cv(self):
+    def get_kernel_cache_key(self):
         """
-        Runs cross-validation to generate cross-validation errors.
-        Hyperparameters are automatically tuned.
+        Key for this output and feature set in the kernel cache.
+        """
+        return('{}|{}'.format(self.output_name, ','.join(self.feature_names)))
+    
+    
+    def read_kernel_cache(self):
+        """
+        Returns the kernel cache, or an empty one if there is none or it
+        cannot be read.
+        """
+        try:
+            with open(path.gp_kernel_cache, 'r') as file:
+                return(json.load(file))
+        except (IOError, ValueError):
+            return({})
+    
+    
+    def load_cached_kernel(self):
+        """
+        Seeds length scale and alpha from the kernel cache, if this output and
+        feature set has been fit before.
+        """
+        cached_kernel = self.read_kernel_cache().get(self.get_kernel_cache_key())
+        if cached_kernel is not None:
+            self.length_scale = cached_kernel['Length Scale']
+            self.alpha = cached_kernel['Alpha']
+    
+    
+    def save_cached_kernel(self):
+        """
+        Saves the most recent length scale and alpha to the kernel cache. The
+        cache is written to a temporary file (one per process, so that runs
+        at the same time do not share it) that then replaces the cache, so
+        that an interrupted run never leaves a truncated cache.
+        """
+        kernel_cache = self.read_kernel_cache()
+        kernel_cache[self.get_kernel_cache_key()] = {'Length Scale': self.length_scale,
+                                                     'Alpha': self.alpha}
+        temporary_path = '{}.{}.tmp'.format(path.gp_kernel_cache, os.getpid())
+        with open(temporary_path, 'w') as file:
+            json.dump(kernel_cache, file)
+        os.replace(temporary_path, path.gp_kernel_cache)
+    
+    
+    def build_gauss(self):
+        """
+        Creates an (unfitted) Gaussian Process classifier with a
+        RationalQuadratic kernel, either exact or approximate.
         """
         from sklearn.gaussian_process import GaussianProcessClassifier
         from sklearn.gaussian_process.kernels import RationalQuadratic
+        from models.approximate_gp import NystroemGaussianProcessClassifier
         
+        initial_params = {}
+        if self.warm_start and self.length_scale > 0:
+            initial_params = {'length_scale': self.length_scale,
+                              'alpha': self.alpha}
+        rational_quadratic = RationalQuadratic(length_scale_bounds=self.length_scale_range,
+                                               alpha_bounds=self.alpha_range,
+                                               **initial_params)
+        optimizer = 'fmin_l_bfgs_b'
+        if self.kernel_max_iter is not None:
+            optimizer = self.bounded_kernel_optimizer
+        if self.approximation_rank is None:
+            return(GaussianProcessClassifier(kernel=rational_quadratic,
+                                             optimizer=optimizer,
+                                             max_iter_predict=100,
+                                             random_state=123))
+        return(NystroemGaussianProcessClassifier(kernel=rational_quadratic,
+                                                 rank=self.approximation_rank,
+                                                 optimizer=optimizer,
+                                                 max_iter_predict=100,
+                                                 random_state=123))
+    
+    
+    def run_gauss_cv(self):
+        """
+        Runs cross-validation to generate cross-validation errors.
+        Hyperparameters are automatically tuned.
+        """
+        if self.warm_start and self.length_scale < 0:
+            self.load_cached_kernel()
         all_predicted_probs = pd.DataFrame()
         all_testing_y = pd.Series()
         dates = []
@@ -83,32 +188,26 @@ class GaussianProcess:
         for test_name in range(1, self.test_name + 1):
             self.cv_start = self.cv_params[test_name]['cv_start']
             self.cv_end = self.cv_params[test_name]['cv_end']
-            self.get_cv_indices()
-            training_x = self.full_df.loc[: (self.cv_indices[0] - 1),
-                                          self.feature_names]
-            self.training_y = self.full_df.loc[: (self.cv_indices[0] - 1),
-                                               self.output_name]
-            scaler = StandardScaler()
-            scaler.fit(training_x)
-            training_x_scaled = scaler.transform(training_x)
-            rational_quadratic = RationalQuadratic(length_scale_bounds=self.length_scale_range,
-                                                   alpha_bounds=self.alpha_range)
-            gauss = GaussianProcessClassifier(kernel=rational_quadratic,
-                                              max_iter_predict=100,
-                                              random_state=123)
+            self.cv_indices = get_model_store(self).get_indices(self.cv_start, self.cv_end)
+            self.training_y = self.feature_store.get_labels(self.output_name, 0,
+                                                            self.cv_indices[0])
+            prefix_scaler = get_model_scaler(self)
+            training_x_scaled, testing_x_scaled = prefix_scaler.scale_fold(self.cv_indices[0],
+                                                                           self.cv_indices)
+            gauss = self.build_gauss()
             gauss.fit(X=training_x_scaled, y=self.training_y)
             self.length_scale = gauss.kernel_.length_scale
             self.alpha = gauss.kernel_.alpha
     
-            testing_x = self.full_df[self.feature_names].loc[self.cv_indices]
-            testing_x_scaled = scaler.transform(testing_x)
-            self.testing_y = self.full_df[self.output_name].loc[self.cv_indices]
+            self.testing_y = self.feature_store.get_labels(self.output_name, self.cv_indices[0],
+                                                           self.cv_indices[-1] + 1)
             self.calculate_log_loss_weights()
             predicted_probs = pd.DataFrame(gauss.predict_proba(X=testing_x_scaled))
             all_predicted_probs = all_predicted_probs.append(predicted_probs,
                                                              ignore_index=True)
             all_testing_y = all_testing_y.append(self.testing_y)
-            dates.extend(self.full_df['Dates'].loc[self.cv_indices])
+            dates.extend(self.feature_store.get_dates(self.cv_indices[0],
+                                                      self.cv_indices[-1] + 1))
                 
         self.gauss_cv_error = log_loss(y_true=all_testing_y,
                                          y_pred=all_predicted_probs,
@@ -118,45 +217,41 @@ class GaussianProcess:
         self.gauss_cv_predictions['Predicted'] = all_predicted_probs[1].to_list()
         self.gauss_optimal_params['Best CV Score'] = self.gauss_cv_error
         self.metadata['Length Scale'] = self.length_scale
-        self.metadata['Alpha'] = self.alpha        
+        self.metadata['Alpha'] = self.alpha
+        if self.warm_start:
+            self.save_cached_kernel()
     
     
     def run_gauss_prediction(self):
         """
         Performs prediction on the hold-out sample.
         """
-        from sklearn.gaussian_process import GaussianProcessClassifier
-        from sklearn.gaussian_process.kernels import RationalQuadratic
-        
+        if self.warm_start and self.length_scale < 0:
+            self.load_cached_kernel()
         all_predicted_probs = pd.DataFrame()
         all_testing_y = pd.Series()
         dates = []
         self.log_loss_weights = []
-        training_x = self.full_df.loc[: (self.pred_indices[0] - 1),
-                                      self.feature_names]
-        self.training_y = self.full_df.loc[: (self.pred_indices[0] - 1),
-                                           self.output_name]
-        scaler = StandardScaler()
-        scaler.fit(training_x)
-        training_x_scaled = scaler.transform(training_x)
-        rational_quadratic = RationalQuadratic(length_scale_bounds=self.length_scale_range,
-                                               alpha_bounds=self.alpha_range)
-        gauss = GaussianProcessClassifier(kernel=rational_quadratic,
-                                          max_iter_predict=100,
-                                          random_state=123)
+        self.feature_store = get_model_store(self)
+        self.training_y = self.feature_store.get_labels(self.output_name, 0,
+                                                        self.pred_indices[0])
+        prefix_scaler = get_model_scaler(self)
+        training_x_scaled, testing_x_scaled = prefix_scaler.scale_fold(self.pred_indices[0],
+                                                                       self.pred_indices)
+        gauss = self.build_gauss()
         gauss.fit(X=training_x_scaled, y=self.training_y)
         self.length_scale = gauss.kernel_.length_scale
         self.alpha = gauss.kernel_.alpha
 
-        testing_x = self.full_df[self.feature_names].loc[self.pred_indices]
-        testing_x_scaled = scaler.transform(testing_x)
-        self.testing_y = self.full_df[self.output_name].loc[self.pred_indices]
+        self.testing_y = self.feature_store.get_labels(self.output_name, self.pred_indices[0],
+                                                       self.pred_indices[-1] + 1)
         self.calculate_log_loss_weights()
         predicted_probs = pd.DataFrame(gauss.predict_proba(X=testing_x_scaled))
         all_predicted_probs = all_predicted_probs.append(predicted_probs,
                                                          ignore_index=True)
         all_testing_y = all_testing_y.append(self.testing_y)
-        dates.extend(self.full_df['Dates'].loc[self.pred_indices])
+        dates.extend(self.feature_store.get_dates(self.pred_indices[0],
+                                                  self.pred_indices[-1] + 1))
             
         self.gauss_pred_error = log_loss(y_true=all_testing_y,
                                          y_pred=all_predicted_probs,
@@ -166,6 +261,8 @@ class GaussianProcess:
         self.gauss_predictions['Predicted'] = all_predicted_probs[1].to_list()
         self.metadata['Length Scale'] = self.length_scale
         self.metadata['Alpha'] = self.alpha
+        if self.warm_start:
+            self.save_cached_kernel()
         
         
 #MIT License
@@ -2,9 +2,11 @@
 This module runs an K-Nearest Neighbor model.
 """
 import pandas as pd
-from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import log_loss
 
+from src.utils.timing import span
+from models.feature_store import get_model_scaler, get_model_store
+
 
 class KNN:
     """
@@ -15,6 +17,13 @@ class KNN:
     def __init__(self):
         """
         neighbors_range: range of neighbors values to use during grid-search
+        
+        prefix_scaler: optional shared PrefixScaler, off which the scaling
+        parameters of every training window are read. When none is
+        provided, one is fit on the feature store on first use
+        
+        feature_store: optional shared FeatureStore of the final dataset.
+        When none is provided, one is built from "full_df" on first use
         """
         self.cv_params = {}
         self.cv_start = ''
@@ -25,6 +34,8 @@ class KNN:
         self.training_y = pd.DataFrame()
         self.testing_y = pd.DataFrame()
         self.full_df = pd.DataFrame()
+        self.prefix_scaler = None
+        self.feature_store = None
         self.log_loss_weights = []
         self.feature_names = []
         self.knn_optimal_params = {}
@@ -56,19 +67,6 @@ class KNN:
             self.log_loss_weights.append(class_weights[str(sample)])
             
             
-    def get_cv_indices(self):
-        """
-        Gets indices for rows to be used during cross-validation.
-        """
-        if self.full_df['Dates'][0] > self.full_df['Dates'][len(self.full_df) - 1]:
-            self.full_df = self.full_df[::-1]
-        self.full_df.reset_index(inplace=True)
-        self.full_df.drop('index', axis=1, inplace=True)
-        date_condition = ((self.full_df['Dates'] <= self.cv_end) &
-                          (self.full_df['Dates'] >= self.cv_start))
-        self.cv_indices = list(self.full_df[date_condition].index)
-
-
     def run_knn_cv(self):
         """
         Runs cross-validation by grid-searching through neighbor values.
@@ -76,44 +74,43 @@ class KNN:
         from sklearn.neighbors import KNeighborsClassifier
         
         for neighbors in self.neighbors_range:
-            all_predicted_probs = pd.DataFrame()
-            all_testing_y = pd.Series()
-            dates = []
-            self.log_loss_weights = []
-            for test_name in range(1, self.test_name + 1):
-                self.cv_start = self.cv_params[test_name]['cv_start']
-                self.cv_end = self.cv_params[test_name]['cv_end']
-                self.get_cv_indices()
-                training_x = self.full_df.loc[: (self.cv_indices[0] - 1),
-                                              self.feature_names]
-                self.training_y = self.full_df.loc[: (self.cv_indices[0] - 1),
-                                                   self.output_name]
-                scaler = StandardScaler()
-                scaler.fit(training_x)
-                training_x_scaled = scaler.transform(training_x)
-                knn = KNeighborsClassifier(n_neighbors=neighbors, weights='distance',
-                                           algorithm='auto', p=2, metric='minkowski')
-                knn.fit(X=training_x_scaled, y=self.training_y)
+            with span('KNN', 'grid point', neighbors=neighbors):
+                all_predicted_probs = pd.DataFrame()
+                all_testing_y = pd.Series()
+                dates = []
+                self.log_loss_weights = []
+                for test_name in range(1, self.test_name + 1):
+                    self.cv_start = self.cv_params[test_name]['cv_start']
+                    self.cv_end = self.cv_params[test_name]['cv_end']
+                    self.cv_indices = get_model_store(self).get_indices(self.cv_start, self.cv_end)
+                    self.training_y = self.feature_store.get_labels(self.output_name, 0,
+                                                                    self.cv_indices[0])
+                    prefix_scaler = get_model_scaler(self)
+                    training_x_scaled, testing_x_scaled = prefix_scaler.scale_fold(self.cv_indices[0],
+                                                                                   self.cv_indices)
+                    knn = KNeighborsClassifier(n_neighbors=neighbors, weights='distance',
+                                               algorithm='auto', p=2, metric='minkowski')
+                    knn.fit(X=training_x_scaled, y=self.training_y)
             
-                testing_x = self.full_df[self.feature_names].loc[self.cv_indices]
-                testing_x_scaled = scaler.transform(testing_x)
-                self.testing_y = self.full_df[self.output_name].loc[self.cv_indices]
-                self.calculate_log_loss_weights()
-                predicted_probs = pd.DataFrame(knn.predict_proba(X=testing_x_scaled))
-                all_predicted_probs = all_predicted_probs.append(predicted_probs,
-                                                                 ignore_index=True)
-                all_testing_y = all_testing_y.append(self.testing_y)
-                dates.extend(self.full_df['Dates'].loc[self.cv_indices])
+                    self.testing_y = self.feature_store.get_labels(self.output_name, self.cv_indices[0],
+                                                                   self.cv_indices[-1] + 1)
+                    self.calculate_log_loss_weights()
+                    predicted_probs = pd.DataFrame(knn.predict_proba(X=testing_x_scaled))
+                    all_predicted_probs = all_predicted_probs.append(predicted_probs,
+                                                                     ignore_index=True)
+                    all_testing_y = all_testing_y.append(self.testing_y)
+                    dates.extend(self.feature_store.get_dates(self.cv_indices[0],
+                                                              self.cv_indices[-1] + 1))
                 
-            log_loss_score = log_loss(y_true=all_testing_y,
-                                      y_pred=all_predicted_probs,
-                                      sample_weight=self.log_loss_weights)
-            if log_loss_score < self.best_cv_score:
-                self.best_cv_score = log_loss_score
-                self.optimal_neighbors = neighbors
-                self.knn_cv_predictions['Dates'] = dates
-                self.knn_cv_predictions['True'] = all_testing_y.to_list()
-                self.knn_cv_predictions['Predicted'] = all_predicted_probs[1].to_list()
+                log_loss_score = log_loss(y_true=all_testing_y,
+                                          y_pred=all_predicted_probs,
+                                          sample_weight=self.log_loss_weights)
+                if log_loss_score < self.best_cv_score:
+                    self.best_cv_score = log_loss_score
+                    self.optimal_neighbors = neighbors
+                    self.knn_cv_predictions['Dates'] = dates
+                    self.knn_cv_predictions['True'] = all_testing_y.to_list()
+                    self.knn_cv_predictions['Predicted'] = all_predicted_probs[1].to_list()
         
         self.knn_optimal_params['Neighbors'] = self.optimal_neighbors
         self.knn_optimal_params['Best CV Score'] = self.best_cv_score
@@ -130,27 +127,26 @@ class KNN:
         all_testing_y = pd.Series()
         dates = []
         self.log_loss_weights = []
-        training_x = self.full_df.loc[: (self.pred_indices[0] - 1),
-                                      self.feature_names]
-        self.training_y = self.full_df.loc[: (self.pred_indices[0] - 1),
-                                           self.output_name]
-        scaler = StandardScaler()
-        scaler.fit(training_x)
-        training_x_scaled = scaler.transform(training_x)
+        self.feature_store = get_model_store(self)
+        self.training_y = self.feature_store.get_labels(self.output_name, 0,
+                                                        self.pred_indices[0])
+        prefix_scaler = get_model_scaler(self)
+        training_x_scaled, testing_x_scaled = prefix_scaler.scale_fold(self.pred_indices[0],
+                                                                       self.pred_indices)
         knn = KNeighborsClassifier(n_neighbors=self.optimal_neighbors,
                                    weights='distance',
                                    algorithm='auto', p=2, metric='minkowski')
         knn.fit(X=training_x_scaled, y=self.training_y)
 
-        testing_x = self.full_df[self.feature_names].loc[self.pred_indices]
-        testing_x_scaled = scaler.transform(testing_x)
-        self.testing_y = self.full_df[self.output_name].loc[self.pred_indices]
+        self.testing_y = self.feature_store.get_labels(self.output_name, self.pred_indices[0],
+                                                       self.pred_indices[-1] + 1)
         self.calculate_log_loss_weights()
         predicted_probs = pd.DataFrame(knn.predict_proba(X=testing_x_scaled))
         all_predicted_probs = all_predicted_probs.append(predicted_probs,
                                                          ignore_index=True)
         all_testing_y = all_testing_y.append(self.testing_y)
-        dates.extend(self.full_df['Dates'].loc[self.pred_indices])
+        dates.extend(self.feature_store.get_dates(self.pred_indices[0],
+                                                  self.pred_indices[-1] + 1))
             
         self.knn_pred_error = log_loss(y_true=all_testing_y,
                                        y_pred=all_predicted_probs,
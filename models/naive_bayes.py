@@ -2,9 +2,10 @@
 This module runs a Naive Bayes model.
 """
 import pandas as pd
-from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import log_loss
 
+from models.feature_store import get_model_scaler, get_model_store
+
 
 class NaiveBayes:
     """
@@ -13,6 +14,21 @@ class NaiveBayes:
 
     
     def __init__(self):
+        """
+        prefix_statistics: whether to read each expanding window's model off
+        cumulative sufficient statistics (PrefixGaussianNB) and score every
+        fold in one pass, instead of refitting GaussianNB for each window
+        
+        prefix_model: the PrefixGaussianNB, kept so that later runs only add
+        newly arrived rows to it
+        
+        prefix_scaler: optional shared PrefixScaler, off which the scaling
+        parameters of every training window are read. When none is
+        provided, one is fit on the feature store on first use
+        
+        feature_store: optional shared FeatureStore of the final dataset.
+        When none is provided, one is built from "full_df" on first use
+        """
         self.cv_params = {}
         self.cv_start = ''
         self.cv_end = ''
@@ -22,6 +38,8 @@ class NaiveBayes:
         self.training_y = pd.DataFrame()
         self.testing_y = pd.DataFrame()
         self.full_df = pd.DataFrame()
+        self.prefix_scaler = None
+        self.feature_store = None
         self.log_loss_weights = []
         self.feature_names = []
         self.bayes_optimal_params = {}
@@ -29,6 +47,8 @@ class NaiveBayes:
         self.bayes_predictions = {}
         self.bayes_cv_predictions = {}
         self.output_name = ''
+        self.prefix_statistics = False
+        self.prefix_model = None
 
 
     def calculate_log_loss_weights(self):
@@ -50,17 +70,62 @@ class NaiveBayes:
             self.log_loss_weights.append(class_weights[str(sample)])
             
             
-    def get_cv_indices(self):
+    def update_prefix_model(self):
         """
-        Gets indices for rows to be used during cross-validation.
+        Computes cumulative sufficient statistics on first use. Afterwards,
+        only rows added to the end of the dataset since the last update are
+        added (rows already seen are assumed unchanged).
         """
-        if self.full_df['Dates'][0] > self.full_df['Dates'][len(self.full_df) - 1]:
-            self.full_df = self.full_df[::-1]
-        self.full_df.reset_index(inplace=True)
-        self.full_df.drop('index', axis=1, inplace=True)
-        date_condition = ((self.full_df['Dates'] <= self.cv_end) &
-                          (self.full_df['Dates'] >= self.cv_start))
-        self.cv_indices = list(self.full_df[date_condition].index)
+        from models.prefix_naive_bayes import PrefixGaussianNB
+        
+        features = self.feature_store.get_features()
+        labels = self.feature_store.get_labels(self.output_name)
+        if self.prefix_model is None:
+            self.prefix_model = PrefixGaussianNB().fit(X=features, y=labels)
+            return
+        rows_seen = len(self.prefix_model.counts) - 1
+        if self.feature_store.get_row_count() > rows_seen:
+            self.prefix_model.partial_fit(X=features[rows_seen:],
+                                          y=labels.iloc[rows_seen:])
+    
+    
+    def run_prefix_bayes_cv(self):
+        """
+        Runs cross-validation from cumulative sufficient statistics: every
+        fold's model is read off the prefix model, and the testing rows of
+        all folds are scored in a single vectorized pass.
+        """
+        testing_indices = []
+        training_stops = []
+        self.log_loss_weights = []
+        for test_name in range(1, self.test_name + 1):
+            self.cv_start = self.cv_params[test_name]['cv_start']
+            self.cv_end = self.cv_params[test_name]['cv_end']
+            self.cv_indices = get_model_store(self).get_indices(self.cv_start, self.cv_end)
+            self.training_y = self.feature_store.get_labels(self.output_name, 0,
+                                                            self.cv_indices[0])
+            self.testing_y = self.feature_store.get_labels(self.output_name, self.cv_indices[0],
+                                                           self.cv_indices[-1] + 1)
+            self.calculate_log_loss_weights()
+            testing_indices.extend(self.cv_indices)
+            training_stops.extend([self.cv_indices[0]] * len(self.cv_indices))
+        
+        self.update_prefix_model()
+        # folds overlap, so their testing rows are gathered rather than sliced
+        testing_x = self.feature_store.get_features()[testing_indices]
+        all_predicted_probs = pd.DataFrame(self.prefix_model.predict_proba(X=testing_x,
+                                                                           stops=training_stops))
+        all_testing_y = self.feature_store.get_labels(self.output_name).loc[testing_indices]
+        all_dates = self.feature_store.get_dates()
+        dates = [all_dates[index] for index in testing_indices]
+        
+        self.bayes_cv_error = log_loss(y_true=all_testing_y,
+                                       y_pred=all_predicted_probs,
+                                       sample_weight=self.log_loss_weights)
+        self.bayes_cv_predictions['Dates'] = dates
+        self.bayes_cv_predictions['True'] = all_testing_y.to_list()
+        self.bayes_cv_predictions['Predicted'] = all_predicted_probs[1].to_list()
+        self.bayes_optimal_params['Best CV Score'] = self.bayes_cv_error
     
     
     def run_bayes_cv(self):
@@ -69,6 +134,10 @@ class NaiveBayes:
         """
         from sklearn.naive_bayes import GaussianNB
         
+        if self.prefix_statistics:
+            self.run_prefix_bayes_cv()
+            return
+        
         all_predicted_probs = pd.DataFrame()
         all_testing_y = pd.Series()
         dates = []
@@ -76,26 +145,24 @@ class NaiveBayes:
         for test_name in range(1, self.test_name + 1):
             self.cv_start = self.cv_params[test_name]['cv_start']
             self.cv_end = self.cv_params[test_name]['cv_end']
-            self.get_cv_indices()
-            training_x = self.full_df.loc[: (self.cv_indices[0] - 1),
-                                          self.feature_names]
-            self.training_y = self.full_df.loc[: (self.cv_indices[0] - 1),
-                                               self.output_name]
-            scaler = StandardScaler()
-            scaler.fit(training_x)
-            training_x_scaled = scaler.transform(training_x)
+            self.cv_indices = get_model_store(self).get_indices(self.cv_start, self.cv_end)
+            self.training_y = self.feature_store.get_labels(self.output_name, 0,
+                                                            self.cv_indices[0])
+            prefix_scaler = get_model_scaler(self)
+            training_x_scaled, testing_x_scaled = prefix_scaler.scale_fold(self.cv_indices[0],
+                                                                           self.cv_indices)
             naive_bayes = GaussianNB()
             naive_bayes.fit(X=training_x_scaled, y=self.training_y)
     
-            testing_x = self.full_df[self.feature_names].loc[self.cv_indices]
-            testing_x_scaled = scaler.transform(testing_x)
-            self.testing_y = self.full_df[self.output_name].loc[self.cv_indices]
+            self.testing_y = self.feature_store.get_labels(self.output_name, self.cv_indices[0],
+                                                           self.cv_indices[-1] + 1)
             self.calculate_log_loss_weights()
             predicted_probs = pd.DataFrame(naive_bayes.predict_proba(X=testing_x_scaled))
             all_predicted_probs = all_predicted_probs.append(predicted_probs,
                                                              ignore_index=True)
             all_testing_y = all_testing_y.append(self.testing_y)
-            dates.extend(self.full_df['Dates'].loc[self.cv_indices])
+            dates.extend(self.feature_store.get_dates(self.cv_indices[0],
+                                                      self.cv_indices[-1] + 1))
                 
         self.bayes_cv_error = log_loss(y_true=all_testing_y,
                                        y_pred=all_predicted_probs,
@@ -116,25 +183,31 @@ class NaiveBayes:
         all_testing_y = pd.Series()
         dates = []
         self.log_loss_weights = []
-        training_x = self.full_df.loc[: (self.pred_indices[0] - 1),
-                                      self.feature_names]
-        self.training_y = self.full_df.loc[: (self.pred_indices[0] - 1),
-                                           self.output_name]
-        scaler = StandardScaler()
-        scaler.fit(training_x)
-        training_x_scaled = scaler.transform(training_x)
-        naive_bayes = GaussianNB()
-        naive_bayes.fit(X=training_x_scaled, y=self.training_y)
-
-        testing_x = self.full_df[self.feature_names].loc[self.pred_indices]
-        testing_x_scaled = scaler.transform(testing_x)
-        self.testing_y = self.full_df[self.output_name].loc[self.pred_indices]
+        self.feature_store = get_model_store(self)
+        self.training_y = self.feature_store.get_labels(self.output_name, 0,
+                                                        self.pred_indices[0])
+        testing_x = self.feature_store.get_features(self.pred_indices[0],
+                                                    self.pred_indices[-1] + 1)
+        self.testing_y = self.feature_store.get_labels(self.output_name, self.pred_indices[0],
+                                                       self.pred_indices[-1] + 1)
         self.calculate_log_loss_weights()
-        predicted_probs = pd.DataFrame(naive_bayes.predict_proba(X=testing_x_scaled))
+        if self.prefix_statistics:
+            self.update_prefix_model()
+            training_stops = [self.pred_indices[0]] * len(self.pred_indices)
+            predicted_probs = pd.DataFrame(self.prefix_model.predict_proba(X=testing_x,
+                                                                           stops=training_stops))
+        else:
+            prefix_scaler = get_model_scaler(self)
+            training_x_scaled, testing_x_scaled = prefix_scaler.scale_fold(self.pred_indices[0],
+                                                                           self.pred_indices)
+            naive_bayes = GaussianNB()
+            naive_bayes.fit(X=training_x_scaled, y=self.training_y)
+            predicted_probs = pd.DataFrame(naive_bayes.predict_proba(X=testing_x_scaled))
         all_predicted_probs = all_predicted_probs.append(predicted_probs,
                                                          ignore_index=True)
         all_testing_y = all_testing_y.append(self.testing_y)
-        dates.extend(self.full_df['Dates'].loc[self.pred_indices])
+        dates.extend(self.feature_store.get_dates(self.pred_indices[0],
+                                                  self.pred_indices[-1] + 1))
             
         self.bayes_pred_error = log_loss(y_true=all_testing_y,
                                          y_pred=all_predicted_probs,
@@ -0,0 +1,221 @@
+"""
+This module stores model predictions as flat columns in a compact binary
+format, which can be memory-mapped and sliced by model, output or date.
+"""
+import os
+import json
+import numpy as np
+import pandas as pd
+
+
+class PredictionStore:
+    """
+    One row per prediction, with columns (test, output, model, date, true,
+    predicted). Dates are stored as int32 days since 1970-01-01. Rows are grouped into contiguous blocks by model, then by
+    output, so that any model or horizon is a single slice of each column.
+    Each column is saved as its own .npy file, and is memory-mapped on load.
+    """
+    
+    
+    def __init__(self):
+        """
+        test_names, output_names, model_names: the labels behind the integer
+        codes of the "test", "output" and "model" columns
+        
+        columns: dictionary of column name -> array
+        
+        block_offsets: row offsets of each (model, output) block, such that
+        block (m, o) holds rows [block_offsets[m, o], block_offsets[m, o + 1])
+        
+        date_order: row indices in date order, for date range lookups
+        
+        sorted_dates: the "date" column in date order, for binary search
+        """
+        self.test_names = []
+        self.output_names = []
+        self.model_names = []
+        self.columns = {}
+        self.block_offsets = None
+        self.date_order = None
+        self.sorted_dates = None
+        self.column_names = ['test', 'output', 'model', 'date', 'true', 'predicted']
+    
+    
+    def from_predictions(self, full_predictions):
+        """
+        Builds the store from nested predictions.
+        
+        full_predictions: {Test: {output: {model: {'Dates': [...],
+        'True': [...], 'Predicted': [...]}}}}
+        """
+        self.test_names = list(full_predictions)
+        first_test = full_predictions[self.test_names[0]]
+        self.output_names = list(first_test)
+        self.model_names = list(first_test[self.output_names[0]])
+        
+        blocks = {name: [] for name in self.column_names}
+        block_sizes = np.zeros((len(self.model_names), len(self.output_names)), dtype=np.int64)
+        for model_code, model_name in enumerate(self.model_names):
+            for output_code, output_name in enumerate(self.output_names):
+                for test_code, test_name in enumerate(self.test_names):
+                    predictions = full_predictions[test_name][output_name][model_name]
+                    row_count = len(predictions['Dates'])
+                    blocks['test'].append(np.full(row_count, test_code, dtype=np.int16))
+                    blocks['output'].append(np.full(row_count, output_code, dtype=np.int8))
+                    blocks['model'].append(np.full(row_count, model_code, dtype=np.int8))
+                    blocks['date'].append(np.asarray(predictions['Dates'], dtype='datetime64[D]')
+                                          .astype(np.int32))
+                    blocks['true'].append(np.asarray(predictions['True'], dtype=np.int8))
+                    blocks['predicted'].append(np.asarray(predictions['Predicted'], dtype=np.float64))
+                    block_sizes[model_code, output_code] += row_count
+        self.columns = {name: np.concatenate(blocks[name]) for name in self.column_names}
+        self.block_offsets = np.concatenate([[0], np.cumsum(block_sizes)]).astype(np.int64)
+        self.date_order = np.argsort(self.columns['date'], kind='stable').astype(np.int32)
+        self.sorted_dates = self.columns['date'][self.date_order]
+        return(self)
+    
+    
+    def save(self, directory):
+        """
+        Saves each column and index as a .npy file, plus the labels of the
+        integer codes as json.
+        
+        directory: string, where to save the store
+        """
+        os.makedirs(directory, exist_ok=True)
+        arrays = dict(self.columns, block_offsets=self.block_offsets,
+                      date_order=self.date_order, sorted_dates=self.sorted_dates)
+        for name in arrays:
+            np.save(os.path.join(directory, '{}.npy'.format(name)), arrays[name])
+        with open(os.path.join(directory, 'labels.json'), 'w') as file:
+            json.dump({'test_names': self.test_names,
+                       'output_names': self.output_names,
+                       'model_names': self.model_names}, file)
+    
+    
+    def load(self, directory, mmap_mode='r'):
+        """
+        Loads a store saved by "save". Columns are memory-mapped, so only the
+        slices that are read get paged in.
+        
+        directory: string, where the store was saved
+        
+        mmap_mode: passed to numpy.load (None reads columns into memory)
+        """
+        with open(os.path.join(directory, 'labels.json'), 'r') as file:
+            labels = json.load(file)
+        self.test_names = labels['test_names']
+        self.output_names = labels['output_names']
+        self.model_names = labels['model_names']
+        load_array = lambda name: np.load(os.path.join(directory, '{}.npy'.format(name)),
+                                          mmap_mode=mmap_mode)
+        self.columns = {name: load_array(name) for name in self.column_names}
+        self.block_offsets = load_array('block_offsets')
+        self.date_order = load_array('date_order')
+        self.sorted_dates = load_array('sorted_dates')
+        return(self)
+    
+    
+    def get_block(self, model_name, output_name=None):
+        """
+        Returns the slice of rows holding one model, for one output or
+        (if "output_name" is None) for every output.
+        
+        model_name: name of the model
+        
+        output_name: name of the output
+        """
+        model_code = self.model_names.index(model_name)
+        block_count = len(self.output_names)
+        if output_name is None:
+            return(slice(int(self.block_offsets[model_code * block_count]),
+                         int(self.block_offsets[(model_code + 1) * block_count])))
+        block = model_code * block_count + self.output_names.index(output_name)
+        return(slice(int(self.block_offsets[block]),
+                     int(self.block_offsets[block + 1])))
+    
+    
+    def get_date_rows(self, start=None, end=None):
+        """
+        Returns row indices (in date order) of predictions dated from "start"
+        to "end", inclusive.
+        
+        start, end: dates as 'YYYY-MM-DD' strings, or None for no bound
+        """
+        get_day = lambda date: np.datetime64(date, 'D').astype(np.int32)
+        lower = (0 if start is None
+                 else np.searchsorted(self.sorted_dates, get_day(start), side='left'))
+        upper = (len(self.sorted_dates) if end is None
+                 else np.searchsorted(self.sorted_dates, get_day(end), side='right'))
+        return(self.date_order[lower:upper])
+    
+    
+    def get_date_strings(self, rows):
+        """
+        Returns the dates of the given rows as 'YYYY-MM-DD' strings.
+        
+        rows: slice or array of row indices
+        """
+        days = np.asarray(self.columns['date'][rows], dtype=np.int64)
+        return(np.datetime_as_string(days.astype('datetime64[D]')))
+    
+    
+    def get_rows(self, rows):
+        """
+        Returns a dataframe of the given rows, with labels in place of codes.
+        
+        rows: slice or array of row indices
+        """
+        results = pd.DataFrame()
+        results['test'] = np.asarray(self.test_names)[self.columns['test'][rows]]
+        results['output'] = np.asarray(self.output_names)[self.columns['output'][rows]]
+        results['model'] = np.asarray(self.model_names)[self.columns['model'][rows]]
+        results['date'] = self.get_date_strings(rows)
+        results['true'] = np.asarray(self.columns['true'][rows], dtype=np.int64)
+        results['predicted'] = np.asarray(self.columns['predicted'][rows])
+        return(results)
+    
+    
+    def get_model_frame(self, model_name, output_names=None):
+        """
+        Returns one model's predictions across every Test, with a column of
+        true and predicted values per output.
+        
+        model_name: name of the model
+        
+        output_names: outputs to include, defaults to every output
+        """
+        if output_names is None:
+            output_names = self.output_names
+        results = pd.DataFrame()
+        first_block = self.get_block(model_name, output_names[0])
+        results['Dates'] = self.get_date_strings(first_block)
+        for output_name in output_names:
+            block = self.get_block(model_name, output_name)
+            results['True_{}'.format(output_name)] = np.asarray(self.columns['true'][block],
+                                                                dtype=np.int64)
+            results['Pred_{}'.format(output_name)] = np.asarray(self.columns['predicted'][block])
+        return(results)
+        
+        
+#MIT License
+#
+#Copyright (c) 2019 Terrence Zhang
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
\ No newline at end of file
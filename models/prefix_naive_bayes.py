@@ -0,0 +1,155 @@
+"""
+This module runs a Gaussian Naive Bayes model whose parameters, for every
+expanding training window, are read off cumulative sufficient statistics.
+"""
+import numpy as np
+
+
+class PrefixGaussianNB:
+    """
+    Equivalent to fitting StandardScaler + GaussianNB on rows[:stop] of a
+    chronologically ordered dataset, for any "stop". Per-class cumulative
+    counts, sums and sums of squares are computed once (O(n)), after which
+    each expanding window's model is available in O(1).
+    """
+
+
+    def __init__(self, var_smoothing=1e-9):
+        """
+        var_smoothing: as in sklearn's GaussianNB, the share of the largest
+        (scaled) feature variance that is added to every class variance
+        """
+        self.var_smoothing = var_smoothing
+        self.classes_ = []
+        self.shift = None
+        self.counts = None
+        self.sums = None
+        self.square_sums = None
+
+
+    def fit(self, X, y):
+        """
+        Computes cumulative sufficient statistics over every row.
+
+        X: array, unscaled features in chronological order
+
+        y: iterable, labels
+        """
+        X = np.asarray(X, dtype=float)
+        y = np.asarray(y)
+        self.classes_ = np.unique(y)
+        # the statistics are accumulated around a fixed shift, so that
+        # sums of squares do not lose precision on large-valued features
+        self.shift = X.mean(axis=0)
+        class_count = len(self.classes_)
+        feature_count = X.shape[1]
+        self.counts = np.zeros((1, class_count))
+        self.sums = np.zeros((1, class_count, feature_count))
+        self.square_sums = np.zeros((1, class_count, feature_count))
+        self.partial_fit(X, y)
+        return(self)
+
+
+    def partial_fit(self, X, y):
+        """
+        Appends new (later) rows to the cumulative statistics, without
+        revisiting earlier rows. As in sklearn's GaussianNB, labels must be
+        among those seen by "fit".
+
+        X: array, unscaled features in chronological order
+
+        y: iterable, labels
+        """
+        y = np.asarray(y)
+        unseen_labels = np.setdiff1d(y, self.classes_)
+        if len(unseen_labels) > 0:
+            raise ValueError('The target label(s) {} in y do not exist in the initial classes {}'.format(
+                             unseen_labels, self.classes_))
+        centered_x = np.asarray(X, dtype=float) - self.shift
+        one_hot = (y[:, None] == self.classes_[None, :]).astype(float)
+        counts = np.cumsum(one_hot, axis=0) + self.counts[-1]
+        sums = (np.cumsum(one_hot[:, :, None] * centered_x[:, None, :], axis=0)
+            + self.sums[-1])
+        square_sums = (np.cumsum(one_hot[:, :, None] * centered_x[:, None, :] ** 2, axis=0)
+            + self.square_sums[-1])
+        self.counts = np.concatenate([self.counts, counts])
+        self.sums = np.concatenate([self.sums, sums])
+        self.square_sums = np.concatenate([self.square_sums, square_sums])
+        return(self)
+
+
+    def get_parameters(self, stops):
+        """
+        Returns the scaler and Naive Bayes parameters of the models trained
+        on rows[:stop], for each stop.
+
+        stops: array of ints, one per model
+        """
+        stops = np.asarray(stops)
+        counts = self.counts[stops]
+        sums = self.sums[stops]
+        square_sums = self.square_sums[stops]
+        total_counts = counts.sum(axis=1)[:, None]
+        scaler_mean = sums.sum(axis=1) / total_counts
+        scaler_var = np.maximum(square_sums.sum(axis=1) / total_counts
+                                - scaler_mean ** 2, 0)
+        scale = np.sqrt(scaler_var)
+        scale[scale == 0] = 1
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            class_mean = sums / counts[:, :, None]
+            class_var = np.maximum(square_sums / counts[:, :, None]
+                                   - class_mean ** 2, 0)
+            class_log_prior = np.log(counts / total_counts)
+        theta = (class_mean - scaler_mean[:, None, :]) / scale[:, None, :]
+        epsilon = self.var_smoothing * (scaler_var / scale ** 2).max(axis=1)
+        var = class_var / scale[:, None, :] ** 2 + epsilon[:, None, None]
+        return({'Scaler Mean': scaler_mean, 'Scale': scale,
+                'Class Log Prior': class_log_prior, 'Theta': theta,
+                'Var': var})
+
+
+    def predict_proba(self, X, stops):
+        """
+        Scores every row with the model trained on rows[:stop], in one
+        vectorized pass. Returns an (n_samples, n_classes) array.
+
+        X: array, unscaled features
+
+        stops: array of ints, the training cut-off for each row of X
+        """
+        params = self.get_parameters(stops)
+        scaled_x = ((np.asarray(X, dtype=float) - self.shift - params['Scaler Mean'])
+            / params['Scale'])
+        with np.errstate(invalid='ignore'):
+            joint_log_likelihood = (params['Class Log Prior']
+                - 0.5 * np.log(2 * np.pi * params['Var']).sum(axis=2)
+                - 0.5 * ((scaled_x[:, None, :] - params['Theta']) ** 2
+                         / params['Var']).sum(axis=2))
+        # classes not yet seen in a training window get zero probability
+        joint_log_likelihood[~np.isfinite(params['Class Log Prior'])] = -np.inf
+        joint_log_likelihood -= joint_log_likelihood.max(axis=1, keepdims=True)
+        probabilities = np.exp(joint_log_likelihood)
+        return(probabilities / probabilities.sum(axis=1, keepdims=True))
+
+#MIT License
+#
+#Copyright (c) 2019 Terrence Zhang
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
\ No newline at end of file
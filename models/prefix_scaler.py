@@ -0,0 +1,206 @@
+"""
+This module standardizes features for expanding training windows, using
+cumulative moments that are computed once.
+"""
+import numpy as np
+
+
+class PrefixScaler:
+    """
+    Equivalent to fitting sklearn's StandardScaler on rows[:stop] of a
+    chronologically ordered feature matrix, for any "stop". Cumulative sums
+    and sums of squares are computed once (O(n)), after which the scaling
+    parameters of any training cut-off are available in O(1).
+    """
+
+
+    def __init__(self):
+        """
+        features: the unscaled feature matrix. "fit" keeps a reference to its
+        input (e.g. a FeatureStore's read-only matrix) rather than a copy
+
+        sums, square_sums: cumulative moments, one row per training cut-off
+
+        buffers: arrays that "features", "sums" and "square_sums" are views
+        of, once rows have been appended, with room for more rows
+
+        chunk_rows: number of rows whose moments are computed at a time, which
+        bounds the size of the float64 temporaries
+        """
+        self.features = None
+        self.shift = None
+        self.sums = None
+        self.square_sums = None
+        self.buffers = {}
+        self.chunk_rows = 65536
+
+
+    def accumulate_moments(self, X, sums, square_sums):
+        """
+        Fills rows 1 onwards of "sums" and "square_sums" with the cumulative
+        moments of X, continuing from their row 0, a chunk of rows at a time.
+
+        X: array, unscaled features in chronological order
+
+        sums, square_sums: float64 arrays of len(X) + 1 rows
+        """
+        for start in range(0, len(X), self.chunk_rows):
+            stop = min(start + self.chunk_rows, len(X))
+            # moments are always accumulated in float64
+            centered_x = np.asarray(X[start:stop], dtype=float) - self.shift
+            square_x = centered_x ** 2
+            # the running totals are added to the first row, so that each
+            # chunk continues the same sequential sum
+            centered_x[0] += sums[start]
+            square_x[0] += square_sums[start]
+            np.cumsum(centered_x, axis=0, out=sums[start + 1:stop + 1])
+            np.cumsum(square_x, axis=0, out=square_sums[start + 1:stop + 1])
+
+
+    def append_rows(self, name, new_rows):
+        """
+        Appends rows to one of "features", "sums" or "square_sums". They are
+        written into its buffer when it has room, or else into a new buffer
+        twice as large, so that appending n rows, in any batches, copies O(n)
+        rows in total.
+
+        name: string, the attribute to append to
+
+        new_rows: array, the rows to append
+        """
+        rows = getattr(self, name)
+        row_count = len(rows) + len(new_rows)
+        buffer = self.buffers.get(name)
+        if buffer is None or len(buffer) < row_count:
+            buffer = np.empty((max(row_count, 2 * len(rows)),) + rows.shape[1:],
+                              dtype=rows.dtype)
+            buffer[:len(rows)] = rows
+            self.buffers[name] = buffer
+        buffer[len(rows):row_count] = new_rows
+        setattr(self, name, buffer[:row_count])
+
+
+    def fit(self, X):
+        """
+        Computes cumulative moments over every row.
+
+        X: array or dataframe, unscaled features in chronological order.
+        float32 features are kept, and scaled, as float32
+        """
+        X = np.asarray(X)
+        if X.dtype != np.float32:
+            X = np.asarray(X, dtype=float)
+        # moments are accumulated around a fixed shift, so that sums of
+        # squares do not lose precision on large-valued features
+        self.shift = X.mean(axis=0, dtype=float)
+        self.features = X
+        self.buffers = {}
+        self.sums = np.zeros((len(X) + 1, X.shape[1]))
+        self.square_sums = np.zeros((len(X) + 1, X.shape[1]))
+        self.accumulate_moments(X, self.sums, self.square_sums)
+        return(self)
+
+
+    def partial_fit(self, X):
+        """
+        Appends new (later) rows, without revisiting earlier rows.
+
+        X: array or dataframe, unscaled features in chronological order
+        """
+        X = np.asarray(X)
+        sums = np.empty((len(X) + 1, X.shape[1]))
+        square_sums = np.empty((len(X) + 1, X.shape[1]))
+        sums[0] = self.sums[-1]
+        square_sums[0] = self.square_sums[-1]
+        self.accumulate_moments(X, sums, square_sums)
+        self.append_rows('features', X)
+        self.append_rows('sums', sums[1:])
+        self.append_rows('square_sums', square_sums[1:])
+        return(self)
+
+
+    def get_parameters(self, stop):
+        """
+        Returns the mean, variance and scale of rows[:stop], with the same
+        conventions as StandardScaler (population variance, and a scale of 1
+        for constant features).
+
+        stop: int, number of training rows
+        """
+        mean = self.sums[stop] / stop
+        var = np.maximum(self.square_sums[stop] / stop - mean ** 2, 0)
+        scale = np.sqrt(var)
+        scale[scale == 0] = 1
+        return(mean + self.shift, var, scale)
+
+
+    def get_scaler(self, stop):
+        """
+        Returns a fitted StandardScaler for rows[:stop], without refitting it.
+
+        stop: int, number of training rows
+        """
+        from sklearn.preprocessing import StandardScaler
+
+        mean, var, scale = self.get_parameters(stop)
+        scaler = StandardScaler()
+        scaler.mean_ = mean
+        scaler.var_ = var
+        scaler.scale_ = scale
+        scaler.n_samples_seen_ = stop
+        scaler.n_features_in_ = len(mean)
+        return(scaler)
+
+
+    def transform_rows(self, start, end, stop):
+        """
+        Scales rows[start:end] with the parameters of rows[:stop], directly
+        from the stored feature matrix (no intermediate dataframes), in the
+        features' dtype.
+
+        start, end: ints, the rows to scale
+
+        stop: int, number of training rows
+        """
+        mean, var, scale = self.get_parameters(stop)
+        scaled_x = (self.features[start:end] - mean) / scale
+        return(scaled_x.astype(self.features.dtype, copy=False))
+
+
+    def scale_fold(self, training_stop, testing_indices):
+        """
+        Returns the training rows (those before "training_stop") and the
+        testing rows, both scaled with the training rows' mean and standard
+        deviation.
+
+        training_stop: int, index of the first row after the training window
+
+        testing_indices: range or list, indices of the (contiguous) testing
+        rows
+        """
+        training_x_scaled = self.transform_rows(0, training_stop, training_stop)
+        testing_x_scaled = self.transform_rows(testing_indices[0], testing_indices[-1] + 1,
+                                               training_stop)
+        return(training_x_scaled, testing_x_scaled)
+
+#MIT License
+#
+#Copyright (c) 2019 Terrence Zhang
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
\ No newline at end of file
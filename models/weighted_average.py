@@ -1,11 +1,17 @@
 """
 This module runs a weighted average model.
 """
+import numpy as np
+import pandas as pd
 from scipy.stats import rankdata
 
 class WeightedAverage:
     """
     Methods and attributes to average the predictions of a group of models.
+    
+    Predictions are combined as a (dates x models) probability matrix, so the
+    same code path weights a single Test/output or every Test and output at
+    once (see compare_weighting_schemes).
     """
     
     
@@ -13,13 +19,26 @@ class WeightedAverage:
         """
         rank_scheme: weights applied to each model rank,
         where the first-ranked model is the best.
+        
+        weighting_scheme: 'rank' (rank_scheme weights), 'inverse_log_loss'
+        (weights proportional to 1 / CV log loss) or 'stacked' (a logistic
+        regression on the models' log-odds, fit on cv_predictions_by_model)
+        
+        cv_predictions_by_model: each model's best cross-validation
+        predictions, only needed for the 'stacked' scheme
         """
         self.model_names = []
         self.model_weights = {}
         self.cv_results = {}
         self.predictions_by_model = {}
+        self.cv_predictions_by_model = {}
         self.weighted_average_predictions = {}
         self.metadata={}
+        self.weighting_scheme = 'rank'
+        self.weighting_schemes = ['rank', 'inverse_log_loss', 'stacked']
+        self.stacking_intercept = 0
+        self.prediction_matrix = np.empty((0, 0))
+        self.scheme_comparison = pd.DataFrame()
         self.rank_scheme = {1: 0.40,
                             2: 0.30,
                             3: 0.20,
@@ -28,19 +47,119 @@ class WeightedAverage:
                             6: 0.00}
             
 
+    def get_prediction_matrix(self, predictions_by_model):
+        """
+        Returns a (dates x models) array of predicted probabilities, with
+        columns in the order of model_names.
+        
+        predictions_by_model: dict of each model's predictions
+        """
+        return(np.column_stack([np.asarray(predictions_by_model[model_name]['Predicted'],
+                                           dtype=float)
+                                for model_name in self.model_names]))
+    
+    
+    def get_rank_weights(self, cv_scores):
+        """
+        Returns rank_scheme weights, ranking models by CV score within
+        each row.
+        
+        cv_scores: (n x models) array of CV log losses
+        """
+        score_ranks = rankdata(cv_scores, axis=1).astype(int)
+        rank_lookup = np.zeros(max(max(self.rank_scheme), cv_scores.shape[1]) + 1)
+        for rank in self.rank_scheme:
+            rank_lookup[rank] = self.rank_scheme[rank]
+        return(rank_lookup[score_ranks])
+    
+    
+    def get_inverse_log_loss_weights(self, cv_scores):
+        """
+        Returns weights proportional to 1 / CV log loss, summing to 1 within
+        each row.
+        
+        cv_scores: (n x models) array of CV log losses
+        """
+        inverse_scores = 1 / np.asarray(cv_scores, dtype=float)
+        return(inverse_scores / inverse_scores.sum(axis=1, keepdims=True))
+    
+    
+    def get_log_odds(self, predicted):
+        """
+        Returns the log-odds of predicted probabilities, clipped away from
+        0 and 1.
+        
+        predicted: array of probabilities
+        """
+        predicted = np.clip(predicted, 1e-6, 1 - 1e-6)
+        return(np.log(predicted / (1 - predicted)))
+    
+    
+    def fit_stacking_model(self, cv_matrix, cv_true):
+        """
+        Fits a logistic regression on the models' CV log-odds, and returns
+        its (coefficients, intercept).
+        
+        cv_matrix: (dates x models) array of CV predicted probabilities
+        
+        cv_true: array of CV labels
+        """
+        from sklearn.linear_model import LogisticRegression
+        
+        cv_true = np.asarray(cv_true)
+        if len(np.unique(cv_true)) < 2:
+            # nothing to stack on, so fall back to an equal-weighted average
+            # of the log-odds
+            return(np.full(cv_matrix.shape[1], 1 / cv_matrix.shape[1]), 0)
+        stacking_model = LogisticRegression(C=1.0, solver='lbfgs',
+                                            class_weight='balanced')
+        stacking_model.fit(self.get_log_odds(cv_matrix), cv_true)
+        return(stacking_model.coef_[0], stacking_model.intercept_[0])
+    
+    
+    def combine_predictions(self, prediction_matrix, weights, intercepts=0,
+                            weighting_scheme='rank'):
+        """
+        Combines a (dates x models) probability matrix into one prediction
+        per date, in a single vectorized pass.
+        
+        prediction_matrix: (dates x models) array of predicted probabilities
+        
+        weights: (models,) array, or (dates x models) array of each date's
+        weights
+        
+        intercepts: scalar or (dates,) array, only used by the 'stacked'
+        scheme
+        
+        weighting_scheme: see weighting_scheme
+        """
+        if weighting_scheme == 'stacked':
+            log_odds = (self.get_log_odds(prediction_matrix) * weights).sum(axis=1)
+            return(1 / (1 + np.exp(-(log_odds + intercepts))))
+        return((prediction_matrix * weights).sum(axis=1))
+    
+    
     def calculate_model_weights(self):
         """
         Assign weights to each model's prediction.
         """
-        cv_scores = []
-        for model_name in self.cv_results:
-            cv_scores.append(self.cv_results[model_name]['Best CV Score'])
+        cv_scores = np.array([[self.cv_results[model_name]['Best CV Score']
+                               for model_name in self.model_names]])
+        if self.weighting_scheme == 'rank':
+            weights = self.get_rank_weights(cv_scores)[0]
+        elif self.weighting_scheme == 'inverse_log_loss':
+            weights = self.get_inverse_log_loss_weights(cv_scores)[0]
+        elif self.weighting_scheme == 'stacked':
+            cv_matrix = self.get_prediction_matrix(self.cv_predictions_by_model)
+            cv_true = self.cv_predictions_by_model[self.model_names[0]]['True']
+            weights, self.stacking_intercept = self.fit_stacking_model(cv_matrix,
+                                                                       cv_true)
+            self.metadata['Intercept'] = float(self.stacking_intercept)
+        else:
+            raise ValueError('Unknown weighting scheme: {}'.format(self.weighting_scheme))
         
-        score_ranks = rankdata(cv_scores)
-        iteration = 0
-        for model_name in self.cv_results:
-            self.model_weights[model_name] = self.rank_scheme[int(score_ranks[iteration])]
-            iteration += 1
+        for model_name, weight in zip(self.model_names, weights):
+            self.model_weights[model_name] = float(weight)
         self.metadata['Weights'] = self.model_weights
 
     
@@ -51,23 +170,19 @@ class WeightedAverage:
         self.predictions_reshaped = {}
         self.predictions_reshaped['Dates'] = self.predictions_by_model[self.model_names[0]]['Dates']
         self.predictions_reshaped['True'] = self.predictions_by_model[self.model_names[0]]['True']
-        for model_name in self.predictions_by_model:
-            self.predictions_reshaped[model_name] = self.predictions_by_model[model_name]['Predicted']
+        self.prediction_matrix = self.get_prediction_matrix(self.predictions_by_model)
         
     
     def weighted_model_predictions(self):
         """
         Creates predictions for the weighted model.
         """
-        predicted = []
-        for index in range(0, len(self.predictions_reshaped['Dates'])):
-            weighted_sum = 0    
-            for model_name in self.model_names:
-                model_weight = self.model_weights[model_name]
-                prediction = self.predictions_reshaped[model_name][index]
-                weighted_sum += model_weight * prediction
-            predicted.append(weighted_sum)
-        self.weighted_average_predictions['Predicted'] = predicted
+        weights = np.array([self.model_weights[model_name]
+                            for model_name in self.model_names])
+        predicted = self.combine_predictions(self.prediction_matrix, weights,
+                                             intercepts=self.stacking_intercept,
+                                             weighting_scheme=self.weighting_scheme)
+        self.weighted_average_predictions['Predicted'] = predicted.tolist()
         
         
     def run_weighted_average_prediction(self):
@@ -81,3 +196,85 @@ class WeightedAverage:
         self.weighted_model_predictions()
         self.weighted_average_predictions['Dates'] = self.predictions_reshaped['Dates']
         self.weighted_average_predictions['True'] = self.predictions_reshaped['True']
+    
+    
+    def calculate_block_log_losses(self, predicted, true, block_ids, block_count):
+        """
+        Returns the class-balanced log loss of each block of rows, in a
+        single vectorized pass.
+        
+        predicted: array of predicted probabilities
+        
+        true: array of 0/1 labels
+        
+        block_ids: array, the block that each row belongs to
+        
+        block_count: number of blocks
+        """
+        predicted = np.clip(predicted, 1e-15, 1 - 1e-15)
+        row_losses = -(true * np.log(predicted) + (1 - true) * np.log(1 - predicted))
+        # each row is weighted by the inverse of its class's count within its
+        # own block, so that the classes present in a block carry the same
+        # total weight there (the models' calculate_log_loss_weights use the
+        # class frequencies of their training window instead)
+        class_counts = np.bincount(block_ids * 2 + true,
+                                   minlength=block_count * 2).reshape(block_count, 2)
+        row_weights = 1 / class_counts[block_ids, true]
+        return(np.bincount(block_ids, row_weights * row_losses, minlength=block_count)
+            / np.bincount(block_ids, row_weights, minlength=block_count))
+    
+    
+    def compare_weighting_schemes(self, optimal_params, cv_predictions,
+                                  full_predictions):
+        """
+        Evaluates every weighting scheme for every Test and output in one
+        batched call, and returns a dataframe of out-of-sample log losses
+        indexed by (Test, Output).
+        
+        optimal_params: {Test: {output: {model: optimal params}}}, with each
+        model's 'Best CV Score'
+        
+        cv_predictions: {Test: {output: {model: CV predictions}}}
+        
+        full_predictions: {Test: {output: {model: predictions}}}
+        """
+        blocks = [(test, output_name) for test in full_predictions
+                  for output_name in full_predictions[test]]
+        matrices = [self.get_prediction_matrix(full_predictions[test][output_name])
+                    for test, output_name in blocks]
+        block_ids = np.repeat(np.arange(len(blocks)),
+                              [len(matrix) for matrix in matrices])
+        prediction_matrix = np.concatenate(matrices)
+        true = np.concatenate([np.asarray(full_predictions[test][output_name]
+                                          [self.model_names[0]]['True'], dtype=int)
+                               for test, output_name in blocks])
+        cv_scores = np.array([[optimal_params[test][output_name][model_name]['Best CV Score']
+                               for model_name in self.model_names]
+                              for test, output_name in blocks])
+        
+        comparison = {}
+        for weighting_scheme in self.weighting_schemes:
+            intercepts = np.zeros(len(blocks))
+            if weighting_scheme == 'rank':
+                weights = self.get_rank_weights(cv_scores)
+            elif weighting_scheme == 'inverse_log_loss':
+                weights = self.get_inverse_log_loss_weights(cv_scores)
+            else:
+                weights = np.zeros(cv_scores.shape)
+                for block, (test, output_name) in enumerate(blocks):
+                    block_cv = cv_predictions[test][output_name]
+                    weights[block], intercepts[block] = self.fit_stacking_model(
+                        self.get_prediction_matrix(block_cv),
+                        block_cv[self.model_names[0]]['True'])
+            predicted = self.combine_predictions(prediction_matrix, weights[block_ids],
+                                                 intercepts=intercepts[block_ids],
+                                                 weighting_scheme=weighting_scheme)
+            comparison[weighting_scheme] = self.calculate_block_log_losses(predicted,
+                                                                           true,
+                                                                           block_ids,
+                                                                           len(blocks))
+        
+        self.scheme_comparison = pd.DataFrame(comparison,
+                                              index=pd.MultiIndex.from_tuples(blocks,
+                                                                              names=['Test', 'Output']))
+        return(self.scheme_comparison)
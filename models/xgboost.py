@@ -1,10 +1,13 @@
 """
 This module runs an XGBoost model.
 """
+import os
 import pandas as pd
-from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import log_loss
 
+from src.utils.timing import span
+from models.feature_store import get_model_scaler, get_model_store
+
 
 class XGBoost:
     """
@@ -19,6 +22,33 @@ class XGBoost:
         child_weight_range: range of child_weight values to use during grid-search
         
         lambda_range: range of lambda values to use during grid-search
+        
+        tree_method: XGBoost tree construction algorithm. 'hist' quantises
+        each fold's features once; 'exact' reproduces the original search
+        
+        nthread: threads per XGBoost fit. Set to 1 when models are run in
+        parallel worker processes, to avoid oversubscribing the CPU
+        
+        max_bin: number of histogram bins per feature for 'hist'
+        
+        n_estimators: number of trees, when it is not grid-searched
+        
+        n_estimators_range: numbers of trees to grid-search. Each fold is
+        trained once, up to the largest value, and every value is scored from
+        that fit. Empty (the default) keeps n_estimators fixed
+        
+        early_stopping_rounds: None trains every fold to the largest number
+        of trees. An integer stops once the fold's weighted log loss has not
+        improved for that many rounds. Larger tree counts then reuse the trees
+        up to the best round, and the count saved as 'N Estimators' is the
+        number of trees that cross-validation actually scored
+        
+        prefix_scaler: optional shared PrefixScaler, off which the scaling
+        parameters of every training window are read. When none is
+        provided, one is fit on the feature store on first use
+        
+        feature_store: optional shared FeatureStore of the final dataset.
+        When none is provided, one is built from "full_df" on first use
         """
         self.cv_params = {}
         self.cv_start = ''
@@ -29,6 +59,8 @@ class XGBoost:
         self.training_y = pd.DataFrame()
         self.testing_y = pd.DataFrame()
         self.full_df = pd.DataFrame()
+        self.prefix_scaler = None
+        self.feature_store = None
         self.log_loss_weights = []
         self.feature_names = []
         self.feature_dict = {}
@@ -40,6 +72,7 @@ class XGBoost:
         self.optimal_depth = -1
         self.optimal_child_weight = -1
         self.optimal_lambda = -1
+        self.optimal_n_estimators = -1
         self.best_cv_score = 100000
         self.depth_range = [1, 2, 3]
         self.child_weight_range = [2.5, 2, 1.5, 1, 0.5, 0.25, 0.1, 0.05, 0.025,
@@ -52,6 +85,14 @@ class XGBoost:
         self.metadata = {}
         self.importances = []
         self.scale_pos_weight = 1
+        self.tree_method = 'hist'
+        self.nthread = os.cpu_count()
+        self.max_bin = 256
+        self.cv_folds = {}
+        self.learning_rate = 0.1
+        self.n_estimators = 100
+        self.n_estimators_range = []
+        self.early_stopping_rounds = None
 
 
     def calculate_log_loss_weights(self):
@@ -76,139 +117,289 @@ class XGBoost:
             self.log_loss_weights.append(class_weights[str(sample)])
 
 
-    def get_cv_indices(self):
+    def build_dmatrix(self, x, y=None, weights=None, training=False):
         """
-        Gets indices for rows to be used during cross-validation.
+        Converts features (and labels) into an XGBoost DMatrix. Training
+        matrices for the 'hist' tree method are quantised once, up front, so
+        every grid point reuses the same histogram bins.
+        
+        x: array, scaled features
+        
+        y: iterable, labels
+        
+        weights: iterable, sample weights (used to score early stopping)
+        
+        training: boolean, whether the DMatrix will be trained on
         """
-        if self.full_df['Dates'][0] > self.full_df['Dates'][len(self.full_df) - 1]:
-            self.full_df = self.full_df[::-1]
-        self.full_df.reset_index(inplace=True)
-        self.full_df.drop('index', axis=1, inplace=True)
-        date_condition = ((self.full_df['Dates'] <= self.cv_end) &
-                          (self.full_df['Dates'] >= self.cv_start))
-        self.cv_indices = list(self.full_df[date_condition].index)
+        import xgboost as xgb
+        
+        if training and self.tree_method == 'hist' and hasattr(xgb, 'QuantileDMatrix'):
+            return(xgb.QuantileDMatrix(x, label=y, weight=weights,
+                                       max_bin=self.max_bin,
+                                       nthread=self.nthread))
+        return(xgb.DMatrix(x, label=y, weight=weights, nthread=self.nthread))
 
 
-    def cv_depth_weight(self):
+    def prepare_cv_folds(self, test_names):
+        """
+        Scales each walk-forward fold and builds its DMatrix objects once,
+        so that they are shared by every grid point.
+        
+        test_names: iterable, the Test numbers to prepare
         """
-        Runs cross-validation by grid-searching through depth and child_weight values.
+        for test_name in test_names:
+            if test_name in self.cv_folds:
+                continue
+            self.cv_start = self.cv_params[test_name]['cv_start']
+            self.cv_end = self.cv_params[test_name]['cv_end']
+            self.cv_indices = get_model_store(self).get_indices(self.cv_start, self.cv_end)
+            self.training_y = self.feature_store.get_labels(self.output_name, 0,
+                                                            self.cv_indices[0])
+            prefix_scaler = get_model_scaler(self)
+            training_x_scaled, testing_x_scaled = prefix_scaler.scale_fold(self.cv_indices[0],
+                                                                           self.cv_indices)
+            self.testing_y = self.feature_store.get_labels(self.output_name, self.cv_indices[0],
+                                                           self.cv_indices[-1] + 1)
+            self.log_loss_weights = []
+            self.calculate_log_loss_weights()
+            self.cv_folds[test_name] = {'Training': self.build_dmatrix(training_x_scaled,
+                                                                       self.training_y,
+                                                                       training=True),
+                                        'Testing': self.build_dmatrix(testing_x_scaled,
+                                                                      self.testing_y,
+                                                                      self.log_loss_weights),
+                                        'Testing_y': self.testing_y,
+                                        'Log Loss Weights': self.log_loss_weights,
+                                        'Scale Pos Weight': self.scale_pos_weight,
+                                        'Dates': self.feature_store.get_dates(self.cv_indices[0],
+                                                                              self.cv_indices[-1] + 1)}
+
+
+    def get_booster_params(self, depth, child_weight, reg_lambda):
         """
-        from xgboost import XGBClassifier
+        Returns the XGBoost training parameters for one grid point.
+        """
+        params = {'max_depth': depth, 'min_child_weight': child_weight,
+                  'gamma': 0, 'eta': self.learning_rate, 'lambda': reg_lambda,
+                  'alpha': 0, 'subsample': 1, 'colsample_bytree': 1,
+                  'objective': 'binary:logistic', 'booster': 'gbtree',
+                  'eval_metric': 'logloss',
+                  'tree_method': self.tree_method, 'nthread': self.nthread,
+                  'seed': 123, 'verbosity': 0,
+                  'scale_pos_weight': self.scale_pos_weight}
+        if self.tree_method == 'hist':
+            params['max_bin'] = self.max_bin
+        return(params)
+
+
+    def get_n_estimators_candidates(self):
+        """
+        Returns the numbers of trees to score during cross-validation.
+        """
+        if self.n_estimators_range:
+            return(sorted(self.n_estimators_range))
+        return([self.n_estimators])
+
+
+    def train_booster(self, params, training_dmatrix, testing_dmatrix,
+                      n_estimators_candidates, early_stopping=False):
+        """
+        Trains a booster once, up to the largest number of trees, and scores
+        every tree-count prefix from that single fit.
+        
+        Returns the booster, a dictionary of predicted class probabilities
+        for the testing DMatrix, keyed by number of trees, and a dictionary of
+        the number of trees that each prediction actually used, which is
+        smaller when early stopping stopped before that number.
+        
+        early_stopping: boolean, whether to stop adding trees once the
+        (weighted) log loss on the testing DMatrix stops improving
+        """
+        import xgboost as xgb
+        
+        max_rounds = max(n_estimators_candidates)
+        if early_stopping and self.early_stopping_rounds is not None:
+            booster = xgb.train(params, training_dmatrix,
+                                num_boost_round=max_rounds,
+                                evals=[(testing_dmatrix, 'cv')],
+                                early_stopping_rounds=self.early_stopping_rounds,
+                                verbose_eval=False)
+            # rounds trained after the best one, while waiting for the log
+            # loss to improve again, are not used
+            tree_limit = booster.best_iteration + 1
+        else:
+            booster = xgb.train(params, training_dmatrix,
+                                num_boost_round=max_rounds)
+            tree_limit = booster.num_boosted_rounds()
         
+        predicted_probs_by_n = {}
+        tree_counts = {}
+        for n_estimators in n_estimators_candidates:
+            tree_counts[n_estimators] = min(n_estimators, tree_limit)
+            positive_probs = booster.predict(testing_dmatrix,
+                                             iteration_range=(0, tree_counts[n_estimators]))
+            predicted_probs_by_n[n_estimators] = pd.DataFrame({0: 1 - positive_probs,
+                                                               1: positive_probs})
+        return(booster, predicted_probs_by_n, tree_counts)
+
+
+    def score_n_estimators(self, all_predicted_probs, all_testing_y, fold_tree_counts):
+        """
+        Scores every candidate number of trees over all folds. A candidate
+        that used the same trees as the next smaller one in every fold (as
+        early stopping capped both) has the same predictions, and is skipped.
+        
+        Returns a list of (log loss, number of trees, predicted probabilities)
+        in ascending order of trees, where the number of trees is the most
+        that any fold actually used.
+        
+        all_predicted_probs: dictionary of lists of each fold's predicted
+        probabilities, keyed by candidate
+        
+        all_testing_y: series, the labels of every fold
+        
+        fold_tree_counts: dictionary of lists of the number of trees each
+        fold used, keyed by candidate
+        """
+        scores = []
+        previous_tree_counts = None
+        for n_estimators in sorted(all_predicted_probs):
+            if fold_tree_counts[n_estimators] == previous_tree_counts:
+                continue
+            previous_tree_counts = fold_tree_counts[n_estimators]
+            predicted_probs = pd.concat(all_predicted_probs[n_estimators],
+                                        ignore_index=True)
+            log_loss_score = log_loss(y_true=all_testing_y,
+                                      y_pred=predicted_probs,
+                                      sample_weight=self.log_loss_weights)
+            scores.append((log_loss_score, max(previous_tree_counts), predicted_probs))
+        return(scores)
+
+
+    def get_importances(self, booster):
+        """
+        Returns normalised (gain) feature importances as a one-row dataframe,
+        with columns named after the features.
+        """
+        gains = booster.get_score(importance_type='gain')
+        importances = [gains.get('f{}'.format(feature), 0)
+                       for feature in range(len(self.feature_names))]
+        total_gain = sum(importances) or 1
+        importances = pd.DataFrame([importance / total_gain
+                                    for importance in importances]).T
+        importances.rename(columns=self.feature_dict, inplace=True)
+        return(importances)
+
+
+    def cv_depth_weight(self):
+        """
+        Runs cross-validation by grid-searching through depth and child_weight
+        values (and, if n_estimators_range is set, numbers of trees).
+        """
+        test_names = range(1, self.test_name + 1)
+        self.prepare_cv_folds(test_names)
+        n_estimators_candidates = self.get_n_estimators_candidates()
         for depth in self.depth_range:
             for child_weight in self.child_weight_range:
-                all_predicted_probs = pd.DataFrame()
-                all_testing_y = pd.Series()
-                dates = []
-                self.log_loss_weights = []
-                for test_name in range(1, self.test_name + 1):
-                    self.cv_start = self.cv_params[test_name]['cv_start']
-                    self.cv_end = self.cv_params[test_name]['cv_end']
-                    self.get_cv_indices()
-                    training_x = self.full_df.loc[: (self.cv_indices[0] - 1),
-                                                  self.feature_names]
-                    self.training_y = self.full_df.loc[: (self.cv_indices[0] - 1),
-                                                       self.output_name]
-                    scaler = StandardScaler()
-                    scaler.fit(training_x)
-                    training_x_scaled = scaler.transform(training_x)
-                    testing_x = self.full_df[self.feature_names].loc[self.cv_indices]
-                    testing_x_scaled = scaler.transform(testing_x)
-                    self.testing_y = self.full_df[self.output_name].loc[self.cv_indices]
-                    self.calculate_log_loss_weights()
-                    xgboost = XGBClassifier(max_depth=depth,
-                                            min_child_weight=child_weight,
-                                            gamma=0, learning_rate=0.1,
-                                            n_estimators=100, reg_lambda=0.01,
-                                            reg_alpha=0, subsample=1,
-                                            colsample_bytree=1,
-                                            objective='binary:logistic',
-                                            booster='gbtree', silent=True,
-                                            random_state=123,
-                                            scale_pos_weight=self.scale_pos_weight)
-                    xgboost.fit(X=training_x_scaled, y=self.training_y)
+                with span('XGBoost', 'grid point', depth=depth, child_weight=child_weight):
+                    all_predicted_probs = {n: [] for n in n_estimators_candidates}
+                    fold_tree_counts = {n: [] for n in n_estimators_candidates}
+                    all_testing_y = pd.Series()
+                    dates = []
+                    self.log_loss_weights = []
+                    for test_name in test_names:
+                        fold = self.cv_folds[test_name]
+                        self.scale_pos_weight = fold['Scale Pos Weight']
+                        params = self.get_booster_params(depth=depth,
+                                                         child_weight=child_weight,
+                                                         reg_lambda=0.01)
+                        booster, predicted_probs_by_n, tree_counts = self.train_booster(params,
+                                                                                        fold['Training'],
+                                                                                        fold['Testing'],
+                                                                                        n_estimators_candidates,
+                                                                                        early_stopping=True)
                     
-                    predicted_probs = pd.DataFrame(xgboost.predict_proba(testing_x_scaled))
-                    all_predicted_probs = all_predicted_probs.append(predicted_probs,
-                                                                     ignore_index=True)
-                    all_testing_y = all_testing_y.append(self.testing_y)
-                    dates.extend(self.full_df['Dates'].loc[self.cv_indices])
-                        
-                log_loss_score = log_loss(y_true=all_testing_y,
-                                          y_pred=all_predicted_probs,
-                                          sample_weight=self.log_loss_weights)
-                if log_loss_score < self.best_cv_score:
-                    self.best_cv_score = log_loss_score
-                    self.optimal_depth = depth
-                    self.optimal_child_weight = child_weight
-                    self.xgboost_cv_predictions['Dates'] = dates
-                    self.xgboost_cv_predictions['True'] = all_testing_y.to_list()
-                    self.xgboost_cv_predictions['Predicted'] = all_predicted_probs[1].to_list()
+                        for n_estimators in n_estimators_candidates:
+                            all_predicted_probs[n_estimators].append(predicted_probs_by_n[n_estimators])
+                            fold_tree_counts[n_estimators].append(tree_counts[n_estimators])
+                        all_testing_y = all_testing_y.append(fold['Testing_y'])
+                        self.log_loss_weights.extend(fold['Log Loss Weights'])
+                        dates.extend(fold['Dates'])
+                
+                    # candidates are scored in ascending order, so that ties go
+                    # to the fewest trees
+                    for log_loss_score, n_estimators, predicted_probs in self.score_n_estimators(all_predicted_probs,
+                                                                                                   all_testing_y,
+                                                                                                   fold_tree_counts):
+                        if log_loss_score < self.best_cv_score:
+                            self.best_cv_score = log_loss_score
+                            self.optimal_depth = depth
+                            self.optimal_child_weight = child_weight
+                            self.optimal_n_estimators = n_estimators
+                            self.xgboost_cv_predictions['Dates'] = dates
+                            self.xgboost_cv_predictions['True'] = all_testing_y.to_list()
+                            self.xgboost_cv_predictions['Predicted'] = predicted_probs[1].to_list()
 
 
     def cv_lambda(self):
         """
-        Runs cross-validation by grid-searching through reg_lambda values.
+        Runs cross-validation by grid-searching through reg_lambda values
+        (and, if n_estimators_range is set, numbers of trees).
         """
-        from xgboost import XGBClassifier
-        
+        test_names = range(1, max(self.test_name + 1, 2))
+        self.prepare_cv_folds(test_names)
+        n_estimators_candidates = self.get_n_estimators_candidates()
         for reg_lambda in self.lambda_range:
-            all_predicted_probs = pd.DataFrame()
-            all_testing_y = pd.Series()
-            self.log_loss_weights = []
-            for test_name in range(1, max(self.test_name + 1, 2)):
-                self.cv_start = self.cv_params[test_name]['cv_start']
-                self.cv_end = self.cv_params[test_name]['cv_end']
-                self.get_cv_indices()
-                training_x = self.full_df.loc[: (self.cv_indices[0] - 1),
-                                              self.feature_names]
-                self.training_y = self.full_df.loc[: (self.cv_indices[0] - 1),
-                                                   self.output_name]
-                scaler = StandardScaler()
-                scaler.fit(training_x)
-                training_x_scaled = scaler.transform(training_x)
-                testing_x = self.full_df[self.feature_names].loc[self.cv_indices]
-                testing_x_scaled = scaler.transform(testing_x)
-                self.testing_y = self.full_df[self.output_name].loc[self.cv_indices]
-                self.calculate_log_loss_weights()
-                xgboost = XGBClassifier(max_depth=self.optimal_depth,
-                                        min_child_weight=self.optimal_child_weight,
-                                        gamma=0, learning_rate=0.1,
-                                        n_estimators=100, reg_lambda=reg_lambda,
-                                        reg_alpha=0, subsample=1,
-                                        colsample_bytree=1,
-                                        objective='binary:logistic',
-                                        booster='gbtree', silent=True,
-                                        random_state=123,
-                                        scale_pos_weight=self.scale_pos_weight)
-                xgboost.fit(X=training_x_scaled, y=self.training_y)
-                feature_importances = pd.DataFrame(xgboost.feature_importances_).T
-                feature_importances.rename(columns=self.feature_dict, inplace=True)
+            with span('XGBoost', 'grid point', reg_lambda=reg_lambda):
+                all_predicted_probs = {n: [] for n in n_estimators_candidates}
+                fold_tree_counts = {n: [] for n in n_estimators_candidates}
+                all_testing_y = pd.Series()
+                self.log_loss_weights = []
+                for test_name in test_names:
+                    fold = self.cv_folds[test_name]
+                    self.scale_pos_weight = fold['Scale Pos Weight']
+                    params = self.get_booster_params(depth=self.optimal_depth,
+                                                     child_weight=self.optimal_child_weight,
+                                                     reg_lambda=reg_lambda)
+                    booster, predicted_probs_by_n, tree_counts = self.train_booster(params,
+                                                                                    fold['Training'],
+                                                                                    fold['Testing'],
+                                                                                    n_estimators_candidates,
+                                                                                    early_stopping=True)
+                    feature_importances = self.get_importances(booster)
                 
-                predicted_probs = pd.DataFrame(xgboost.predict_proba(testing_x_scaled))
-                all_predicted_probs = all_predicted_probs.append(predicted_probs,
-                                                                 ignore_index=True)
-                all_testing_y = all_testing_y.append(self.testing_y)
-                    
-            log_loss_score = log_loss(y_true=all_testing_y,
-                                      y_pred=all_predicted_probs,
-                                      sample_weight=self.log_loss_weights)
-            if log_loss_score <= self.best_cv_score:
-                self.best_cv_score = log_loss_score
-                self.optimal_lambda = reg_lambda
-                self.importances = feature_importances
+                    for n_estimators in n_estimators_candidates:
+                        all_predicted_probs[n_estimators].append(predicted_probs_by_n[n_estimators])
+                        fold_tree_counts[n_estimators].append(tree_counts[n_estimators])
+                    all_testing_y = all_testing_y.append(fold['Testing_y'])
+                    self.log_loss_weights.extend(fold['Log Loss Weights'])
+            
+                # min keeps the first of tied scores, i.e. the fewest trees
+                log_loss_score, n_estimators, predicted_probs = min(self.score_n_estimators(all_predicted_probs,
+                                                                                            all_testing_y,
+                                                                                            fold_tree_counts),
+                                                                    key=lambda score: score[0])
+                if log_loss_score <= self.best_cv_score:
+                    self.best_cv_score = log_loss_score
+                    self.optimal_lambda = reg_lambda
+                    self.optimal_n_estimators = n_estimators
+                    self.importances = feature_importances
 
 
     def run_xgboost_cv(self):
         """
         Runs the staged cross-validation process for XGBoost.
         """
+        self.cv_folds = {}
+        self.optimal_n_estimators = self.n_estimators
         self.cv_depth_weight()
         self.cv_lambda()
+        self.cv_folds = {}
                     
         self.xgboost_optimal_params['Depth'] = self.optimal_depth
         self.xgboost_optimal_params['Min Child Weight'] = self.optimal_child_weight
         self.xgboost_optimal_params['Lambda'] = self.optimal_lambda
+        self.xgboost_optimal_params['N Estimators'] = self.optimal_n_estimators
         self.xgboost_optimal_params['Best CV Score'] = self.best_cv_score
         self.metadata['Importances'] = self.importances.to_dict()
         
@@ -217,45 +408,40 @@ class XGBoost:
         """
         Performs prediction on the hold-out sample.
         """
-        from xgboost import XGBClassifier
-        
         self.optimal_depth = self.xgboost_optimal_params['Depth']
         self.optimal_child_weight = self.xgboost_optimal_params['Min Child Weight']
         self.optimal_lambda = self.xgboost_optimal_params['Lambda']
+        self.optimal_n_estimators = self.xgboost_optimal_params.get('N Estimators',
+                                                                    self.n_estimators)
         all_predicted_probs = pd.DataFrame()
         all_testing_y = pd.Series()
         dates = []
         self.log_loss_weights = []
-        training_x = self.full_df.loc[: (self.pred_indices[0] - 1),
-                                      self.feature_names]
-        self.training_y = self.full_df.loc[: (self.pred_indices[0] - 1),
-                                           self.output_name]
-        scaler = StandardScaler()
-        scaler.fit(training_x)
-        training_x_scaled = scaler.transform(training_x)
-        self.testing_y = self.full_df[self.output_name].loc[self.pred_indices]
+        self.feature_store = get_model_store(self)
+        self.training_y = self.feature_store.get_labels(self.output_name, 0,
+                                                        self.pred_indices[0])
+        prefix_scaler = get_model_scaler(self)
+        training_x_scaled, testing_x_scaled = prefix_scaler.scale_fold(self.pred_indices[0],
+                                                                       self.pred_indices)
+        self.testing_y = self.feature_store.get_labels(self.output_name, self.pred_indices[0],
+                                                       self.pred_indices[-1] + 1)
         self.calculate_log_loss_weights()
-        xgboost = XGBClassifier(max_depth=self.optimal_depth,
-                                min_child_weight=self.optimal_child_weight,
-                                gamma=0, learning_rate=0.1,
-                                n_estimators=100, reg_lambda=self.optimal_lambda,
-                                reg_alpha=0, subsample=1,
-                                colsample_bytree=1,
-                                objective='binary:logistic',
-                                booster='gbtree', silent=True,
-                                random_state=123,
-                                scale_pos_weight=self.scale_pos_weight)
-        xgboost.fit(X=training_x_scaled, y=self.training_y)
-        self.importances = pd.DataFrame(xgboost.feature_importances_).T
-        self.importances.rename(columns=self.feature_dict, inplace=True)
+        params = self.get_booster_params(depth=self.optimal_depth,
+                                         child_weight=self.optimal_child_weight,
+                                         reg_lambda=self.optimal_lambda)
 
-        testing_x = self.full_df[self.feature_names].loc[self.pred_indices]
-        testing_x_scaled = scaler.transform(testing_x)
-        predicted_probs = pd.DataFrame(xgboost.predict_proba(testing_x_scaled))
-        all_predicted_probs = all_predicted_probs.append(predicted_probs,
+        booster, predicted_probs_by_n, _ = self.train_booster(params,
+                                                              self.build_dmatrix(training_x_scaled,
+                                                                                 self.training_y,
+                                                                                 training=True),
+                                                              self.build_dmatrix(testing_x_scaled),
+                                                              [self.optimal_n_estimators])
+        self.importances = self.get_importances(booster)
+        all_predicted_probs = all_predicted_probs.append(predicted_probs_by_n[self.optimal_n_estimators],
                                                          ignore_index=True)
         all_testing_y = all_testing_y.append(self.testing_y)
-        dates.extend(self.full_df['Dates'].loc[self.pred_indices])
+        dates.extend(self.feature_store.get_dates(self.pred_indices[0],
+                                                  self.pred_indices[-1] + 1))
             
         self.xgboost_pred_error = log_loss(y_true=all_testing_y,
                                            y_pred=all_predicted_probs,
@@ -264,7 +450,7 @@ class XGBoost:
         self.xgboost_predictions['True'] = all_testing_y.to_list()
         self.xgboost_predictions['Predicted'] = all_predicted_probs[1].to_list()
         self.metadata['Importances'] = self.importances.to_dict()
-        
+
 #MIT License
 #
 #Copyright (c) 2019 Terrence Zhang
@@ -0,0 +1,170 @@
+"""
+This module benchmarks the local prediction service against the command-line
+scoring path (a fresh Python process that imports the deployment code, loads
+the latest deployment artifact and scores one value with it), comparing
+latency and throughput. The command-line path leaves out the data fetch and
+the refit of a full deploy, which the artifact spares when the data are
+unchanged.
+
+Run from the repository root, after a deployment has saved an artifact:
+    python -m src.benchmarks.prediction_service
+"""
+import sys
+import json
+import time
+import asyncio
+import threading
+import subprocess
+import http.client
+import numpy as np
+import pandas as pd
+
+import RecessionPredictor_paths as path
+from src.models.prediction_service import PredictionService
+
+
+class PredictionServiceBenchmark:
+    """
+    The manager class for this module.
+    """
+    
+    
+    def __init__(self):
+        """
+        request_count: number of sequential requests per service endpoint
+        
+        batch_size: number of values per batched POST /score request
+        
+        cli_runs: number of command-line runs (each pays Python startup,
+        imports and an artifact load, so a few are enough)
+        """
+        self.request_count = 1000
+        self.batch_size = 10000
+        self.cli_runs = 3
+        self.service = PredictionService(port=0)
+        self.cli_command = [sys.executable, '-c',
+                            'import joblib; '
+                            'import numpy as np; '
+                            'from src.models.deployment import get_artifact_paths; '
+                            'artifact = joblib.load(get_artifact_paths()[0]); '
+                            "fitted_svm = artifact['Fitted Models']['Recession_in_12mo']['SVM']; "
+                            "values = np.zeros((1, len(artifact['Feature Names']))); "
+                            "print(fitted_svm['Model'].predict_proba(fitted_svm['Scaler'].transform(values)))"]
+        self.results = pd.DataFrame()
+    
+    
+    def start_service(self):
+        """
+        Runs the service on an event loop in a background thread.
+        """
+        loop = asyncio.new_event_loop()
+        started = threading.Event()
+        
+        def run_loop():
+            asyncio.set_event_loop(loop)
+            loop.run_until_complete(self.service.start())
+            started.set()
+            loop.run_forever()
+        
+        threading.Thread(target=run_loop, daemon=True).start()
+        started.wait()
+    
+    
+    def time_requests(self, method, target, body=None):
+        """
+        Sends "request_count" sequential requests over one keep-alive
+        connection, and returns the latency of each, in milliseconds.
+        """
+        connection = http.client.HTTPConnection(self.service.host, self.service.port)
+        headers = {'Content-Type': 'application/json'}
+        latencies = []
+        for _ in range(self.request_count):
+            start_time = time.perf_counter()
+            connection.request(method, target, body=body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            latencies.append((time.perf_counter() - start_time) * 1000)
+            if response.status != 200:
+                raise RuntimeError('{} {} returned {}'.format(method, target,
+                                                             response.status))
+        connection.close()
+        return(np.array(latencies))
+    
+    
+    def summarize(self, name, latencies, values_per_request=1):
+        """
+        Returns latency percentiles and throughput for one path.
+        """
+        return({'Path': name,
+                'p50 ms': round(np.percentile(latencies, 50), 3),
+                'p99 ms': round(np.percentile(latencies, 99), 3),
+                'Values / s': round(values_per_request * 1000 / latencies.mean(), 1)})
+    
+    
+    def run_benchmark(self):
+        """
+        Benchmarks each path and prints a comparison table.
+        """
+        print('\nBenchmarking the prediction service...')
+        self.start_service()
+        if self.service.model is None:
+            raise LookupError('No deployment artifact found in {}'.format(path.deployment_artifacts))
+        results = []
+        
+        last_date = max(self.service.probabilities_by_date)
+        print('\t|--GET /probability')
+        latencies = self.time_requests('GET', '/probability?date={}'.format(last_date))
+        results.append(self.summarize('GET /probability', latencies))
+        
+        print('\t|--POST /score (1 value)')
+        feature_count = self.service.scaler.mean_.shape[0]
+        body = json.dumps({'values': np.zeros((1, feature_count)).tolist()})
+        latencies = self.time_requests('POST', '/score', body)
+        results.append(self.summarize('POST /score (1 value)', latencies))
+        
+        print('\t|--POST /score ({} values)'.format(self.batch_size))
+        values = np.random.RandomState(123).normal(size=(self.batch_size, feature_count))
+        body = json.dumps({'values': values.tolist()})
+        self.request_count = max(1, self.request_count // 100)
+        latencies = self.time_requests('POST', '/score', body)
+        results.append(self.summarize('POST /score ({} values)'.format(self.batch_size),
+                                      latencies, values_per_request=self.batch_size))
+        
+        print('\t|--Command line (load artifact and score)')
+        latencies = []
+        for _ in range(self.cli_runs):
+            start_time = time.perf_counter()
+            subprocess.run(self.cli_command, check=True, stdout=subprocess.DEVNULL)
+            latencies.append((time.perf_counter() - start_time) * 1000)
+        results.append(self.summarize('Command line (load artifact and score)',
+                                      np.array(latencies)))
+        
+        self.results = pd.DataFrame(results).set_index('Path')
+        print('\n{}'.format(self.results.to_string()))
+        return(self.results)
+
+
+if __name__ == '__main__':
+    PredictionServiceBenchmark().run_benchmark()
+
+#MIT License
+#
+#Copyright (c) 2019 Terrence Zhang
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
\ No newline at end of file
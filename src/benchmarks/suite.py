@@ -0,0 +1,388 @@
+"""
+This module benchmarks the pipeline's main stages on synthetic datasets at
+several multiples of the real dataset's length, in parallel worker
+processes, and compares the timings of two commits. It runs fully offline.
+
+Run from the repository root:
+    python -m src.benchmarks.suite
+    python -m src.benchmarks.suite --scales 1 10 --targets KNN SVM
+    python -m src.benchmarks.suite --compare <base commit> <head commit>
+"""
+import io
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+import subprocess
+import numpy as np
+import pandas as pd
+
+import RecessionPredictor_paths as path
+from src.data.synthetic_dataset import SyntheticDataset
+from src.utils.dates import get_window, to_datetime64
+
+
+# Real walk-forward Test boundaries, as months after the first month of the
+# real dataset (1955-08), so that they can be stretched to any scale.
+BACKTEST_MONTHS = {1: {'cv_start': 197, 'cv_end': 244, 'pred_start': 245, 'pred_end': 311},
+                   2: {'cv_start': 245, 'cv_end': 311, 'pred_start': 312, 'pred_end': 335},
+                   3: {'cv_start': 245, 'cv_end': 335, 'pred_start': 336, 'pred_end': 448},
+                   4: {'cv_start': 336, 'cv_end': 448, 'pred_start': 449, 'pred_end': 575},
+                   5: {'cv_start': 449, 'cv_end': 575, 'pred_start': 576, 'pred_end': 661},
+                   6: {'cv_start': 576, 'cv_end': 661, 'pred_start': 662, 'pred_end': 768}}
+# Deployment keeps its real cv_start, and splits the remaining months between
+# cross-validation and prediction.
+DEPLOYMENT_MONTHS = {1: {'cv_start': 662, 'cv_end': 700, 'pred_start': 701, 'pred_end': 768}}
+FEATURE_NAMES = ['Payrolls_3mo_vs_12mo', 'Real_Fed_Funds_Rate_12mo_chg',
+                 'CPI_3mo_pct_chg_annualized', '10Y_Treasury_Rate_12mo_chg',
+                 '3M_10Y_Treasury_Spread', 'S&P_500_12mo_chg']
+OUTPUT_NAMES = ['Recession', 'Recession_within_6mo', 'Recession_within_12mo',
+                'Recession_within_24mo']
+MODEL_NAMES = ['KNN', 'Elastic_Net', 'Naive_Bayes', 'SVM', 'Gaussian_Process', 'XGBoost']
+
+
+def get_testing_dates(testing_months, scale):
+    """
+    Stretches Test boundaries to a synthetic dataset of the given scale.
+    
+    testing_months: {Test: {boundary: months after the first month}}
+    
+    scale: float, multiple of the real dataset's length
+    """
+    dataset = SyntheticDataset()
+    return({test_name: {boundary: dataset.get_date(months, scale)
+                        for boundary, months in boundaries.items()}
+            for test_name, boundaries in testing_months.items()})
+
+
+def build_model(model_name, full_df, scale):
+    """
+    Returns a model set up for cross-validation over every Test, as in
+    testing.CrossValidate.
+    
+    model_name: name of the model
+    
+    full_df: dataframe, the labelled synthetic dataset
+    
+    scale: float, multiple of the real dataset's length
+    """
+    if model_name == 'KNN':
+        from models.knn import KNN as Model
+    elif model_name == 'Elastic_Net':
+        from models.elastic_net import ElasticNet as Model
+    elif model_name == 'Naive_Bayes':
+        from models.naive_bayes import NaiveBayes as Model
+    elif model_name == 'SVM':
+        from models.svm import SupportVectorMachine as Model
+    elif model_name == 'Gaussian_Process':
+        from models.gp import GaussianProcess as Model
+    else:
+        from models.xgboost import XGBoost as Model
+    try:
+        from models.prefix_scaler import PrefixScaler
+    except ImportError:
+        PrefixScaler = None
+    
+    model = Model()
+    model.cv_params = get_testing_dates(BACKTEST_MONTHS, scale)
+    model.test_name = len(BACKTEST_MONTHS)
+    model.full_df = full_df
+    model.feature_names = FEATURE_NAMES
+    model.output_name = 'Recession_within_12mo'
+    if PrefixScaler is not None:
+        model.prefix_scaler = PrefixScaler().fit(full_df[FEATURE_NAMES])
+    return(model)
+
+
+def get_cv_method(model_name, model):
+    """
+    Returns the cross-validation method of a model.
+    
+    model_name: name of the model
+    
+    model: the model
+    """
+    cv_methods = {'KNN': 'run_knn_cv', 'Elastic_Net': 'run_elastic_net_cv',
+                  'Naive_Bayes': 'run_bayes_cv', 'SVM': 'run_svm_cv',
+                  'Gaussian_Process': 'run_gauss_cv', 'XGBoost': 'run_xgboost_cv'}
+    return(getattr(model, cv_methods[model_name]))
+
+
+def get_synthetic_predictions(full_df, scale, random_state):
+    """
+    Returns synthetic model predictions for every Test, output and model,
+    in the nested layout of Backtester.full_predictions, plus matching CV
+    predictions and optimal params.
+    
+    full_df: dataframe, the labelled synthetic dataset
+    
+    scale: float, multiple of the real dataset's length
+    
+    random_state: numpy RandomState
+    """
+    testing_dates = get_testing_dates(BACKTEST_MONTHS, scale)
+    sorted_dates = to_datetime64(full_df['Dates'])
+    full_predictions = {}
+    cv_predictions = {}
+    optimal_params = {}
+    for test_name, test_dates in testing_dates.items():
+        test = 'Test #{}'.format(test_name)
+        full_predictions[test], cv_predictions[test], optimal_params[test] = {}, {}, {}
+        windows = {'pred': (test_dates['pred_start'], test_dates['pred_end']),
+                   'cv': (test_dates['cv_start'], test_dates['cv_end'])}
+        for output_name in OUTPUT_NAMES:
+            for window, (start, end) in windows.items():
+                rows = full_df.iloc[slice(*get_window(sorted_dates, start, end))]
+                true = rows[output_name].to_numpy()
+                predictions_by_model = {}
+                for model_name in MODEL_NAMES:
+                    log_odds = (2 * true - 1) * random_state.uniform(0.5, 2) + random_state.normal(0, 1.5, len(true))
+                    predictions_by_model[model_name] = {'Dates': rows['Dates'].tolist(),
+                                                        'True': true.tolist(),
+                                                        'Predicted': (1 / (1 + np.exp(-log_odds))).tolist()}
+                if window == 'pred':
+                    full_predictions[test][output_name] = predictions_by_model
+                else:
+                    cv_predictions[test][output_name] = predictions_by_model
+            optimal_params[test][output_name] = {model_name: {'Best CV Score': random_state.uniform(0.3, 0.7)}
+                                                 for model_name in MODEL_NAMES}
+    return(full_predictions, cv_predictions, optimal_params)
+
+
+def run_benchmark_job(target, scale, seed):
+    """
+    Times one target on a synthetic dataset of one scale, in a worker
+    process. Returns the timing, or the error if the target failed.
+    
+    target: name of the benchmarked stage (see BenchmarkSuite.targets)
+    
+    scale: float, multiple of the real dataset's length
+    
+    seed: int, random seed of the synthetic dataset
+    """
+    import warnings
+    warnings.filterwarnings('ignore')
+    
+    result = {'Target': target, 'Scale': scale, 'Rows': 0, 'Wall Seconds': np.nan,
+              'CPU Seconds': np.nan, 'Status': 'ok'}
+    try:
+        dataset = SyntheticDataset(seed=seed)
+        if target == 'label_output':
+            from src.features.build_features_and_labels import FinalizeDataset
+            
+            finalize = FinalizeDataset(data=None)
+            finalize.final_df_output = dataset.generate(scale).set_index('Dates').sort_index()
+            run = finalize.label_output
+        elif target == 'Weighted_Average':
+            from models.weighted_average import WeightedAverage
+            
+            full_df = dataset.get_labelled_dataset(scale)
+            predictions = get_synthetic_predictions(full_df, scale,
+                                                    np.random.RandomState(seed))
+            weighted_average = WeightedAverage()
+            weighted_average.model_names = MODEL_NAMES
+            run = lambda: weighted_average.compare_weighting_schemes(predictions[2],
+                                                                     predictions[1],
+                                                                     predictions[0])
+        elif target == 'Deployer':
+            from src.models.deployment import Deployer
+            
+            class BenchmarkDeployer(Deployer):
+                def fill_testing_dates(self):
+                    self.testing_dates = get_testing_dates(DEPLOYMENT_MONTHS, scale)
+            
+            full_df = dataset.get_labelled_dataset(scale)
+            full_df = full_df.rename(columns={'Dates': 'date',
+                                              '3M_10Y_Treasury_Spread': 'Benchmark'})
+            # the series key keeps benchmark outputs apart from real ones
+            deployer = BenchmarkDeployer(full_df, series_key='Benchmark')
+            deployer.use_artifacts = False
+            run = deployer.run_test_procedures
+        else:
+            full_df = dataset.get_labelled_dataset(scale)
+            run = get_cv_method(target, build_model(target, full_df, scale))
+        result['Rows'] = dataset.get_length(scale)
+        
+        with contextlib.redirect_stdout(io.StringIO()):
+            start_cpu = time.process_time()
+            start_wall = time.perf_counter()
+            run()
+            result['Wall Seconds'] = time.perf_counter() - start_wall
+            result['CPU Seconds'] = time.process_time() - start_cpu
+    except Exception as error:
+        result['Status'] = '{}: {}'.format(type(error).__name__, error)
+    return(result)
+
+
+class BenchmarkSuite:
+    """
+    The manager class for this module.
+    """
+    
+    
+    def __init__(self):
+        """
+        targets: stages to benchmark. 'label_output' is
+        FinalizeDataset.label_output, each model name is that model's
+        run_*_cv over every Test, 'Weighted_Average' is
+        WeightedAverage.compare_weighting_schemes, and 'Deployer' is
+        Deployer.run_test_procedures
+        
+        scales: multiples of the real dataset's length
+        
+        max_scales: largest scale run for targets whose cost grows faster
+        than linearly with the number of rows
+        
+        workers: number of worker processes. Jobs that share the machine
+        slow each other down, so compare CPU seconds, or use fewer workers,
+        for the steadiest timings
+        """
+        self.targets = ['label_output'] + MODEL_NAMES + ['Weighted_Average', 'Deployer']
+        self.scales = [1, 10, 100]
+        self.max_scales = {'SVM': 10, 'Gaussian_Process': 1, 'XGBoost': 10,
+                           'Deployer': 10}
+        self.workers = max(1, os.cpu_count() // 2)
+        self.seed = 0
+        self.results = pd.DataFrame()
+    
+    
+    def get_jobs(self):
+        """
+        Returns the (target, scale) pairs to benchmark, largest first, so
+        that the slowest jobs start early.
+        """
+        jobs = [(target, scale) for target in self.targets for scale in self.scales
+                if scale <= self.max_scales.get(target, max(self.scales))]
+        return(sorted(jobs, key=lambda job: -job[1]))
+    
+    
+    def run_benchmark(self):
+        """
+        Runs every job in parallel, and prints and returns the results.
+        """
+        from concurrent.futures import ProcessPoolExecutor
+        
+        jobs = self.get_jobs()
+        print('\nRunning {} benchmarks on {} workers...'.format(len(jobs), self.workers))
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(run_benchmark_job, target, scale, self.seed)
+                       for target, scale in jobs]
+            results = [future.result() for future in futures]
+        self.results = pd.DataFrame(results).sort_values(['Target', 'Scale'])
+        self.results = self.results.reset_index(drop=True)
+        print('\n{}'.format(self.results.to_string(index=False)))
+        return(self.results)
+    
+    
+    def save_results(self, file_path):
+        """
+        Saves the results to a json file.
+        
+        file_path: string, where to save the results
+        """
+        self.results.to_json(file_path, orient='records')
+    
+    
+    def run_commit(self, commit, file_path):
+        """
+        Runs the suite against another commit: checks the commit out into a
+        temporary git worktree, and runs this suite there, so that the
+        commit's own code (and output paths) are used. Returns the results.
+        
+        commit: string, any git revision
+        
+        file_path: string, where to save the results
+        """
+        repository = os.getcwd()
+        worktree = tempfile.mkdtemp()
+        subprocess.run(['git', 'worktree', 'add', '--detach', worktree, commit],
+                       cwd=repository, check=True)
+        try:
+            # modules missing from an older commit (this suite, the data
+            # generator) are taken from this checkout
+            environment = dict(os.environ, PYTHONPATH=os.pathsep.join([worktree, repository]))
+            command = [sys.executable, '-m', 'src.benchmarks.suite',
+                       '--workers', str(self.workers), '--output', file_path,
+                       '--seed', str(self.seed),
+                       '--scales'] + [str(scale) for scale in self.scales]
+            command += ['--targets'] + self.targets
+            subprocess.run(command, cwd=worktree, env=environment, check=True)
+        finally:
+            subprocess.run(['git', 'worktree', 'remove', '--force', worktree],
+                           cwd=repository)
+            shutil.rmtree(worktree, ignore_errors=True)
+        return(pd.read_json(file_path, orient='records'))
+    
+    
+    def compare_commits(self, base_commit, head_commit):
+        """
+        Benchmarks two commits, one after the other, and prints and returns
+        the head commit's timings relative to the base commit's.
+        
+        base_commit, head_commit: strings, any git revisions
+        """
+        results = {}
+        for label, commit in [('Base', base_commit), ('Head', head_commit)]:
+            print('\nBenchmarking {} ({})...'.format(commit, label.lower()))
+            file_path = os.path.join(tempfile.gettempdir(),
+                                     'benchmark_{}.json'.format(label.lower()))
+            results[label] = self.run_commit(commit, file_path)
+        comparison = pd.merge(results['Base'], results['Head'], on=['Target', 'Scale', 'Rows'],
+                              suffixes=(' Base', ' Head'))
+        comparison['Wall Ratio'] = comparison['Wall Seconds Head'] / comparison['Wall Seconds Base']
+        comparison['CPU Ratio'] = comparison['CPU Seconds Head'] / comparison['CPU Seconds Base']
+        columns = ['Target', 'Scale', 'Rows', 'Wall Seconds Base', 'Wall Seconds Head',
+                   'Wall Ratio', 'CPU Ratio', 'Status Base', 'Status Head']
+        self.results = comparison[columns]
+        print('\n{}'.format(self.results.to_string(index=False)))
+        return(self.results)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--targets', nargs='+')
+    parser.add_argument('--scales', nargs='+', type=float)
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output')
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'HEAD'))
+    args = parser.parse_args()
+    
+    suite = BenchmarkSuite()
+    suite.seed = args.seed
+    if args.targets:
+        suite.targets = args.targets
+    if args.scales:
+        suite.scales = [int(scale) if scale.is_integer() else scale for scale in args.scales]
+    if args.workers:
+        suite.workers = args.workers
+    if args.compare:
+        suite.compare_commits(*args.compare)
+    else:
+        suite.run_benchmark()
+    suite.save_results(args.output or path.benchmark_results)
+
+#MIT License
+#
+#Copyright (c) 2019 Terrence Zhang
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
\ No newline at end of file
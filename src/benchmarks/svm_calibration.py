@@ -0,0 +1,126 @@
+"""
+This module benchmarks the SVM probability calibration methods, comparing
+log loss and runtime.
+
+Run from the repository root:
+    python -m src.benchmarks.svm_calibration
+"""
+import time
+import pandas as pd
+
+import RecessionPredictor_paths as path
+from models.svm import SupportVectorMachine
+from src.features.build_features_and_labels import FinalizeDataset
+from src.models.testing import Backtester
+
+
+class SVMCalibrationBenchmark:
+    """
+    The manager class for this module.
+    """
+
+
+    def __init__(self):
+        """
+        calibration_methods: SupportVectorMachine calibration methods to compare
+
+        test_name: the walk-forward Test whose cross-validation and
+        prediction windows are benchmarked
+        """
+        backtester = Backtester()
+        backtester.fill_testing_dates()
+        self.testing_dates = backtester.testing_dates
+        self.feature_names = backtester.feature_names
+        self.output_name = 'Recession'
+        self.calibration_methods = ['libsvm', 'sigmoid', 'isotonic']
+        self.test_name = 5
+        self.full_df = pd.DataFrame()
+        self.results = pd.DataFrame()
+
+
+    def load_dataset(self):
+        """
+        Builds a labelled, monthly dataset from the secondary dataset.
+        """
+        secondary_df = pd.read_json(path.data_secondary_most_recent)
+        secondary_df['Payrolls_3mo_vs_12mo'] = (secondary_df['Payrolls_3mo_pct_chg_annualized']
+            - secondary_df['Payrolls_12mo_pct_chg'])
+        secondary_df['Dates'] = secondary_df['Dates'].astype(str)
+        finalize = FinalizeDataset(data=None)
+        finalize.final_df_output = secondary_df.set_index('Dates').sort_index()
+        finalize.label_output()
+        self.full_df = finalize.final_df_output.rename(columns={'date': 'Dates'})
+
+
+    def benchmark_method(self, calibration_method):
+        """
+        Times cross-validation plus out-of-sample prediction for one
+        calibration method, and returns the results.
+
+        calibration_method: string, see SupportVectorMachine.calibration_method
+        """
+        svm = SupportVectorMachine()
+        svm.cv_params = self.testing_dates
+        svm.test_name = self.test_name
+        svm.full_df = self.full_df.copy()
+        svm.feature_names = self.feature_names
+        svm.output_name = self.output_name
+        svm.calibration_method = calibration_method
+
+        start_time = time.perf_counter()
+        svm.run_svm_cv()
+        cv_seconds = time.perf_counter() - start_time
+
+        test_dates = self.testing_dates[self.test_name]
+        svm.pred_indices = svm.feature_store.get_indices(test_dates['pred_start'],
+                                                         test_dates['pred_end'])
+        start_time = time.perf_counter()
+        svm.run_svm_prediction()
+        pred_seconds = time.perf_counter() - start_time
+
+        return({'Method': calibration_method,
+                'CV Seconds': round(cv_seconds, 2),
+                'Prediction Seconds': round(pred_seconds, 3),
+                'Best CV Log Loss': round(svm.best_cv_score, 4),
+                'Prediction Log Loss': round(svm.svm_pred_error, 4)})
+
+
+    def run_benchmark(self):
+        """
+        Benchmarks every calibration method and prints a comparison table.
+        """
+        print('\nBenchmarking SVM calibration methods...')
+        self.load_dataset()
+        results = []
+        for calibration_method in self.calibration_methods:
+            print('\t|--{}'.format(calibration_method))
+            results.append(self.benchmark_method(calibration_method))
+        self.results = pd.DataFrame(results).set_index('Method')
+        print('\n{}'.format(self.results.to_string()))
+        return(self.results)
+
+
+if __name__ == '__main__':
+    SVMCalibrationBenchmark().run_benchmark()
+
+#MIT License
+#
+#Copyright (c) 2019 Terrence Zhang
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
\ No newline at end of file
@@ -11,6 +11,7 @@ import requests as req
 from fredapi import fred, Fred
 
 import RecessionPredictor_paths as path
+from src.utils.timing import span
 
 
 class DataSeries:
@@ -68,7 +69,8 @@ class MakeDataset:
         fred = Fred(api_key=path.fred_api_key)
         print('\nGetting data from FRED API as of {}...'.format(most_recent_date))
 
-        self.primary_dictionary_output['10Y_Treasury_Rate'] = fred.get_series(series_key)
+        with span('fetch', 'data', series=series_key):
+            self.primary_dictionary_output['10Y_Treasury_Rate'] = fred.get_series(series_key)
         print('Finished getting data from FRED API!')
         return self.primary_dictionary_output
 
@@ -88,7 +90,27 @@ class MakeDataset:
         """
         out_df = self.get_primary_data(series_key)
         # Fill NaN value with the mean of the previous and the next row
-        out_df = out_df.interpolate()
+        with span('interpolate', 'data'):
+            out_df = out_df.interpolate()
+        return out_df
+
+    def get_all_series_data(self, series_keys):
+        """
+        Gets several FRED series into one dataset, with one column per series
+        key on a shared date index, then fills NaN values as get_all_data does.
+        
+        series_keys: list of FRED series ids (e.g. 'T10Y2Y', 'T10Y3M')
+        """
+        fred = Fred(api_key=path.fred_api_key)
+        print('\nGetting {} series from FRED API...'.format(len(series_keys)))
+        series = {}
+        for series_key in series_keys:
+            with span('fetch', 'data', series=series_key):
+                series[series_key] = fred.get_series(series_key)
+        out_df = pd.DataFrame(series)
+        print('Finished getting data from FRED API!')
+        with span('interpolate', 'data'):
+            out_df = out_df.interpolate()
         return out_df
 
 
@@ -0,0 +1,205 @@
+"""
+This module generates synthetic datasets shaped like the secondary dataset,
+for benchmarking without network access.
+
+Each feature is an AR(1) process with the mean, standard deviation and
+lag-1 autocorrelation of the real series (1955-08 to 2019-08), shifted
+during recessions and during the 12 months before each recession by the
+amounts measured on NBER-dated recessions. Recession episodes follow a
+two-state Markov chain with the historical average expansion and recession
+lengths.
+"""
+import numpy as np
+import pandas as pd
+from scipy.signal import lfilter
+
+
+class SyntheticDataset:
+    """
+    The manager class for this module.
+    """
+    
+    
+    def __init__(self, seed=0):
+        """
+        seed: int, random seed, so that every scale of dataset is reproducible
+        
+        real_length: number of months in the real secondary dataset, the
+        length of a 1x dataset
+        
+        column_parameters: for each column of the secondary dataset, its
+        (mean, standard deviation, lag-1 autocorrelation, shift during
+        recessions, shift during the 12 months before a recession), with
+        shifts in standard deviations
+        """
+        self.seed = int(seed)
+        self.start_year = 1955
+        self.start_month = 8
+        self.real_length = 769
+        self.lead_months = 12
+        self.mean_expansion_months = 74
+        self.mean_recession_months = 11
+        self.column_parameters = {'Payrolls_3mo_pct_chg_annualized': (0.01762, 0.02373, 0.911, -1.35, 0.04),
+                                  'Payrolls_12mo_pct_chg': (0.01771, 0.01968, 0.986, -0.64, 0.40),
+                                  'Unemployment_Rate': (5.919, 1.589, 0.993, -0.02, -0.67),
+                                  'Unemployment_Rate_12mo_chg': (-0.02263, 1.093, 0.967, 0.99, -0.04),
+                                  'Real_Fed_Funds_Rate': (1.245, 2.344, 0.967, -0.02, 0.53),
+                                  'Real_Fed_Funds_Rate_12mo_chg': (0.01658, 2.069, 0.933, -0.24, 0.87),
+                                  'CPI_3mo_pct_chg_annualized': (0.03631, 0.03275, 0.912, 0.94, 0.87),
+                                  'CPI_12mo_pct_chg': (0.03603, 0.02797, 0.991, 1.17, 0.89),
+                                  '10Y_Treasury_Rate_12mo_chg': (0.001717, 1.095, 0.937, 0.31, 0.64),
+                                  '3M_Treasury_Rate_12mo_chg': (0.01748, 1.634, 0.929, -0.44, 0.84),
+                                  '3M_10Y_Treasury_Spread': (1.478, 1.183, 0.959, -0.49, -1.41),
+                                  '3M_10Y_Treasury_Spread_12mo_chg': (-0.01576, 1.211, 0.912, 0.87, -0.55),
+                                  '5Y_10Y_Treasury_Spread': (0.3078, 0.4099, 0.973, -0.57, -1.13),
+                                  'S&P_500_3mo_chg': (0.0195, 0.07274, 0.681, -0.72, -0.37),
+                                  'S&P_500_12mo_chg': (0.0824, 0.1565, 0.921, -1.56, -0.26),
+                                  'IPI_3mo_pct_chg_annualized': (0.02911, 0.07622, 0.828, -1.34, -0.06),
+                                  'IPI_12mo_pct_chg': (0.02858, 0.05056, 0.967, -0.98, 0.13)}
+    
+    
+    def get_length(self, scale):
+        """
+        Returns the number of months in a dataset of the given scale.
+        
+        scale: float, multiple of the real dataset's length
+        """
+        return(int(round(self.real_length * scale)))
+    
+    
+    def get_dates(self, length):
+        """
+        Returns consecutive month-start dates, from the real dataset's first
+        month, as 'YYYY-MM-DD' strings. Strings (rather than timestamps) keep
+        100x datasets, which run past the year 2262, sortable and comparable.
+        
+        length: int, number of months
+        """
+        months = np.arange(length) + self.start_month - 1
+        years = (self.start_year + months // 12).astype(str)
+        months = np.char.zfill((months % 12 + 1).astype(str), 2)
+        return(np.char.add(np.char.add(np.char.add(years, '-'), months), '-01'))
+    
+    
+    def get_date(self, months_after_start, scale=1):
+        """
+        Returns the date that is "months_after_start" real months after the
+        first month, stretched by "scale".
+        
+        months_after_start: int, months after the real dataset's first month
+        
+        scale: float, multiple of the real dataset's length
+        """
+        return(str(self.get_dates(int(round(months_after_start * scale)) + 1)[-1]))
+    
+    
+    def simulate_recessions(self, length, random_state):
+        """
+        Returns a boolean array, True for months in a recession. Expansion
+        and recession lengths are drawn from geometric distributions.
+        
+        length: int, number of months
+        
+        random_state: numpy RandomState
+        """
+        episode_count = 2 * (length // (self.mean_expansion_months
+                                         + self.mean_recession_months) + 2)
+        mean_lengths = np.tile([self.mean_expansion_months, self.mean_recession_months],
+                               episode_count // 2)
+        episode_lengths = random_state.geometric(1 / mean_lengths)
+        while episode_lengths.sum() < length:
+            episode_lengths = np.concatenate([episode_lengths,
+                                              random_state.geometric(1 / mean_lengths)])
+        is_recession = np.arange(len(episode_lengths)) % 2 == 1
+        return(np.repeat(is_recession, episode_lengths)[:length])
+    
+    
+    def get_pre_recession(self, recession):
+        """
+        Returns a boolean array, True for the months before a recession starts
+        (up to "lead_months" of them).
+        
+        recession: boolean array, True for months in a recession
+        """
+        recession = np.asarray(recession, dtype=int)
+        # recession months in each window of the next "lead_months" months,
+        # as differences of a cumulative sum
+        cumulative = np.cumsum(np.concatenate([[0], recession[1:],
+                                               np.zeros(self.lead_months, dtype=int)]))
+        upcoming = cumulative[self.lead_months:] - cumulative[:-self.lead_months]
+        return((upcoming > 0) & (recession == 0))
+    
+    
+    def generate(self, scale=1):
+        """
+        Returns a dataset shaped like the secondary dataset: a 'Dates' column
+        and the same feature columns, newest month first.
+        
+        scale: float, multiple of the real dataset's length
+        """
+        length = self.get_length(scale)
+        random_state = np.random.RandomState(self.seed)
+        recession = self.simulate_recessions(length, random_state)
+        pre_recession = self.get_pre_recession(recession)
+        
+        dataset = {'Dates': self.get_dates(length)}
+        for column, parameters in self.column_parameters.items():
+            mean, std, autocorrelation, recession_shift, lead_shift = parameters
+            shift = recession_shift * recession + lead_shift * pre_recession
+            # regime shifts are phased in at the series' own persistence
+            shift = lfilter([1 - autocorrelation], [1, -autocorrelation], shift)
+            normal_mean = mean - std * shift.mean()
+            noise_std = std * np.sqrt(max(0.25, 1 - shift.var()))
+            innovations = random_state.normal(0, noise_std * np.sqrt(1 - autocorrelation ** 2),
+                                              length)
+            innovations[0] = random_state.normal(0, noise_std)
+            noise = lfilter([1], [1, -autocorrelation], innovations)
+            dataset[column] = normal_mean + std * shift + noise
+        self.recession = recession
+        return(pd.DataFrame(dataset).iloc[::-1].reset_index(drop=True))
+    
+    
+    def get_labelled_dataset(self, scale=1):
+        """
+        Returns a labelled dataset in chronological order, as used by the
+        models: the generated features plus 'Payrolls_3mo_vs_12mo', with
+        'Recession', 'Recession_in_12mo' and 'Recession_within_{6,12,24}mo'
+        int8 labels taken from the simulated recessions.
+        
+        scale: float, multiple of the real dataset's length
+        """
+        dataset = self.generate(scale).iloc[::-1].reset_index(drop=True)
+        dataset['Payrolls_3mo_vs_12mo'] = (dataset['Payrolls_3mo_pct_chg_annualized']
+            - dataset['Payrolls_12mo_pct_chg'])
+        recession = self.recession.astype(np.int8)
+        dataset['Recession'] = recession
+        padded = np.concatenate([recession, np.zeros(24, dtype=np.int8)])
+        dataset['Recession_in_12mo'] = padded[12:12 + len(recession)]
+        cumulative = np.cumsum(np.concatenate([[0], padded]))
+        for months in [6, 12, 24]:
+            upcoming = cumulative[months + 1:months + 1 + len(recession)] - cumulative[:len(recession)]
+            dataset['Recession_within_{}mo'.format(months)] = (upcoming > 0).astype(np.int8)
+        return(dataset)
+        
+        
+#MIT License
+#
+#Copyright (c) 2019 Terrence Zhang
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
\ No newline at end of file
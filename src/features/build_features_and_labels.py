@@ -2,9 +2,11 @@
 This module builds some additional features, labels the output, and consolidates
 features and output into the final dataset.
 """
+import numpy as np
 import pandas as pd
 
 import RecessionPredictor_paths as path
+from src.utils.timing import span
 
 
 class FinalizeDataset:
@@ -32,10 +34,11 @@ class FinalizeDataset:
                            '9': {'Begin': '2008-01-01', 'End': '2009-06-01'},
                            '10': {'Begin': '2020-03-01', 'End': '2020-04-01'}}
         
+        # labels are stored as int8, rather than as lists of Python ints
         observation_count = len(self.final_df_output)
-        self.final_df_output['Recession'] = [0] * observation_count
-        self.final_df_output['Recession_in_12mo'] = [0] * observation_count
-        self.final_df_output['Recession_within_12mo'] = [0] * observation_count
+        self.final_df_output['Recession'] = np.zeros(observation_count, dtype=np.int8)
+        self.final_df_output['Recession_in_12mo'] = np.zeros(observation_count, dtype=np.int8)
+        self.final_df_output['Recession_within_12mo'] = np.zeros(observation_count, dtype=np.int8)
         
         for recession in NBER_recessions:
             end_condition = (NBER_recessions[recession]['End']
@@ -44,7 +47,8 @@ class FinalizeDataset:
                 >= NBER_recessions[recession]['Begin'])
             self.final_df_output.loc[end_condition & begin_condition, 'Recession'] = 1
 
-        # take date index as a column
+        # take date index as a column, stored as datetime64 rather than strings
+        self.final_df_output.index = pd.to_datetime(self.final_df_output.index)
         self.final_df_output = self.final_df_output.reset_index()
         self.final_df_output = self.final_df_output.rename(columns={'index': 'date'})
 
@@ -63,15 +67,31 @@ class FinalizeDataset:
         print('\nCreating final dataset...')
         self.input_data.sort_index(inplace=True)
         self.final_df_output = self.input_data
-        self.label_output()
+        with span('label', 'data'):
+            self.label_output()
         new_cols = ['Recession', 'Recession_in_12mo',
                     'Recession_within_12mo', '10Y_Treasury_Rate', 'date']
         self.final_df_output = self.final_df_output[new_cols]
         print('Finished creating final dataset!')
         return self.final_df_output
-        # print('\t|--Saving final dataset to {}'.format(path.data_final))
-        # self.final_df_output.to_csv(path.data_final, index=False)
-        # print('\nFinal dataset saved to {}'.format(path.data_final))
+
+    def create_multi_series_dataset(self, series_keys):
+        """
+        Creates the final dataset for several series, labelling their shared
+        date index once.
+        
+        series_keys: names of the series columns in the input data
+        """
+        print('\nCreating final multi-series dataset...')
+        self.input_data.sort_index(inplace=True)
+        self.final_df_output = self.input_data
+        with span('label', 'data'):
+            self.label_output()
+        new_cols = ['Recession', 'Recession_in_12mo',
+                    'Recession_within_12mo'] + list(series_keys) + ['date']
+        self.final_df_output = self.final_df_output[new_cols]
+        print('Finished creating final dataset!')
+        return self.final_df_output
         
         
 #MIT License
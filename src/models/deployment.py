@@ -1,12 +1,63 @@
 """
 This module deploys the chosen model.
 """
+import os
+import re
 import json
+import hashlib
 import pandas as pd
 from datetime import datetime
 
 import RecessionPredictor_paths as path
 from models.deployment_svm import SupportVectorMachine
+from models.prefix_scaler import PrefixScaler
+from models.feature_store import FeatureStore
+from src.utils.timing import span
+
+
+def get_series_path(file_path, series_key=None):
+    """
+    Returns the path of an output file, suffixed with the series key when
+    one is given.
+    
+    file_path: string, the default output path
+    
+    series_key: string, name of the deployed series, or None for the
+    default series
+    """
+    if series_key is None:
+        return(file_path)
+    root, extension = os.path.splitext(file_path)
+    return('{}_{}{}'.format(root, series_key, extension))
+
+
+def get_series_feature_names(series_key=None):
+    """
+    Returns the names of the features that a series is deployed with.
+    
+    series_key: string, name of the deployed series, or None for the
+    default series
+    """
+    if series_key is None:
+        return(['10Y_Treasury_Rate'])
+    return([series_key])
+
+
+def get_artifact_paths(series_key=None):
+    """
+    Returns the saved deployment artifacts of one series, newest first.
+    
+    series_key: string, name of the deployed series, or None for the
+    default series
+    """
+    if not os.path.isdir(path.deployment_artifacts):
+        return([])
+    suffix = '' if series_key is None else '_{}'.format(series_key)
+    file_name_pattern = re.compile(r'deployment_svm_[0-9a-f]{16}' + re.escape(suffix) + r'\.joblib')
+    artifact_paths = [os.path.join(path.deployment_artifacts, file_name)
+                      for file_name in os.listdir(path.deployment_artifacts)
+                      if file_name_pattern.fullmatch(file_name)]
+    return(sorted(artifact_paths, key=os.path.getmtime, reverse=True))
 
 
 class CrossValidate:
@@ -18,6 +69,8 @@ class CrossValidate:
         self.cv_params = {}
         self.test_name = ''
         self.full_df = pd.DataFrame()
+        self.prefix_scaler = None
+        self.feature_store = None
         self.cv_indices = []
         self.feature_names = []
         self.feature_dict = {}
@@ -43,9 +96,12 @@ class CrossValidate:
             svm.cv_params = self.cv_params
             svm.test_name = self.test_name
             svm.full_df = self.full_df
+            svm.prefix_scaler = self.prefix_scaler
+            svm.feature_store = self.feature_store
             svm.feature_names = self.feature_names
             svm.output_name = output_name
-            svm.run_svm_cv()
+            with span('SVM', 'cv', test=self.test_name, output=output_name):
+                svm.run_svm_cv()
             optimal_params_by_model['SVM'] = svm.svm_optimal_params
             cv_metadata_by_model['SVM'] = svm.metadata
             cv_predictions_by_model['SVM'] = svm.svm_cv_predictions
@@ -65,6 +121,8 @@ class Predict:
         self.pred_start = ''
         self.pred_end = ''
         self.full_df = pd.DataFrame()
+        self.prefix_scaler = None
+        self.feature_store = None
         self.pred_indices = []
         self.feature_names = []
         self.feature_dict = {}
@@ -73,19 +131,26 @@ class Predict:
         self.cv_predictions_by_output = {}
         self.optimal_params_by_output = {}
         self.pred_metadata_by_output = {}
+        self.fitted_models_by_output = {}
+        
+        
+    def build_feature_store(self):
+        """
+        Builds a feature store from "full_df", unless a shared one was
+        provided, and hands it to every model.
+        """
+        if self.feature_store is None:
+            self.feature_store = FeatureStore().from_dataframe(self.full_df, self.feature_names,
+                                                               self.output_names,
+                                                               date_column='date')
         
         
     def get_prediction_indices(self):
         """
         Gets indices for rows to be used during prediction.
         """
-        if self.full_df['date'][0] > self.full_df['date'][len(self.full_df) - 1]:
-            self.full_df = self.full_df[::-1]
-        self.full_df.reset_index(inplace=True)
-        self.full_df.drop('index', axis=1, inplace=True)
-        date_condition = ((self.full_df['date'] <= self.pred_end) &
-                          (self.full_df['date'] >= self.pred_start))
-        self.pred_indices = list(self.full_df[date_condition].index)
+        self.build_feature_store()
+        self.pred_indices = self.feature_store.get_indices(self.pred_start, self.pred_end)
         
         
     def walk_forward_prediction(self):
@@ -101,15 +166,24 @@ class Predict:
             svm = SupportVectorMachine()
             svm.pred_indices = self.pred_indices
             svm.full_df = self.full_df
+            svm.prefix_scaler = self.prefix_scaler
+            svm.feature_store = self.feature_store
             svm.feature_names = self.feature_names
             svm.output_name = output_name
             svm.svm_optimal_params = self.optimal_params_by_output[output_name]['SVM']
-            svm.run_svm_prediction()
+            fitted_svm = self.fitted_models_by_output.get(output_name, {}).get('SVM')
+            if fitted_svm is not None:
+                svm.fitted_scaler = fitted_svm['Scaler']
+                svm.fitted_model = fitted_svm['Model']
+            with span('SVM', 'prediction', pred_start=self.pred_start, output=output_name):
+                svm.run_svm_prediction()
             predictions_by_model['SVM'] = svm.svm_predictions
             pred_metadata_by_model['SVM'] = svm.metadata
             
             self.predictions_by_output[output_name] = predictions_by_model
             self.pred_metadata_by_output[output_name] = pred_metadata_by_model
+            self.fitted_models_by_output[output_name] = {'SVM': {'Scaler': svm.fitted_scaler,
+                                                                 'Model': svm.fitted_model}}
         
         
     def run_prediction(self):
@@ -126,15 +200,43 @@ class Deployer:
     The manager class for this module.
     """
     
-    def __init__(self, df):
+    def __init__(self, df, series_key=None):
+        """
+        series_key: optional name of the (single) feature column to deploy.
+        When given, it replaces the default feature, and every output file
+        gets the series key as a suffix, so that several series can be
+        deployed side by side
+        
+        use_artifacts: whether to save and reuse deployment artifacts (the
+        fitted scalers, SVMs and chosen hyperparameters). An artifact is
+        keyed by a hash of its training data and settings, so models are
+        only re-cross-validated and refit when those change
+        
+        incremental: whether to only score dates that are not in the saved
+        results yet, appending them to the results. Falls back to a full
+        run when there are no saved results or no matching artifact
+        
+        feature_store: read-only FeatureStore of the final dataset, shared by
+        the cross-validation and prediction of every test
+        
+        feature_dtype: dtype of the feature store's feature matrix, which is
+        what the SVM is fitted on. 'float32' halves its memory, at single
+        precision. It is part of the artifact key when not 'float64'
+        """
         self.final_df_output = df
+        self.use_artifacts = True
+        self.incremental = False
+        self.prefix_scaler = None
+        self.feature_store = None
+        self.feature_dtype = 'float64'
         self.testing_dates = {}
         self.optimal_params = {}
         self.cv_model_metadata = {}
         self.pred_model_metadata = {}
         self.full_predictions = {}
-        self.feature_names = ['10Y_Treasury_Rate']
-        self.feature_dict = {0: '10Y_Treasury_Rate'}
+        self.series_key = series_key
+        self.feature_names = get_series_feature_names(series_key)
+        self.feature_dict = dict(enumerate(self.feature_names))
         self.output_names = ['Recession_in_12mo']
 
     def fill_testing_dates(self):
@@ -152,49 +254,184 @@ class Deployer:
                                  'pred_end': most_recent_date}
     
     
+    def build_prefix_scaler(self):
+        """
+        Computes cumulative feature moments once, in the (chronological) row
+        order that the models use, so that every model and every walk-forward
+        test can read its scaling parameters off them.
+        """
+        self.prefix_scaler = PrefixScaler().fit(self.feature_store.get_features())
+    
+    
+    def build_feature_store(self):
+        """
+        Copies the features, labels and dates of the final dataset once into
+        a read-only FeatureStore, in chronological order, which every model
+        and every test then reads as views.
+        """
+        self.feature_store = FeatureStore().from_dataframe(self.final_df_output,
+                                                           self.feature_names,
+                                                           self.output_names,
+                                                           date_column='date',
+                                                           feature_dtype=self.feature_dtype)
+    
+    
+    def get_output_path(self, file_path):
+        """
+        Returns the path of an output file, suffixed with the series key when
+        one is given.
+        
+        file_path: string, the default output path
+        """
+        return(get_series_path(file_path, self.series_key))
+    
+    
+    def get_artifact_key(self, test_name):
+        """
+        Returns the version of a Test's deployment artifact: a hash of the
+        training data (every row before the prediction window) and of the
+        settings that the fitted models depend on.
+        
+        test_name: the Test number
+        """
+        test_dates = self.testing_dates[test_name]
+        is_training_row = self.final_df_output['date'].astype(str) < test_dates['pred_start']
+        training_df = self.final_df_output.loc[is_training_row,
+                                               ['date'] + self.feature_names + self.output_names]
+        training_df = training_df.sort_values('date')
+        settings = {'cv_start': test_dates['cv_start'],
+                    'cv_end': test_dates['cv_end'],
+                    'pred_start': test_dates['pred_start'],
+                    'feature_names': self.feature_names,
+                    'output_names': self.output_names}
+        if self.feature_dtype != 'float64':
+            settings['feature_dtype'] = self.feature_dtype
+        artifact_hash = hashlib.sha256()
+        artifact_hash.update(pd.util.hash_pandas_object(training_df.astype(str),
+                                                        index=False).values.tobytes())
+        artifact_hash.update(json.dumps(settings, sort_keys=True).encode())
+        return(artifact_hash.hexdigest()[:16])
+    
+    
+    def get_artifact_path(self, artifact_key):
+        """
+        Returns the file path of a deployment artifact, suffixed with the
+        series key, so that each series' artifacts are kept apart.
+        
+        artifact_key: string, the artifact's version
+        """
+        return(self.get_output_path(os.path.join(path.deployment_artifacts,
+                                                 'deployment_svm_{}.joblib'.format(artifact_key))))
+    
+    
+    def load_artifact(self, artifact_key):
+        """
+        Returns the saved deployment artifact of this version, or None.
+        
+        artifact_key: string, the artifact's version
+        """
+        import joblib
+        
+        artifact_path = self.get_artifact_path(artifact_key)
+        if not self.use_artifacts or not os.path.exists(artifact_path):
+            return(None)
+        return(joblib.load(artifact_path))
+    
+    
+    def save_artifact(self, artifact_key, optimal_params_by_output,
+                      cv_metadata_by_output, fitted_models_by_output):
+        """
+        Saves the chosen hyperparameters, CV metadata, and fitted scalers and
+        models of one Test as a versioned deployment artifact. Like the
+        results, it is written to a temporary file that then replaces the
+        artifact, so that the prediction service and later runs never load a
+        partially written artifact.
+        
+        artifact_key: string, the artifact's version
+        """
+        import joblib
+        
+        os.makedirs(path.deployment_artifacts, exist_ok=True)
+        artifact = {'Version': artifact_key,
+                    'Created': datetime.now().isoformat(),
+                    'Series Key': self.series_key,
+                    'Feature Names': self.feature_names,
+                    'Optimal Params': optimal_params_by_output,
+                    'CV Metadata': cv_metadata_by_output,
+                    'Fitted Models': fitted_models_by_output}
+        artifact_path = self.get_artifact_path(artifact_key)
+        temporary_path = '{}.tmp'.format(artifact_path)
+        joblib.dump(artifact, temporary_path)
+        os.replace(temporary_path, artifact_path)
+    
+    
     def perform_backtests(self):
         """
-        Performs cross-validation and prediction.
+        Performs cross-validation and prediction. Tests with a saved
+        artifact for their training data skip cross-validation and refitting,
+        and only score the prediction window.
         """
         
         for test_name in self.testing_dates:
             print('\t|--Test #{}'.format(test_name))
             test_dates = self.testing_dates[test_name]
-            print('\t\t|--Performing Nested Cross-Validation')
-            cross_validation = CrossValidate()
-            cross_validation.output_names = self.output_names
-            cross_validation.feature_names = self.feature_names
-            cross_validation.feature_dict = self.feature_dict
-            cross_validation.full_df = self.final_df_output
-            cross_validation.cv_params = self.testing_dates
-            cross_validation.test_name = test_name
-            cross_validation.walk_forward_cv()
-            self.optimal_params['Test #{}'.format(test_name)] = cross_validation.optimal_params_by_output
-            self.cv_model_metadata['Test #{}'.format(test_name)] = cross_validation.cv_metadata_by_output
+            artifact_key = self.get_artifact_key(test_name)
+            artifact = self.load_artifact(artifact_key)
+            if artifact is None:
+                print('\t\t|--Performing Nested Cross-Validation')
+                cross_validation = CrossValidate()
+                cross_validation.output_names = self.output_names
+                cross_validation.feature_names = self.feature_names
+                cross_validation.feature_dict = self.feature_dict
+                cross_validation.full_df = self.final_df_output
+                cross_validation.prefix_scaler = self.prefix_scaler
+                cross_validation.feature_store = self.feature_store
+                cross_validation.cv_params = self.testing_dates
+                cross_validation.test_name = test_name
+                with span('cross-validation', 'test', test=test_name):
+                    cross_validation.walk_forward_cv()
+                optimal_params_by_output = cross_validation.optimal_params_by_output
+                cv_metadata_by_output = cross_validation.cv_metadata_by_output
+                fitted_models_by_output = {}
+            else:
+                print('\t\t|--Loaded deployment artifact {}'.format(artifact_key))
+                optimal_params_by_output = artifact['Optimal Params']
+                cv_metadata_by_output = artifact['CV Metadata']
+                fitted_models_by_output = artifact['Fitted Models']
+            self.optimal_params['Test #{}'.format(test_name)] = optimal_params_by_output
+            self.cv_model_metadata['Test #{}'.format(test_name)] = cv_metadata_by_output
             
             print('\t\t|--Performing Out-Of-Sample Testing')
             prediction = Predict()
             prediction.output_names = self.output_names
             prediction.feature_names = self.feature_names
             prediction.feature_dict = self.feature_dict
-            prediction.optimal_params_by_output = cross_validation.optimal_params_by_output
-            prediction.cv_predictions_by_output = cross_validation.cv_predictions_by_output
+            prediction.optimal_params_by_output = optimal_params_by_output
+            prediction.fitted_models_by_output = fitted_models_by_output
             prediction.full_df = self.final_df_output
+            prediction.prefix_scaler = self.prefix_scaler
+            prediction.feature_store = self.feature_store
             prediction.pred_start = test_dates['pred_start']
             prediction.pred_end = test_dates['pred_end']
-            prediction.run_prediction()
+            with span('prediction', 'test', test=test_name):
+                prediction.run_prediction()
             self.full_predictions['Test #{}'.format(test_name)] = prediction.predictions_by_output
             self.pred_model_metadata['Test #{}'.format(test_name)] = prediction.pred_metadata_by_output
+            if artifact is None and self.use_artifacts:
+                self.save_artifact(artifact_key, optimal_params_by_output,
+                                   cv_metadata_by_output,
+                                   prediction.fitted_models_by_output)
         
         print('\nSaving model metadata...')
-        with open(path.deployment_cv_results, 'w') as file:
-            json.dump(self.optimal_params, file)
-        with open(path.deployment_cv_metadata, 'w') as file:
-            json.dump(self.cv_model_metadata, file)
-        with open(path.deployment_pred_model_metadata, 'w') as file:
-            json.dump(self.pred_model_metadata, file)
-        with open(path.deployment_full_predictions, 'w') as file:
-            json.dump(self.full_predictions, file)
+        with span('save metadata', 'io'):
+            with open(self.get_output_path(path.deployment_cv_results), 'w') as file:
+                json.dump(self.optimal_params, file)
+            with open(self.get_output_path(path.deployment_cv_metadata), 'w') as file:
+                json.dump(self.cv_model_metadata, file)
+            with open(self.get_output_path(path.deployment_pred_model_metadata), 'w') as file:
+                json.dump(self.pred_model_metadata, file)
+            with open(self.get_output_path(path.deployment_full_predictions), 'w') as file:
+                json.dump(self.full_predictions, file)
     
 
     def read_full_predictions(self, model_name):
@@ -229,10 +466,80 @@ class Deployer:
         Organizes predictions for the chosen model into a single dataframe.
         """
         print('\nSaving Full Predictions as dataframes...')
-        with open(path.deployment_full_predictions, 'r') as file:
-            self.full_predictions = json.load(file)
-        self.read_full_predictions('SVM').to_json(path.deployment_svm_test_results)
-        print('\t|--SVM results saved to {}'.format(path.deployment_svm_test_results))
+        self.save_results(self.read_full_predictions('SVM'))
+        print('\t|--SVM results saved to {}'.format(
+            self.get_output_path(path.deployment_svm_test_results)))
+    
+    def save_results(self, results):
+        """
+        Saves the results atomically: they are written to a temporary file
+        that then replaces the results file, so readers never see a
+        partially written file.
+        
+        results: dataframe, the full results
+        """
+        results_path = self.get_output_path(path.deployment_svm_test_results)
+        temporary_path = '{}.tmp'.format(results_path)
+        results.to_json(temporary_path)
+        os.replace(temporary_path, results_path)
+    
+    def read_saved_results(self):
+        """
+        Returns the saved results (with dates kept as strings), or None if
+        there are none.
+        """
+        results_path = self.get_output_path(path.deployment_svm_test_results)
+        if not os.path.exists(results_path):
+            return(None)
+        results = pd.read_json(results_path, convert_dates=False,
+                               keep_default_dates=False)
+        if len(results) == 0:
+            return(None)
+        return(results.sort_values('date').reset_index(drop=True))
+    
+    def score_new_dates(self):
+        """
+        Scores only the dates after the last saved prediction, with the
+        saved artifact's fitted models, and appends them to the results.
+        Returns immediately, without loading any model, when there are no
+        new dates. Returns False when a full run is needed instead.
+        """
+        saved_results = self.read_saved_results()
+        if saved_results is None:
+            return(False)
+        last_predicted_date = str(saved_results['date'].iloc[-1])
+        test_name = max(self.testing_dates)
+        test_dates = self.testing_dates[test_name]
+        first, stop = self.feature_store.get_window(test_dates['pred_start'],
+                                                    test_dates['pred_end'])
+        first = max(first, self.feature_store.get_window(end=last_predicted_date)[1])
+        if first >= stop:
+            print('\t|--No new observations since {}'.format(last_predicted_date))
+            return(True)
+        
+        artifact = self.load_artifact(self.get_artifact_key(test_name))
+        if artifact is None:
+            return(False)
+        print('\t|--Scoring {} new observation(s) with artifact {}'.format(stop - first,
+                                                                        artifact['Version']))
+        prediction = Predict()
+        prediction.output_names = self.output_names
+        prediction.feature_names = self.feature_names
+        prediction.feature_dict = self.feature_dict
+        prediction.optimal_params_by_output = artifact['Optimal Params']
+        prediction.fitted_models_by_output = artifact['Fitted Models']
+        prediction.full_df = self.final_df_output
+        prediction.feature_store = self.feature_store
+        prediction.pred_start = self.feature_store.get_dates(first, first + 1)[0]
+        prediction.pred_end = test_dates['pred_end']
+        with span('prediction', 'test', test=test_name):
+            prediction.run_prediction()
+        self.full_predictions = {'Test #{}'.format(test_name): prediction.predictions_by_output}
+        new_results = self.read_full_predictions('SVM')
+        self.save_results(pd.concat([saved_results, new_results], ignore_index=True))
+        print('\t|--SVM results appended to {}'.format(
+            self.get_output_path(path.deployment_svm_test_results)))
+        return(True)
     
     def run_test_procedures(self):
         """
@@ -240,9 +547,94 @@ class Deployer:
         """
         print('\nDeploying prediction model...\n')
         self.fill_testing_dates()
+        self.build_feature_store()
+        if self.incremental and self.score_new_dates():
+            print('\nDeployment complete!')
+            return
+        self.build_prefix_scaler()
         self.perform_backtests()
         self.create_full_predictions_dataframe()
         print('\nDeployment complete!')
+
+
+def deploy_series(series_df, series_key, use_artifacts, incremental, feature_dtype):
+    """
+    Deploys one series in a worker process, and returns its results.
+    
+    series_df: dataframe, the shared dates and labels, plus the series
+    
+    series_key: string, name of the series column
+    
+    use_artifacts, incremental, feature_dtype: see Deployer
+    """
+    deployer = Deployer(series_df, series_key=series_key)
+    deployer.use_artifacts = use_artifacts
+    deployer.incremental = incremental
+    deployer.feature_dtype = feature_dtype
+    deployer.run_test_procedures()
+    return(deployer.read_saved_results())
+
+
+class MultiSeriesDeployer:
+    """
+    Deploys the chosen model for several series (e.g. yield curve spreads)
+    in one run. The series share one labelled date index, and each series
+    is trained and scored in its own worker process.
+    """
+    
+    def __init__(self, df, series_keys):
+        """
+        df: dataframe, the labelled dataset, with one column per series
+        
+        series_keys: names of the series columns to deploy
+        
+        workers: number of worker processes
+        
+        use_artifacts, incremental, feature_dtype: see Deployer
+        """
+        self.final_df_output = df
+        self.series_keys = list(series_keys)
+        self.label_names = ['Recession', 'Recession_in_12mo',
+                            'Recession_within_12mo']
+        self.workers = min(len(self.series_keys), os.cpu_count())
+        self.use_artifacts = True
+        self.incremental = False
+        self.feature_dtype = 'float64'
+        self.results = pd.DataFrame()
+    
+    def get_series_dataset(self, series_key):
+        """
+        Returns the shared dates and labels, plus one series, from the
+        series' own first observation. The series are joined on one date
+        index, so a series that starts later than the others has no values
+        (NaN) in the rows before its start.
+        
+        series_key: string, name of the series column
+        """
+        series_df = self.final_df_output[['date'] + self.label_names + [series_key]]
+        return(series_df[series_df[series_key].notna()].reset_index(drop=True))
+    
+    def run_test_procedures(self):
+        """
+        Deploys every series in parallel, and saves a combined results table
+        keyed by series.
+        """
+        from concurrent.futures import ProcessPoolExecutor
+        
+        print('\nDeploying prediction model for {} series...\n'.format(len(self.series_keys)))
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            futures = {series_key: executor.submit(deploy_series,
+                                                   self.get_series_dataset(series_key),
+                                                   series_key, self.use_artifacts,
+                                                   self.incremental, self.feature_dtype)
+                       for series_key in self.series_keys}
+            series_results = {series_key: futures[series_key].result()
+                              for series_key in self.series_keys}
+        self.results = pd.concat(series_results, names=['series', 'row'])
+        self.results = self.results.reset_index(level='series').reset_index(drop=True)
+        self.results.to_json(path.deployment_multi_series_results)
+        print('\nCombined results saved to {}'.format(path.deployment_multi_series_results))
+        return(self.results)
         
         
 #MIT License
@@ -0,0 +1,356 @@
+"""
+This module serves the deployed model's recession probabilities over HTTP, on
+localhost. The deployment artifact (fitted scaler and SVM) is loaded once and
+hot-reloaded whenever a newer artifact appears.
+
+Run from the repository root:
+    python -m src.models.prediction_service
+
+Endpoints:
+    GET /probability?date=YYYY-MM-DD   the saved prediction for a date
+    POST /score   {"values": [...]}    probabilities for arbitrary feature
+                                       values (one row, or one value, each)
+"""
+import os
+import json
+import asyncio
+import numpy as np
+import pandas as pd
+from urllib.parse import urlsplit, parse_qs
+
+import RecessionPredictor_paths as path
+from src.models.deployment import (get_artifact_paths, get_series_feature_names,
+                                   get_series_path)
+
+
+class PredictionService:
+    """
+    The manager class for this module.
+    """
+    
+    
+    def __init__(self, host='127.0.0.1', port=8765, series_key=None):
+        """
+        host: address to bind to. Only localhost is intended
+        
+        port: port to listen on (0 picks a free port)
+        
+        series_key: the deployed series to serve, as given to Deployer (None
+        for the default series). Only that series' artifacts and saved
+        results are read
+        
+        feature_names: the features that a served artifact must have been
+        fitted on
+        
+        output_name: the deployed output whose model is served
+        
+        reload_interval: seconds between checks for a new artifact or new
+        saved results
+        
+        watcher: the task that hot-reloads them, while the service runs
+        """
+        self.host = host
+        self.port = port
+        self.series_key = series_key
+        self.feature_names = get_series_feature_names(series_key)
+        self.output_name = 'Recession_in_12mo'
+        self.reload_interval = 5
+        self.artifact_path = ''
+        self.artifact_version = ''
+        self.artifact_mtime = -1
+        self.results_mtime = -1
+        self.scaler = None
+        self.model = None
+        self.probabilities_by_date = {}
+        self.server = None
+        self.watcher = None
+    
+    
+    def get_latest_artifact_path(self):
+        """
+        Returns the most recently written deployment artifact of the served
+        series, or ''.
+        """
+        artifact_paths = get_artifact_paths(self.series_key)
+        if len(artifact_paths) == 0:
+            return('')
+        return(artifact_paths[0])
+    
+    
+    def read_latest_artifact(self):
+        """
+        Reads the latest artifact, if it is not the one last read. Returns
+        (path, modification time, artifact), or None. Only reads the file,
+        so it can run in a worker thread while requests are being served.
+        """
+        import joblib
+        
+        artifact_path = self.get_latest_artifact_path()
+        if artifact_path == '':
+            return(None)
+        artifact_mtime = os.path.getmtime(artifact_path)
+        if artifact_path == self.artifact_path and artifact_mtime == self.artifact_mtime:
+            return(None)
+        return(artifact_path, artifact_mtime, joblib.load(artifact_path))
+    
+    
+    def set_artifact(self, artifact_path, artifact_mtime, artifact):
+        """
+        Serves an artifact's fitted scaler and SVM, if it was fitted on the
+        served series' features. Returns whether it is served.
+        
+        artifact_path, artifact_mtime, artifact: as read by
+        "read_latest_artifact"
+        """
+        self.artifact_path = artifact_path
+        self.artifact_mtime = artifact_mtime
+        if artifact.get('Feature Names') != self.feature_names:
+            print('\t|--Skipped deployment artifact {}, fitted on {}'.format(
+                  artifact['Version'], artifact.get('Feature Names')))
+            return(False)
+        fitted_svm = artifact['Fitted Models'][self.output_name]['SVM']
+        self.scaler = fitted_svm['Scaler']
+        self.model = fitted_svm['Model']
+        self.artifact_version = artifact['Version']
+        return(True)
+    
+    
+    def load_artifact(self):
+        """
+        Loads the latest artifact's fitted scaler and SVM, if it is newer
+        than the one being served and was fitted on the served series'
+        features. Returns whether a new one was loaded.
+        """
+        latest_artifact = self.read_latest_artifact()
+        if latest_artifact is None:
+            return(False)
+        return(self.set_artifact(*latest_artifact))
+    
+    
+    def load_results(self):
+        """
+        Loads the served series' saved predictions, by date, if they changed
+        since they were last loaded. Returns whether they were reloaded.
+        """
+        results_path = get_series_path(path.deployment_svm_test_results, self.series_key)
+        if not os.path.exists(results_path):
+            return(False)
+        results_mtime = os.path.getmtime(results_path)
+        if results_mtime == self.results_mtime:
+            return(False)
+        results = pd.read_json(results_path,
+                               convert_dates=False, keep_default_dates=False)
+        predictions = results['Pred_{}'.format(self.output_name)]
+        self.probabilities_by_date = {str(date)[:10]: float(probability)
+                                      for date, probability in zip(results['date'],
+                                                                   predictions)}
+        self.results_mtime = results_mtime
+        return(True)
+    
+    
+    def score(self, values):
+        """
+        Returns the positive class probability of each row of feature values.
+        
+        values: iterable, one row (or, for a single feature, one value) per
+        observation
+        """
+        if self.model is None:
+            raise LookupError('No deployment artifact has been loaded')
+        feature_count = self.scaler.mean_.shape[0]
+        values = np.asarray(values, dtype=float).reshape(-1, feature_count)
+        return(self.model.predict_proba(self.scaler.transform(values))[:, 1])
+    
+    
+    def get_probability(self, query):
+        """
+        Handles GET /probability. Returns (status code, response body).
+        
+        query: dict, parsed query string
+        """
+        if 'date' not in query:
+            return(400, {'error': 'Missing "date" query parameter'})
+        date = query['date'][0][:10]
+        if date not in self.probabilities_by_date:
+            return(404, {'error': 'No prediction for {}'.format(date)})
+        return(200, {'date': date,
+                     'probability': self.probabilities_by_date[date]})
+    
+    
+    def post_score(self, body):
+        """
+        Handles POST /score. Returns (status code, response body).
+        
+        body: bytes, a json object with a "values" list
+        """
+        if self.model is None:
+            return(503, {'error': 'No deployment artifact has been loaded'})
+        try:
+            values = json.loads(body.decode())['values']
+            probabilities = self.score(values)
+        except (ValueError, KeyError, TypeError) as error:
+            return(400, {'error': 'Invalid "values": {}'.format(error)})
+        return(200, {'version': self.artifact_version,
+                     'probabilities': probabilities.tolist()})
+    
+    
+    def route(self, method, target, body):
+        """
+        Dispatches a request. Returns (status code, response body).
+        
+        method: string, the HTTP method
+        
+        target: string, the request target (path and query string)
+        
+        body: bytes, the request body
+        """
+        url = urlsplit(target)
+        if method == 'GET' and url.path == '/probability':
+            return(self.get_probability(parse_qs(url.query)))
+        if method == 'POST' and url.path == '/score':
+            return(self.post_score(body))
+        if method == 'GET' and url.path == '/health':
+            return(200, {'version': self.artifact_version,
+                         'dates': len(self.probabilities_by_date)})
+        return(404, {'error': 'Unknown endpoint {} {}'.format(method, url.path)})
+    
+    
+    async def handle_connection(self, reader, writer):
+        """
+        Serves the requests of one (keep-alive) connection.
+        """
+        status_texts = {200: 'OK', 400: 'Bad Request', 404: 'Not Found',
+                        503: 'Service Unavailable'}
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    header_line = await reader.readline()
+                    if header_line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = header_line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = b''
+                if int(headers.get('content-length', 0)) > 0:
+                    body = await reader.readexactly(int(headers['content-length']))
+                
+                status, response = self.route(method, target, body)
+                payload = json.dumps(response).encode()
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                writer.write('HTTP/1.1 {} {}\r\n'.format(status, status_texts[status]).encode()
+                             + b'Content-Type: application/json\r\n'
+                             + 'Content-Length: {}\r\n'.format(len(payload)).encode()
+                             + ('Connection: keep-alive\r\n\r\n' if keep_alive
+                                else 'Connection: close\r\n\r\n').encode()
+                             + payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+    
+    
+    async def reload(self):
+        """
+        Loads the artifact and saved predictions, if they changed. Files are
+        read in a worker thread, so that requests are served in the
+        meantime, and the model is swapped on the event loop. A file that
+        cannot be read (e.g. one still being written) is reported, and read
+        again at the next reload.
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            latest_artifact = await loop.run_in_executor(None, self.read_latest_artifact)
+            if latest_artifact is not None and self.set_artifact(*latest_artifact):
+                print('\t|--Loaded deployment artifact {}'.format(self.artifact_version))
+            await loop.run_in_executor(None, self.load_results)
+        except Exception as error:
+            print('\t|--Could not reload the deployment files: {!r}'.format(error))
+    
+    
+    async def watch_for_updates(self):
+        """
+        Hot-reloads the artifact and saved predictions when they change.
+        """
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            await self.reload()
+    
+    
+    async def start(self):
+        """
+        Loads the artifact and predictions, and starts listening.
+        """
+        await self.reload()
+        self.server = await asyncio.start_server(self.handle_connection,
+                                                 host=self.host, port=self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.watcher = asyncio.ensure_future(self.watch_for_updates())
+    
+    
+    async def shutdown(self):
+        """
+        Stops hot-reloading, and stops listening.
+        """
+        if self.watcher is not None:
+            self.watcher.cancel()
+            try:
+                await self.watcher
+            except asyncio.CancelledError:
+                pass
+            self.watcher = None
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+    
+    
+    async def serve(self):
+        """
+        Starts the service and runs it until interrupted.
+        """
+        await self.start()
+        print('\nServing recession probabilities on http://{}:{} (artifact {})'.format(
+              self.host, self.port, self.artifact_version or 'none'))
+        try:
+            await self.server.serve_forever()
+        finally:
+            await self.shutdown()
+    
+    
+    def run_service(self):
+        """
+        Runs the service.
+        """
+        asyncio.run(self.serve())
+
+
+if __name__ == '__main__':
+    PredictionService().run_service()
+
+#MIT License
+#
+#Copyright (c) 2019 Terrence Zhang
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
\ No newline at end of file
@@ -1,10 +1,11 @@
 """
 This module runs backtests.
 """
-import json
 import pandas as pd
 
 import RecessionPredictor_paths as path
+from src.utils.persistence import BackgroundWriter, save_json
+from src.utils.timing import span
 from models.knn import KNN
 from models.elastic_net import ElasticNet
 from models.naive_bayes import NaiveBayes
@@ -12,6 +13,9 @@ from models.svm import SupportVectorMachine
 from models.gp import GaussianProcess
 from models.xgboost import XGBoost
 from models.weighted_average import WeightedAverage
+from models.prefix_scaler import PrefixScaler
+from models.feature_store import FeatureStore
+from models.prediction_store import PredictionStore
 
 
 class CrossValidate:
@@ -23,6 +27,8 @@ class CrossValidate:
         self.cv_params = {}
         self.test_name = ''
         self.full_df = pd.DataFrame()
+        self.prefix_scaler = None
+        self.feature_store = None
         self.feature_names = []
         self.feature_dict = {}
         self.output_names = []
@@ -46,9 +52,12 @@ class CrossValidate:
             svm.cv_params = self.cv_params
             svm.test_name = self.test_name
             svm.full_df = self.full_df
+            svm.prefix_scaler = self.prefix_scaler
+            svm.feature_store = self.feature_store
             svm.feature_names = self.feature_names
             svm.output_name = output_name
-            svm.run_svm_cv()
+            with span('SVM', 'cv', test=self.test_name, output=output_name):
+                svm.run_svm_cv()
             optimal_params_by_model['SVM'] = svm.svm_optimal_params
             cv_metadata_by_model['SVM'] = svm.metadata
             cv_predictions_by_model['SVM'] = svm.svm_cv_predictions
@@ -67,6 +76,8 @@ class Predict:
         self.pred_start = ''
         self.pred_end = ''
         self.full_df = pd.DataFrame()
+        self.prefix_scaler = None
+        self.feature_store = None
         self.pred_indices = []
         self.feature_names = []
         self.feature_dict = {}
@@ -79,17 +90,22 @@ class Predict:
         self.pred_metadata_by_output = {}
         
         
+    def build_feature_store(self):
+        """
+        Builds a feature store from "full_df", unless a shared one was
+        provided, and hands it to every model.
+        """
+        if self.feature_store is None:
+            self.feature_store = FeatureStore().from_dataframe(self.full_df, self.feature_names,
+                                                               self.output_names)
+        
+        
     def get_prediction_indices(self):
         """
         Gets indices for rows to be used during prediction.
         """
-        if self.full_df['date'][0] > self.full_df['date'][len(self.full_df) - 1]:
-            self.full_df = self.full_df[::-1]
-        self.full_df.reset_index(inplace=True)
-        self.full_df.drop('index', axis=1, inplace=True)
-        date_condition = ((self.full_df['date'] <= self.pred_end) &
-                          (self.full_df['date'] >= self.pred_start))
-        self.pred_indices = list(self.full_df[date_condition].index)
+        self.build_feature_store()
+        self.pred_indices = self.feature_store.get_indices(self.pred_start, self.pred_end)
 
     def walk_forward_prediction(self):
         """
@@ -105,10 +121,13 @@ class Predict:
             svm = SupportVectorMachine()
             svm.pred_indices = self.pred_indices
             svm.full_df = self.full_df
+            svm.prefix_scaler = self.prefix_scaler
+            svm.feature_store = self.feature_store
             svm.feature_names = self.feature_names
             svm.output_name = output_name
             svm.svm_optimal_params = self.optimal_params_by_output[output_name]['SVM']
-            svm.run_svm_prediction()
+            with span('SVM', 'prediction', pred_start=self.pred_start, output=output_name):
+                svm.run_svm_prediction()
             prediction_errors_by_model['SVM'] = svm.svm_pred_error
             predictions_by_model['SVM'] = svm.svm_predictions
             pred_metadata_by_model['SVM'] = svm.metadata
@@ -136,14 +155,36 @@ class Backtester:
         model_names: names of the models to include in backtest
         
         output_names: names of the outputs to include in backtest
+        
+        prefix_scaler: PrefixScaler shared by every model and every test,
+        built once per backtest
+        
+        feature_store: read-only FeatureStore of the final dataset, shared by
+        every model and every test, built once per backtest
+        
+        feature_dtype: dtype of the feature store's feature matrix, which is
+        what every model is fitted on. 'float32' halves its memory (and the
+        memory of every scaled fold), at single precision
+        
+        prediction_store: PredictionStore of every out-of-sample prediction
+        
+        persist: whether to also save outputs to disk. Saves run in the
+        background, and never feed later stages
         """
         self.final_df_output = pd.DataFrame()
+        self.prefix_scaler = None
+        self.feature_store = None
+        self.feature_dtype = 'float64'
         self.testing_dates = {}
         self.optimal_params = {}
         self.cv_model_metadata = {}
+        self.cv_predictions = {}
         self.pred_model_metadata = {}
         self.prediction_errors = {}
         self.full_predictions = {}
+        self.prediction_store = None
+        self.persist = True
+        self.writer = BackgroundWriter(enabled=self.persist)
         self.feature_names = ['Payrolls_3mo_vs_12mo',
                               'Real_Fed_Funds_Rate_12mo_chg',
                               'CPI_3mo_pct_chg_annualized',
@@ -194,6 +235,27 @@ class Backtester:
                                  'pred_end': '2021-07-01'}
     
     
+    def build_prefix_scaler(self):
+        """
+        Computes cumulative feature moments once, in the (chronological) row
+        order that the models use, so that every model and every walk-forward
+        test can read its scaling parameters off them.
+        """
+        self.prefix_scaler = PrefixScaler().fit(self.feature_store.get_features())
+    
+    
+    def build_feature_store(self):
+        """
+        Copies the features, labels and dates of the final dataset once into
+        a read-only FeatureStore, in chronological order, which every model
+        and every test then reads as views.
+        """
+        self.feature_store = FeatureStore().from_dataframe(self.final_df_output,
+                                                           self.feature_names,
+                                                           self.output_names,
+                                                           feature_dtype=self.feature_dtype)
+    
+    
     def perform_backtests(self):
         """
         Performs cross-validation and prediction.
@@ -208,11 +270,15 @@ class Backtester:
             cross_validation.feature_names = self.feature_names
             cross_validation.feature_dict = self.feature_dict
             cross_validation.full_df = self.final_df_output
+            cross_validation.prefix_scaler = self.prefix_scaler
+            cross_validation.feature_store = self.feature_store
             cross_validation.cv_params = self.testing_dates
             cross_validation.test_name = test_name
-            cross_validation.walk_forward_cv()
+            with span('cross-validation', 'test', test=test_name):
+                cross_validation.walk_forward_cv()
             self.optimal_params['Test #{}'.format(test_name)] = cross_validation.optimal_params_by_output
             self.cv_model_metadata['Test #{}'.format(test_name)] = cross_validation.cv_metadata_by_output
+            self.cv_predictions['Test #{}'.format(test_name)] = cross_validation.cv_predictions_by_output
             
             print('\t\t|--Performing Out-Of-Sample Testing')
             prediction = Predict()
@@ -223,101 +289,114 @@ class Backtester:
             prediction.optimal_params_by_output = cross_validation.optimal_params_by_output
             prediction.cv_predictions_by_output = cross_validation.cv_predictions_by_output
             prediction.full_df = self.final_df_output
+            prediction.prefix_scaler = self.prefix_scaler
+            prediction.feature_store = self.feature_store
             prediction.pred_start = test_dates['pred_start']
             prediction.pred_end = test_dates['pred_end']
-            prediction.run_prediction()
+            with span('prediction', 'test', test=test_name):
+                prediction.run_prediction()
             self.prediction_errors['Test #{}'.format(test_name)] = prediction.prediction_errors_by_output
             self.full_predictions['Test #{}'.format(test_name)] = prediction.predictions_by_output
             self.pred_model_metadata['Test #{}'.format(test_name)] = prediction.pred_metadata_by_output
         
         print('\nSaving model metadata...')
-        with open(path.cv_results, 'w') as file:
-            json.dump(self.optimal_params, file)
-        with open(path.cv_metadata, 'w') as file:
-            json.dump(self.cv_model_metadata, file)
-        with open(path.pred_model_metadata, 'w') as file:
-            json.dump(self.pred_model_metadata, file)
-        with open(path.prediction_errors, 'w') as file:
-            json.dump(self.prediction_errors, file)
-        with open(path.full_predictions, 'w') as file:
-            json.dump(self.full_predictions, file)
+        self.writer.submit(save_json, self.optimal_params, path.cv_results)
+        self.writer.submit(save_json, self.cv_model_metadata, path.cv_metadata)
+        self.writer.submit(save_json, self.pred_model_metadata, path.pred_model_metadata)
+        self.writer.submit(save_json, self.prediction_errors, path.prediction_errors)
+        with span('build prediction store'):
+            self.prediction_store = PredictionStore().from_predictions(self.full_predictions)
+        self.writer.submit(self.prediction_store.save, path.prediction_store)
     
 
+    def compare_weighting_schemes(self, model_names):
+        """
+        Evaluates every WeightedAverage weighting scheme, for every Test and
+        output, in one batched call. Returns a dataframe of out-of-sample
+        log losses.
+        
+        model_names: names of the models to combine
+        """
+        weighted_average = WeightedAverage()
+        weighted_average.model_names = model_names
+        return(weighted_average.compare_weighting_schemes(optimal_params=self.optimal_params,
+                                                          cv_predictions=self.cv_predictions,
+                                                          full_predictions=self.full_predictions))
+    
+    
     def read_full_predictions(self, model_name):
         """
-        Given a specific model, loops through each Test to save model predictions
-        into a single dataframe.
+        Given a specific model, slices its predictions across every Test out
+        of the prediction store, into a single dataframe.
         
         model_name: name of the model
         """
         model_name = str(model_name)
-        
-        dates = []
-        true_0mo = []
-        true_6mo = []
-        pred_6mo = []
-        true_12mo = []
-        pred_12mo = []
-        true_24mo = []
-        pred_24mo = []
-        for test in self.full_predictions:
-            test_data = self.full_predictions[test]
-            dates.extend(test_data[self.output_names[0]][model_name]['date'])
-            true_0mo.extend(test_data[self.output_names[0]][model_name]['True'])
-            true_6mo.extend(test_data[self.output_names[1]][model_name]['True'])
-            pred_6mo.extend(test_data[self.output_names[1]][model_name]['Predicted'])
-            true_12mo.extend(test_data[self.output_names[2]][model_name]['True'])
-            pred_12mo.extend(test_data[self.output_names[2]][model_name]['Predicted'])
-            true_24mo.extend(test_data[self.output_names[3]][model_name]['True'])
-            pred_24mo.extend(test_data[self.output_names[3]][model_name]['Predicted'])
-                
-        results = pd.DataFrame()   
-        results['date'] = dates
-        results['True_{}'.format(self.output_names[0])] = true_0mo
-        results['True_{}'.format(self.output_names[1])] = true_6mo
-        results['Pred_{}'.format(self.output_names[1])] = pred_6mo
-        results['True_{}'.format(self.output_names[2])] = true_12mo
-        results['Pred_{}'.format(self.output_names[2])] = pred_12mo
-        results['True_{}'.format(self.output_names[3])] = true_24mo
-        results['Pred_{}'.format(self.output_names[3])] = pred_24mo
-        
+        results = self.prediction_store.get_model_frame(model_name, self.output_names)
+        # the current-recession output is only kept as a label
+        results.drop('Pred_{}'.format(self.output_names[0]), axis=1, inplace=True)
         return(results)
             
     
     def create_full_predictions_dataframe(self):
         """
-        Organizes predictions for each model into a single dataframe.
+        Organizes predictions for each model into a single dataframe, from the
+        prediction store in memory (or, if there is none, the saved store).
         """
         print('\nSaving Full Predictions as dataframes...')
-        with open(path.full_predictions, 'r') as file:
-            self.full_predictions = json.load(file)
-        self.read_full_predictions('KNN').to_json(path.knn_test_results)
-        print('\t|--KNN results saved to {}'.format(path.knn_test_results))
-        self.read_full_predictions('Elastic_Net').to_json(path.elastic_net_test_results)
-        print('\t|--Elastic Net results saved to {}'.format(path.elastic_net_test_results))
-        self.read_full_predictions('Naive_Bayes').to_json(path.naive_bayes_test_results)
-        print('\t|--Naive Bayes results saved to {}'.format(path.naive_bayes_test_results))
-        self.read_full_predictions('SVM').to_json(path.svm_test_results)
-        print('\t|--SVM results saved to {}'.format(path.svm_test_results))
-        self.read_full_predictions('Gaussian_Process').to_json(path.gauss_test_results)
-        print('\t|--Gaussian Process results saved to {}'.format(path.gauss_test_results))
-        self.read_full_predictions('XGBoost').to_json(path.xgboost_test_results)
-        print('\t|--XGBoost results saved to {}'.format(path.xgboost_test_results))
-        self.read_full_predictions('Weighted_Average').to_json(path.weighted_average_test_results)
-        print('\t|--Weighted Average results saved to {}'.format(path.weighted_average_test_results))
+        if self.prediction_store is None:
+            self.prediction_store = PredictionStore().load(path.prediction_store)
+        test_results_paths = {'KNN': path.knn_test_results,
+                              'Elastic_Net': path.elastic_net_test_results,
+                              'Naive_Bayes': path.naive_bayes_test_results,
+                              'SVM': path.svm_test_results,
+                              'Gaussian_Process': path.gauss_test_results,
+                              'XGBoost': path.xgboost_test_results,
+                              'Weighted_Average': path.weighted_average_test_results}
+        for model_name in test_results_paths:
+            results = self.read_full_predictions(model_name)
+            self.writer.submit(results.to_json, test_results_paths[model_name])
+            print('\t|--{} results queued for {}'.format(model_name.replace('_', ' '),
+                                                          test_results_paths[model_name]))
         
     
-    def run_test_procedures(self):
+    def load_dataset(self, df=None):
         """
-        Runs test procedures on final dataset.
+        Takes over the final dataset, and builds the feature store and
+        prefix scaler that every test shares.
+        
+        df: dataframe, the final dataset, with the 'Dates' column, features
+        and outputs of the saved final dataset. If None, the saved final
+        dataset is read
         """
-        print('\nPerforming backtests...\n')
-        self.final_df_output = pd.read_json(path.data_final)
-        self.final_df_output.sort_index(inplace=True)
+        if df is None:
+            df = pd.read_json(path.data_final)
+        self.final_df_output = df.sort_index()
         self.fill_testing_dates()
-        self.perform_backtests()
-        self.create_full_predictions_dataframe()
-        print('\nBacktesting complete!')    
+        with span('build feature store'):
+            self.build_feature_store()
+        with span('build prefix scaler'):
+            self.build_prefix_scaler()
+    
+    
+    def run_test_procedures(self, df=None):
+        """
+        Runs test procedures on final dataset, and returns the prediction
+        store, for the plotting stage. Saves to disk carry on in the
+        background; call "writer.wait" to block until they are done.
+        
+        df: dataframe, the final dataset (see "load_dataset"). If None, the
+        saved final dataset is read
+        """
+        print('\nPerforming backtests...\n')
+        self.writer.enabled = self.persist
+        self.load_dataset(df)
+        with span('backtests'):
+            self.perform_backtests()
+        with span('full predictions dataframes'):
+            self.create_full_predictions_dataframe()
+        print('\nBacktesting complete!')
+        return(self.prediction_store)
         
         
 #MIT License
@@ -0,0 +1,57 @@
+"""
+This module resolves date windows on sorted date arrays by binary search, so
+that the rows of any window can be read as one slice.
+"""
+import numpy as np
+import pandas as pd
+
+
+def to_datetime64(dates):
+    """
+    Returns dates as a datetime64 array.
+    
+    dates: iterable of dates ('YYYY-MM-DD' strings, timestamps or datetime64)
+    """
+    return(pd.to_datetime(pd.Series(dates)).to_numpy())
+
+
+def get_window(sorted_dates, start=None, end=None):
+    """
+    Returns the (start, stop) rows of the dates from "start" to "end",
+    inclusive, found by binary search in O(log n), so that the window is
+    rows [start, stop).
+    
+    sorted_dates: datetime64 array, in ascending order
+    
+    start, end: dates ('YYYY-MM-DD' strings or timestamps), or None for no
+    bound
+    """
+    get_date = lambda date: pd.Timestamp(date).to_datetime64().astype(sorted_dates.dtype)
+    lower = (0 if start is None
+             else int(np.searchsorted(sorted_dates, get_date(start), side='left')))
+    upper = (len(sorted_dates) if end is None
+             else int(np.searchsorted(sorted_dates, get_date(end), side='right')))
+    return(lower, max(lower, upper))
+
+
+#MIT License
+#
+#Copyright (c) 2019 Terrence Zhang
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
\ No newline at end of file
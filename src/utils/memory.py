@@ -0,0 +1,372 @@
+"""
+This module measures memory per pipeline stage, on top of the timing spans
+in timing.py: peak and retained traced memory, growth of the process's peak
+RSS, the top allocating lines, and large DataFrame copies.
+
+A copy is flagged when memory allocated inside pandas, on behalf of a line
+of this repository, is still held when a stage ends and exceeds a size
+threshold (e.g. "self.full_df[::-1]" or a "reset_index" on a model's frame).
+"""
+import os
+import sys
+import tracemalloc
+from collections import Counter
+import pandas as pd
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+MEGABYTE = 1024 ** 2
+
+# tracemalloc tracebacks list the oldest frame first since Python 3.7
+OLDEST_FRAME_FIRST = sys.version_info >= (3, 7)
+
+
+def reset_traced_peak():
+    """
+    Restarts tracemalloc's peak tracking, where supported (Python 3.9+).
+    Elsewhere the traced peak is the peak since tracing started, so that
+    each span's peak is an upper bound: the highest traced memory so far.
+    """
+    if hasattr(tracemalloc, 'reset_peak'):
+        tracemalloc.reset_peak()
+
+
+def get_peak_rss():
+    """
+    Returns the process's peak resident set size so far, in MB (NaN where the
+    resource module is unavailable, e.g. on Windows).
+    """
+    if resource is None:
+        return(float('nan'))
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return(peak_rss / (MEGABYTE if sys.platform == 'darwin' else 1024))
+
+
+class MemoryTracker:
+    """
+    Records memory for each span while tracemalloc is tracing. tracemalloc
+    is process-wide, so spans on background threads (e.g. saves) also count
+    toward the spans open on the main thread.
+    """
+    
+    
+    def __init__(self):
+        """
+        snapshot_categories: span categories that also compare tracemalloc
+        snapshots, to find top allocators and copies. A snapshot takes about
+        a second on the pipeline's heap, so fine-grained spans (grid points,
+        pages) only record peaks
+        
+        allocation_threshold: size, in bytes, of the smallest allocation
+        kept from a snapshot. Large frames are held in large arrays, and
+        skipping the many small objects keeps comparisons fast
+        
+        copy_threshold: size, in MB, above which a retained pandas
+        allocation is flagged as a copy
+        
+        top_allocator_count: number of top allocating lines kept per span
+        
+        frame_count: traceback depth stored by tracemalloc, deep enough to
+        reach from pandas internals back to this repository. Deeper
+        tracebacks make every allocation slower; 1 still records peaks and
+        retained memory, several times faster, but finds no copies
+        
+        overhead: bytes held by the snapshots of open spans, which are left
+        out of every measurement
+        """
+        self.snapshot_categories = {'stage', 'data', 'test', 'cv', 'prediction'}
+        self.allocation_threshold = 64 * 1024
+        self.copy_threshold = 1.0
+        self.top_allocator_count = 5
+        self.frame_count = 12
+        self.root = os.path.abspath(os.getcwd())
+        self.overhead = 0
+    
+    
+    def start(self):
+        """
+        Starts tracing allocations.
+        """
+        tracemalloc.start(self.frame_count)
+    
+    
+    def stop(self):
+        """
+        Stops tracing allocations.
+        """
+        tracemalloc.stop()
+    
+    
+    def update_peaks(self, stack):
+        """
+        Credits the traced peak since the last update to every open span, and
+        restarts peak tracking, so that each span sees its own peak.
+        
+        stack: open spans of this thread
+        """
+        peak = tracemalloc.get_traced_memory()[1] - self.overhead
+        for span in stack:
+            span.memory['peak'] = max(span.memory['peak'], peak)
+        reset_traced_peak()
+    
+    
+    def get_repository_frame(self, frames):
+        """
+        Returns 'file:line' of the most recent frame that is in this
+        repository, or None.
+        
+        frames: tuple of (filename, line number), most recent first
+        """
+        for filename, lineno in frames:
+            filename = os.path.abspath(filename)
+            if filename.startswith(self.root) and 'site-packages' not in filename:
+                return('{}:{}'.format(os.path.relpath(filename, self.root), lineno))
+        return(None)
+    
+    
+    def take_snapshot(self):
+        """
+        Returns the traced allocations of at least "allocation_threshold"
+        bytes, counted by (frames, size), and the bytes they hold.
+        """
+        current = tracemalloc.get_traced_memory()[0]
+        # the tracer's own allocations (e.g. earlier snapshots) are filtered
+        # out first, and frames are only collected for large traces
+        tracer_files = [os.path.abspath(__file__),
+                        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'timing.py')]
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__)]
+            + [tracemalloc.Filter(False, filename, all_frames=True) for filename in tracer_files])
+        allocations = Counter()
+        for trace in snapshot.traces:
+            if trace.size >= self.allocation_threshold:
+                frames = tuple((frame.filename, frame.lineno) for frame in trace.traceback)
+                if OLDEST_FRAME_FIRST:
+                    frames = frames[::-1]
+                allocations[(frames, trace.size)] += 1
+        del snapshot
+        size = tracemalloc.get_traced_memory()[0] - current
+        return(allocations, size)
+    
+    
+    def compare_snapshots(self, start_snapshot, end_snapshot):
+        """
+        Returns the top allocating lines of this repository, and the bytes
+        allocated inside pandas by each line, from the large allocations
+        retained between two snapshots.
+        
+        start_snapshot, end_snapshot: Counters from "take_snapshot"
+        """
+        allocators = {}
+        pandas_allocators = {}
+        for (frames, size), count in (end_snapshot - start_snapshot).items():
+            location = self.get_repository_frame(frames)
+            if location is None:
+                continue
+            allocators[location] = allocators.get(location, 0) + size * count
+            if any(os.sep + 'pandas' + os.sep in filename for filename, lineno in frames):
+                pandas_allocators[location] = pandas_allocators.get(location, 0) + size * count
+        top_allocators = sorted(allocators.items(), key=lambda item: -item[1])
+        top_allocators = [{'location': location, 'size_mb': size / MEGABYTE}
+                          for location, size in top_allocators[:self.top_allocator_count]]
+        return(top_allocators, pandas_allocators)
+    
+    
+    def flag_copies(self, span, stack, pandas_allocators):
+        """
+        Returns the copies retained by a span, leaving out those already
+        flagged by nested spans, and passes all of them up to the nearest
+        enclosing span with snapshots, so that each copy is flagged once, by
+        the innermost stage that made it.
+        
+        span: the span being exited
+        
+        stack: open spans of this thread, "span" last
+        
+        pandas_allocators: dictionary of bytes allocated inside pandas, by
+        line of this repository
+        """
+        claimed = span.memory['claimed']
+        copies = []
+        for location, size in sorted(pandas_allocators.items()):
+            size = size - claimed.get(location, 0)
+            if size >= self.copy_threshold * MEGABYTE:
+                copies.append({'location': location, 'size_mb': size / MEGABYTE})
+                claimed[location] = claimed.get(location, 0) + size
+        parents = [parent for parent in stack[:-1] if parent.memory.get('snapshot') is not None]
+        if parents:
+            for location, size in claimed.items():
+                parents[-1].memory['claimed'][location] = parents[-1].memory['claimed'].get(location, 0) + size
+        return(copies)
+    
+    
+    def enter(self, span, stack):
+        """
+        Starts measuring a span, before it is pushed on the stack.
+        
+        span: the span being entered
+        
+        stack: open spans of this thread
+        """
+        self.update_peaks(stack)
+        snapshot, size = None, 0
+        if span.category in self.snapshot_categories:
+            snapshot, size = self.take_snapshot()
+            self.overhead += size
+            reset_traced_peak()
+        span.memory = {'peak': 0,
+                       'start': tracemalloc.get_traced_memory()[0] - self.overhead,
+                       'peak_rss': get_peak_rss(),
+                       'snapshot': snapshot,
+                       'snapshot_size': size,
+                       'claimed': {}}
+    
+    
+    def exit(self, span, stack):
+        """
+        Finishes measuring a span, before it is popped off the stack, and
+        returns its memory record.
+        
+        span: the span being exited
+        
+        stack: open spans of this thread, "span" last
+        """
+        self.update_peaks(stack)
+        current = tracemalloc.get_traced_memory()[0] - self.overhead
+        peak_rss = get_peak_rss()
+        record = {'peak_mb': (span.memory['peak'] - span.memory['start']) / MEGABYTE,
+                  'retained_mb': (current - span.memory['start']) / MEGABYTE,
+                  'peak_rss_mb': peak_rss,
+                  'rss_growth_mb': peak_rss - span.memory['peak_rss'],
+                  'top_allocators': [],
+                  'copies': []}
+        if span.memory['snapshot'] is not None:
+            record['top_allocators'], pandas_allocators = self.compare_snapshots(span.memory['snapshot'],
+                                                                                  self.take_snapshot()[0])
+            record['copies'] = self.flag_copies(span, stack, pandas_allocators)
+            self.overhead -= span.memory['snapshot_size']
+        span.memory = {}
+        reset_traced_peak()
+        return(record)
+
+
+def get_memory_summary(records):
+    """
+    Returns a table of memory by span category and name: number of calls,
+    the largest peak above the starting level, the total retained memory,
+    the growth of peak RSS, and the number and size of flagged copies.
+    
+    records: span records from a tracer with memory tracking
+    """
+    columns = ['category', 'name', 'calls', 'peak_mb', 'retained_mb',
+               'rss_growth_mb', 'copies', 'copied_mb', 'top_allocator']
+    rows = []
+    for record in records:
+        memory = record.get('memory')
+        if not memory:
+            continue
+        top_allocators = memory['top_allocators']
+        rows.append({'category': record['category'],
+                     'name': record['name'],
+                     'peak_mb': memory['peak_mb'],
+                     'retained_mb': memory['retained_mb'],
+                     'rss_growth_mb': memory['rss_growth_mb'],
+                     'copies': len(memory['copies']),
+                     'copied_mb': sum(copy['size_mb'] for copy in memory['copies']),
+                     'top_allocator': top_allocators[0]['location'] if top_allocators else ''})
+    if not rows:
+        return(pd.DataFrame(columns=columns))
+    rows = pd.DataFrame(rows)
+    # the top allocator of each stage is taken from its largest call
+    rows = rows.sort_values('peak_mb', ascending=False)
+    summary = rows.groupby(['category', 'name']).agg(calls=('peak_mb', 'size'),
+                                                     peak_mb=('peak_mb', 'max'),
+                                                     retained_mb=('retained_mb', 'sum'),
+                                                     rss_growth_mb=('rss_growth_mb', 'sum'),
+                                                     copies=('copies', 'sum'),
+                                                     copied_mb=('copied_mb', 'sum'),
+                                                     top_allocator=('top_allocator', 'first'))
+    return(summary.reset_index().sort_values(['category', 'name'])[columns].reset_index(drop=True))
+
+
+def get_copy_report(records):
+    """
+    Returns a table of flagged copies, by the innermost stage that retained
+    them and the line that made them.
+    
+    records: span records from a tracer with memory tracking
+    """
+    columns = ['category', 'name', 'location', 'count', 'size_mb']
+    copies = []
+    for record in records:
+        for copy in (record.get('memory') or {}).get('copies', []):
+            copies.append({'category': record['category'], 'name': record['name'],
+                           'location': copy['location'], 'size_mb': copy['size_mb']})
+    if not copies:
+        return(pd.DataFrame(columns=columns))
+    copies = pd.DataFrame(copies)
+    report = copies.groupby(['category', 'name', 'location']).agg(count=('size_mb', 'size'),
+                                                                  size_mb=('size_mb', 'sum'))
+    return(report.reset_index().sort_values(['category', 'name', 'location'])[columns].reset_index(drop=True))
+
+
+def export_memory_report(records, summary_path, copies_path):
+    """
+    Saves the memory summary and copy report as csv files, sorted and
+    rounded to 0.1 MB, so that reports from two runs can be diffed line by
+    line (or with "diff_memory_reports").
+    
+    records: span records from a tracer with memory tracking
+    
+    summary_path, copies_path: strings, where to save the two reports
+    """
+    summary = get_memory_summary(records).round(1)
+    summary.to_csv(summary_path, index=False)
+    get_copy_report(records).round(1).to_csv(copies_path, index=False)
+    return(summary)
+
+
+def diff_memory_reports(base_path, head_path):
+    """
+    Compares two saved memory summaries, and returns each stage's change in
+    peak, retained and copied memory, largest peak increase first.
+    
+    base_path, head_path: strings, paths of the two summaries
+    """
+    measures = ['peak_mb', 'retained_mb', 'rss_growth_mb', 'copied_mb']
+    base = pd.read_csv(base_path)
+    head = pd.read_csv(head_path)
+    comparison = pd.merge(base, head, on=['category', 'name'], how='outer',
+                          suffixes=('_base', '_head'))
+    for measure in measures:
+        comparison['{}_change'.format(measure)] = (comparison['{}_head'.format(measure)].fillna(0)
+                                                   - comparison['{}_base'.format(measure)].fillna(0))
+    return(comparison.sort_values('peak_mb_change', ascending=False).reset_index(drop=True))
+        
+        
+#MIT License
+#
+#Copyright (c) 2019 Terrence Zhang
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
\ No newline at end of file
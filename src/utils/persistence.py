@@ -0,0 +1,104 @@
+"""
+This module saves pipeline outputs in the background, so that each stage
+can hand its outputs straight to the next stage without waiting on disk.
+"""
+import os
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from src.utils.timing import span
+
+
+def save_json(data, file_path):
+    """
+    Dumps data to a json file.
+    
+    data: json-serializable object
+    
+    file_path: string, where to save the data
+    """
+    with open(file_path, 'w') as file:
+        json.dump(data, file)
+
+
+class BackgroundWriter:
+    """
+    Runs save functions on a single background thread, in the order they
+    were submitted. Submitted data must not be modified afterwards.
+    """
+    
+    
+    def __init__(self, enabled=True):
+        """
+        enabled: whether to save at all. If False, submitted saves are
+        skipped, and outputs only live in memory
+        
+        futures: pending saves, checked for errors by "wait"
+        """
+        self.enabled = bool(enabled)
+        self.executor = None
+        self.futures = []
+    
+    
+    def submit(self, function, *args, **kwargs):
+        """
+        Queues a save, and returns immediately.
+        
+        function: the save function, called with "args" and "kwargs"
+        """
+        if not self.enabled:
+            return(None)
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=1)
+        future = self.executor.submit(self.run_save, function, args, kwargs)
+        self.futures.append(future)
+        return(future)
+    
+    
+    def run_save(self, function, args, kwargs):
+        """
+        Runs one save on the background thread, timed as an 'io' span named
+        after the save function and its target file.
+        
+        function: the save function
+        
+        args, kwargs: arguments of the save function
+        """
+        target = [arg for arg in args if isinstance(arg, str)]
+        with span(function.__name__, 'io',
+                  file=os.path.basename(target[-1]) if target else ''):
+            return(function(*args, **kwargs))
+    
+    
+    def wait(self):
+        """
+        Blocks until every queued save is done, and re-raises the first
+        error from a failed save.
+        """
+        futures = self.futures
+        self.futures = []
+        for future in futures:
+            future.result()
+        
+        
+#MIT License
+#
+#Copyright (c) 2019 Terrence Zhang
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
\ No newline at end of file
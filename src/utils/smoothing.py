@@ -0,0 +1,171 @@
+"""
+This module performs exponential smoothing on result series, either on whole
+series at once or one new value at a time.
+"""
+import json
+import math
+import numpy as np
+
+
+def get_smoothing_factor(half_life):
+    """
+    Returns the smoothing factor (alpha) for a half-life, calculated as
+    alpha = 1 - exp(ln(0.5) / half_life).
+    
+    half_life: float, or array of floats
+    """
+    return(1 - np.exp(math.log(0.5) / np.asarray(half_life, dtype=float)))
+
+
+def exponential_smoother(raw_data, half_life):
+    """
+    Performs exponential smoothing on "raw_data", as a linear filter. Begins
+    recursion with the first data item (i.e. assumes that data in "raw_data"
+    is listed in chronological order).
+    
+    Output: an array with the smoothed values of "raw_data", in the shape of
+    "raw_data" broadcast against "half_life" along the last axis.
+    
+    raw_data: iterable, the data to be smoothed. Either one series, or a
+    (dates x columns) array with one series per column
+    
+    half_life: float, or array of floats with one half-life per column. A
+    single series is smoothed with every half-life when several are given
+    """
+    from scipy.signal import lfilter
+    
+    raw_data = np.asarray(raw_data, dtype=float)
+    smoothing_factors = get_smoothing_factor(half_life)
+    if raw_data.ndim == 1 and smoothing_factors.ndim == 0:
+        raw_data = raw_data[:, None]
+        single_series = True
+    else:
+        single_series = False
+        if raw_data.ndim == 1:
+            raw_data = raw_data[:, None]
+    raw_data, smoothing_factors = np.broadcast_arrays(raw_data,
+                                                      np.atleast_1d(smoothing_factors)[None, :])
+    smoothing_factors = smoothing_factors[0]
+    smoothed_values = np.empty(raw_data.shape)
+    # columns sharing a half-life are filtered together, in one call
+    for smoothing_factor in np.unique(smoothing_factors):
+        columns = smoothing_factors == smoothing_factor
+        decay = 1 - smoothing_factor
+        initial_state = decay * raw_data[0, columns]
+        smoothed_values[:, columns] = lfilter([smoothing_factor], [1, -decay],
+                                              raw_data[:, columns], axis=0,
+                                              zi=initial_state[None, :])[0]
+    if single_series:
+        return(smoothed_values[:, 0])
+    return(smoothed_values)
+
+
+class StreamingExponentialSmoother:
+    """
+    Performs the same exponential smoothing as exponential_smoother, one new
+    value at a time. Only the last smoothed value is kept, so that each
+    update is O(1) and the state can be saved between runs.
+    """
+    
+    
+    def __init__(self, half_life):
+        """
+        half_life: float, the half-life for the smoother
+        
+        last_value: the most recent smoothed value (None before any update)
+        
+        last_date: the date of the most recent value, if dates are given
+        """
+        self.half_life = float(half_life)
+        self.smoothing_factor = float(get_smoothing_factor(self.half_life))
+        self.last_value = None
+        self.last_date = None
+    
+    
+    def update(self, new_value, date=None):
+        """
+        Adds one value, and returns the new smoothed value. Values dated on
+        or before the last update are skipped, so that re-running over
+        already smoothed dates is harmless.
+        
+        new_value: float, the next unsmoothed value
+        
+        date: optional, the (sortable) date of "new_value"
+        """
+        if date is not None and self.last_date is not None and date <= self.last_date:
+            return(self.last_value)
+        if self.last_value is None:
+            self.last_value = float(new_value)
+        else:
+            self.last_value = ((self.smoothing_factor * float(new_value))
+                + ((1 - self.smoothing_factor) * self.last_value))
+        if date is not None:
+            self.last_date = date
+        return(self.last_value)
+    
+    
+    def update_many(self, new_values, dates=None):
+        """
+        Adds values in chronological order, and returns their smoothed values.
+        
+        new_values: iterable, the next unsmoothed values
+        
+        dates: optional iterable, the date of each value
+        """
+        if dates is None:
+            dates = [None] * len(new_values)
+        return([self.update(new_value, date)
+                for new_value, date in zip(new_values, dates)])
+    
+    
+    def save(self, file_path):
+        """
+        Saves the smoother's state to a json file.
+        
+        file_path: string, where to save the state
+        """
+        with open(file_path, 'w') as file:
+            json.dump({'half_life': self.half_life,
+                       'last_value': self.last_value,
+                       'last_date': self.last_date}, file)
+    
+    
+    def load(self, file_path):
+        """
+        Loads a state saved by "save", if one exists with the same half-life.
+        Returns whether a state was loaded.
+        
+        file_path: string, where the state was saved
+        """
+        try:
+            with open(file_path, 'r') as file:
+                state = json.load(file)
+        except (IOError, ValueError):
+            return(False)
+        if state['half_life'] != self.half_life:
+            return(False)
+        self.last_value = state['last_value']
+        self.last_date = state['last_date']
+        return(True)
+
+#MIT License
+#
+#Copyright (c) 2019 Terrence Zhang
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
\ No newline at end of file
@@ -0,0 +1,290 @@
+"""
+This module times pipeline stages as nested spans, and exports them as a
+Chrome trace (for chrome://tracing or Perfetto) and as a summary table.
+
+Tracing is off by default. While it is off, "span" returns a shared no-op
+context manager, so instrumented code pays for one attribute check per span.
+Memory tracking (see memory.py) is a further opt-in on top of tracing.
+"""
+import os
+import json
+import time
+import threading
+import pandas as pd
+from src.utils.memory import MemoryTracker, export_memory_report
+
+
+class Span:
+    """
+    One timed stage, used as a context manager. Wall and CPU time are
+    recorded on exit, along with the time spent in nested spans.
+    """
+    
+    
+    def __init__(self, tracer, name, category, args):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+        self.depth = 0
+        self.child_wall = 0.0
+        self.start_wall = 0.0
+        self.start_cpu = 0.0
+        self.memory = {}
+    
+    
+    def __enter__(self):
+        stack = self.tracer.get_stack()
+        self.depth = len(stack)
+        if self.tracer.memory is not None:
+            self.tracer.memory.enter(self, stack)
+        stack.append(self)
+        self.start_cpu = time.thread_time()
+        self.start_wall = time.perf_counter()
+        return(self)
+    
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        wall = time.perf_counter() - self.start_wall
+        cpu = time.thread_time() - self.start_cpu
+        stack = self.tracer.get_stack()
+        memory = {}
+        if self.tracer.memory is not None:
+            memory = self.tracer.memory.exit(self, stack)
+        stack.pop()
+        if stack:
+            stack[-1].child_wall += wall
+        self.tracer.add_records([{'name': self.name,
+                                  'category': self.category,
+                                  'args': self.args,
+                                  'start': self.start_wall,
+                                  'wall': wall,
+                                  'cpu': cpu,
+                                  'self_wall': wall - self.child_wall,
+                                  'depth': self.depth,
+                                  'memory': memory,
+                                  'pid': os.getpid(),
+                                  'tid': threading.get_ident()}])
+        return(False)
+
+
+class NullSpan:
+    """
+    The span handed out while tracing is off: it does nothing.
+    """
+    
+    
+    def __enter__(self):
+        return(self)
+    
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        return(False)
+
+
+NULL_SPAN = NullSpan()
+
+
+class Tracer:
+    """
+    Collects spans from every thread of this process. Spans from worker
+    processes are collected by returning "pop_records" from the worker and
+    passing them to "add_records" in the parent.
+    """
+    
+    
+    def __init__(self):
+        """
+        enabled: whether spans are recorded
+        
+        origin: perf_counter value that trace timestamps are relative to
+        
+        records: one dictionary per finished span
+        
+        memory: MemoryTracker while memory is tracked, otherwise None
+        """
+        self.enabled = False
+        self.memory = None
+        self.origin = time.perf_counter()
+        self.records = []
+        self.lock = threading.Lock()
+        self.local = threading.local()
+    
+    
+    def enable(self, memory=False):
+        """
+        Clears any recorded spans, and starts recording.
+        
+        memory: boolean, whether to also record memory per span. This traces
+        every allocation, and slows the pipeline down 10 to 20 times
+        """
+        self.records = []
+        self.origin = time.perf_counter()
+        self.enabled = True
+        if memory and self.memory is None:
+            self.memory = MemoryTracker()
+            self.memory.start()
+    
+    
+    def disable(self):
+        """
+        Stops recording. Recorded spans are kept for export.
+        """
+        self.enabled = False
+        if self.memory is not None:
+            self.memory.stop()
+            self.memory = None
+    
+    
+    def span(self, name, category='stage', **args):
+        """
+        Returns a context manager that times the stage it wraps.
+        
+        name: string, name of the stage
+        
+        category: string, kind of stage (e.g. 'cv', 'grid point', 'page')
+        
+        args: extra details to show in the trace (e.g. the test, output or
+        hyperparameters)
+        """
+        if not self.enabled:
+            return(NULL_SPAN)
+        return(Span(self, name, category, args))
+    
+    
+    def get_stack(self):
+        """
+        Returns the open spans of the calling thread, outermost first.
+        """
+        if not hasattr(self.local, 'stack'):
+            self.local.stack = []
+        return(self.local.stack)
+    
+    
+    def add_records(self, records):
+        """
+        Adds finished spans, e.g. those returned by a worker process.
+        
+        records: list of span dictionaries
+        """
+        with self.lock:
+            self.records.extend(records)
+    
+    
+    def pop_records(self):
+        """
+        Returns and clears the recorded spans.
+        """
+        with self.lock:
+            records = self.records
+            self.records = []
+        return(records)
+    
+    
+    def get_chrome_trace(self):
+        """
+        Returns the recorded spans in Chrome trace event format, as complete
+        ("X") events with microsecond timestamps.
+        """
+        trace_events = []
+        for record in sorted(self.records, key=lambda record: record['start']):
+            args = {str(key): str(value) for key, value in record['args'].items()}
+            args['cpu_ms'] = round(record['cpu'] * 1e3, 3)
+            if record.get('memory'):
+                args['peak_mb'] = round(record['memory']['peak_mb'], 3)
+                args['retained_mb'] = round(record['memory']['retained_mb'], 3)
+            trace_events.append({'name': record['name'],
+                                 'cat': record['category'],
+                                 'ph': 'X',
+                                 'ts': round((record['start'] - self.origin) * 1e6, 3),
+                                 'dur': round(record['wall'] * 1e6, 3),
+                                 'pid': record['pid'],
+                                 'tid': record['tid'],
+                                 'args': args})
+        return({'traceEvents': trace_events, 'displayTimeUnit': 'ms'})
+    
+    
+    def export_chrome_trace(self, file_path):
+        """
+        Saves the Chrome trace to a json file.
+        
+        file_path: string, where to save the trace
+        """
+        with open(file_path, 'w') as file:
+            json.dump(self.get_chrome_trace(), file)
+    
+    
+    def get_summary(self):
+        """
+        Returns a table of the recorded spans, by category and name: number
+        of calls, and total wall, self (excluding nested spans) and CPU
+        seconds, slowest first.
+        """
+        columns = ['category', 'name', 'calls', 'wall_s', 'self_s', 'cpu_s',
+                   'mean_wall_s']
+        if not self.records:
+            return(pd.DataFrame(columns=columns))
+        records = pd.DataFrame(self.records)
+        summary = records.groupby(['category', 'name']).agg(calls=('wall', 'size'),
+                                                            wall_s=('wall', 'sum'),
+                                                            self_s=('self_wall', 'sum'),
+                                                            cpu_s=('cpu', 'sum'))
+        summary['mean_wall_s'] = summary['wall_s'] / summary['calls']
+        summary = summary.sort_values('wall_s', ascending=False).reset_index()
+        return(summary[columns])
+    
+    
+    def export_summary(self, file_path):
+        """
+        Saves the summary table to a csv file, and returns it.
+        
+        file_path: string, where to save the summary
+        """
+        summary = self.get_summary()
+        summary.to_csv(file_path, index=False)
+        return(summary)
+    
+    
+    def export_memory_report(self, summary_path, copies_path):
+        """
+        Saves the memory summary and the flagged DataFrame copies to csv
+        files, and returns the summary. See memory.export_memory_report.
+        
+        summary_path, copies_path: strings, where to save the two reports
+        """
+        return(export_memory_report(self.records, summary_path, copies_path))
+
+
+tracer = Tracer()
+
+
+def span(name, category='stage', **args):
+    """
+    Times a stage with the shared tracer. See Tracer.span.
+    """
+    if not tracer.enabled:
+        return(NULL_SPAN)
+    return(Span(tracer, name, category, args))
+        
+        
+#MIT License
+#
+#Copyright (c) 2019 Terrence Zhang
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
\ No newline at end of file
@@ -8,6 +8,8 @@ import seaborn as sns
 import matplotlib.pyplot as plt
 
 import RecessionPredictor_paths as path
+from src.utils.smoothing import exponential_smoother, StreamingExponentialSmoother
+from src.utils.timing import span
 
 
 class TestResultPlots:
@@ -18,48 +20,43 @@ class TestResultPlots:
     def __init__(self):
         """
         prediction_names: used to re-label chart data
+        
+        half_life: half-life of the exponential smoother
         """
         self.pdf_object = ''
         self.prediction_names = {'Pred_Recession_within_12mo': 'Within 12 Months'}
+        self.half_life = 3
     
     
-    def exponential_smoother(self, raw_data, half_life):
+    def exponential_conversion(self, dataframe):
         """
-        Purpose: performs exponential smoothing on "raw_data". Begins recursion
-        with the first data item (i.e. assumes that data in "raw_data" is listed
-        in chronological order).
-        
-        Output: a list containing the smoothed values of "raw_data".
-        
-        "raw_data": iterable, the data to be smoothed.
-        
-        "half_life": float, the half-life for the smoother. The smoothing factor
-        (alpha) is calculated as alpha = 1 - exp(ln(0.5) / half_life)
+        Performs exponential smoothing on specific columns of the dataframe.
         """
-        import math
-        
-        raw_data = list(raw_data)
-        half_life = float(half_life)
-        
-        smoothing_factor = 1 - math.exp(math.log(0.5) / half_life)
-        smoothed_values = [raw_data[0]]
-        for index in range(1, len(raw_data)):
-            previous_smooth_value = smoothed_values[-1]
-            new_unsmooth_value = raw_data[index]
-            new_smooth_value = ((smoothing_factor * new_unsmooth_value)
-                + ((1 - smoothing_factor) * previous_smooth_value))
-            smoothed_values.append(new_smooth_value)
-        
-        return(smoothed_values)
+        dataframe['Within 12 Months'] = exponential_smoother(raw_data=dataframe['Within 12 Months'],
+                                                             half_life=self.half_life)
+        return(dataframe)
     
     
-    def exponential_conversion(self, dataframe):
+    def update_smoothed_prediction(self, dataframe, prediction_name):
         """
-        Performs exponential smoothing on specific columns of the dataframe.
+        Smooths only the predictions dated after the last saved update, and
+        returns the latest smoothed value. The smoother's state is saved, so
+        a daily deploy does not recompute history.
+        
+        dataframe: dataframe, the deployed model's predictions
+        
+        prediction_name: string, the predictions' column, as written by the
+        Deployer ('Pred_' followed by its first output name)
         """
-        dataframe['Within 12 Months'] = self.exponential_smoother(raw_data=dataframe['Within 12 Months'],
-                                                                  half_life=3)
-        return(dataframe)
+        dataframe = dataframe.sort_values('date')
+        smoother = StreamingExponentialSmoother(half_life=self.half_life)
+        smoother.load(path.deployment_smoother_state)
+        if smoother.last_date is not None:
+            dataframe = dataframe[dataframe['date'].astype(str) > smoother.last_date]
+        smoother.update_many(new_values=dataframe[prediction_name].tolist(),
+                             dates=dataframe['date'].astype(str).tolist())
+        smoother.save(path.deployment_smoother_state)
+        return(smoother.last_value)
     
     
     def plot_probabilities(self, dataframe, name, exponential):
@@ -72,22 +69,23 @@ class TestResultPlots:
         
         exponential: boolean, whether to plot exponentially weighted output data or not
         """
-        dataframe.rename(columns=self.prediction_names, inplace=True)
-        if exponential == True:
-            dataframe = self.exponential_conversion(dataframe=dataframe)
-        is_recession = dataframe['Recession_in_12mo'] == 1
-        is_not_recession = dataframe['Recession_in_12mo'] == 0
-        dataframe.loc[is_recession, 'Recession_in_12mo'] = 100
-        dataframe.loc[is_not_recession, 'Recession_in_12mo'] = -1
-        dataframe = dataframe[['date'] + list(self.prediction_names.values())]
+        with span(name, 'page', exponential=exponential):
+            dataframe.rename(columns=self.prediction_names, inplace=True)
+            if exponential == True:
+                dataframe = self.exponential_conversion(dataframe=dataframe)
+            is_recession = dataframe['Recession_in_12mo'] == 1
+            is_not_recession = dataframe['Recession_in_12mo'] == 0
+            dataframe.loc[is_recession, 'Recession_in_12mo'] = 100
+            dataframe.loc[is_not_recession, 'Recession_in_12mo'] = -1
+            dataframe = dataframe[['date'] + list(self.prediction_names.values())]
         
-        plt.figure(figsize=(15, 5))
-        plot = sns.lineplot(x='Dates', y='value', hue='variable',
-                            data=pd.melt(dataframe, ['date']))
-        plot.set_ylabel('Probability')
-        plot.set_title(name, fontsize = 20)
-        plot.set_ylim((0, 1))
-        self.pdf_object.savefig()
+            plt.figure(figsize=(15, 5))
+            plot = sns.lineplot(x='Dates', y='value', hue='variable',
+                                data=pd.melt(dataframe, ['date']))
+            plot.set_ylabel('Probability')
+            plot.set_title(name, fontsize = 20)
+            plot.set_ylim((0, 1))
+            self.pdf_object.savefig()
 
     
     def plot_test_results(self):
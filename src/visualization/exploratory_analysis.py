@@ -1,14 +1,70 @@
 """
 This module performs exploratory analysis by generating visuals / charts and
 saving them to PDF.
+
+Each chart is one PDF page, and every figure is closed as soon as it is
+saved, so memory stays flat however many pages there are. Optionally, pages
+are drawn in worker processes (with a non-interactive backend), saved as
+single-page PDFs and merged in order.
 """
 
+import io
+import os
+import json
+import shutil
+import tempfile
+import numpy as np
 import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_pdf import PdfPages
 
 import RecessionPredictor_paths as path
+from src.utils.timing import span, tracer
+
+
+def start_page_worker(exploratory_df, correlation_matrix, tracing=False):
+    """
+    Sets up a worker process to draw pages: switches to a non-interactive
+    backend, and receives the exploratory dataset and correlations once.
+    
+    exploratory_df: dataframe, the exploratory dataset
+    
+    correlation_matrix: dataframe, correlations of every feature and output
+    
+    tracing: boolean, whether to time pages (as in the parent process)
+    """
+    global page_worker_analysis
+    if tracing:
+        tracer.enable()
+    else:
+        tracer.disable()
+    plt.switch_backend('Agg')
+    page_worker_analysis = ExploratoryAnalysis()
+    page_worker_analysis.exploratory_df = exploratory_df
+    page_worker_analysis.correlation_matrix = correlation_matrix
+
+
+def render_page(page_number, page, page_directory):
+    """
+    Draws one page in a worker process, saves it as a single-page PDF and
+    closes its figure. Returns the page's file path, and the worker's timing
+    spans for the parent's tracer.
+    
+    page_number: int, position of the page in the final PDF
+    
+    page: (draw method name, keyword arguments), as queued by add_page
+    
+    page_directory: string, directory for the single-page PDFs
+    """
+    draw_method, kwargs = page
+    with span(draw_method, 'page', page=page_number):
+        getattr(page_worker_analysis, draw_method)(**kwargs)
+        page_path = os.path.join(page_directory, 'page_{:05d}.pdf'.format(page_number))
+        plt.savefig(page_path, format='pdf')
+        plt.close('all')
+    return(page_path, tracer.pop_records())
+
 
 class ExploratoryAnalysis:
     """
@@ -24,11 +80,30 @@ class ExploratoryAnalysis:
         analysis
         
         output_series: names of the outputs to include in exploratory analysis
+        
+        workers: number of processes that draw pages. With 1 worker (the
+        default), or without PyPDF2, which merges the pages, pages are drawn
+        serially. The workers re-import the running script on Windows, so
+        more than 1 is only safe from a script whose code runs under an
+        "if __name__ == '__main__':" guard
+        
+        pages: queued (draw method name, keyword arguments) for each page
+        
+        correlation_matrix: correlations between every feature and output,
+        computed once, that every correlation chart slices from
+        
+        correlation_p_values: two-sided p-values of correlation_matrix
+        (only computed when calculate_p_values is True)
         """
         self.end_date = '1976-01-01'
         self.exploratory_df = pd.DataFrame()
         self.final_df_output = pd.DataFrame()
         self.pdf_object = ''
+        self.workers = 1
+        self.pages = []
+        self.calculate_p_values = True
+        self.correlation_matrix = pd.DataFrame()
+        self.correlation_p_values = pd.DataFrame()
         self.full_feature_columns = ['Payrolls_3mo_pct_chg_annualized',
                                      'Payrolls_12mo_pct_chg', 'Payrolls_3mo_vs_12mo',
                                      'Unemployment_Rate', 'Unemployment_Rate_12mo_chg',
@@ -45,6 +120,107 @@ class ExploratoryAnalysis:
                               'Recession_within_12mo', 'Recession_within_24mo']
     
     
+    def add_page(self, draw_method, **kwargs):
+        """
+        Queues a page, to be drawn by "draw_method" when pages are rendered.
+        
+        draw_method: string, name of the method that draws the page
+        
+        kwargs: keyword arguments for "draw_method"
+        """
+        self.pages.append((draw_method, kwargs))
+    
+    
+    def get_correlation_cache_key(self):
+        """
+        Key for the exploratory dataset's version (a hash of its contents)
+        and end date in the correlation cache.
+        """
+        columns = self.full_feature_columns + self.output_series
+        dataset_version = pd.util.hash_pandas_object(self.exploratory_df[columns]).sum()
+        return('{:x}|{}'.format(int(dataset_version), self.end_date))
+    
+    
+    def compute_correlations(self):
+        """
+        Computes the correlations between every feature and output in one
+        vectorized pass, and their p-values from the same statistics (as
+        scipy.stats.pearsonr would, pair by pair).
+        """
+        from scipy import stats
+        
+        columns = self.full_feature_columns + self.output_series
+        values = self.exploratory_df[columns].to_numpy(dtype=float)
+        sample_count = len(values)
+        centered_values = values - values.mean(axis=0)
+        covariance = centered_values.T @ centered_values
+        standard_deviations = np.sqrt(np.diag(covariance))
+        correlations = covariance / np.outer(standard_deviations, standard_deviations)
+        correlations = np.clip(correlations, -1, 1)
+        np.fill_diagonal(correlations, 1)
+        self.correlation_matrix = pd.DataFrame(correlations, index=columns,
+                                               columns=columns)
+        if self.calculate_p_values:
+            degrees_of_freedom = sample_count - 2
+            with np.errstate(divide='ignore'):
+                t_statistics = correlations * np.sqrt(degrees_of_freedom
+                                                      / (1 - correlations ** 2))
+            p_values = 2 * stats.t.sf(np.abs(t_statistics), degrees_of_freedom)
+            self.correlation_p_values = pd.DataFrame(p_values, index=columns,
+                                                     columns=columns)
+    
+    
+    def load_correlations(self):
+        """
+        Loads the correlations (and p-values) from the correlation cache,
+        computing and caching them if this dataset version and end date have
+        not been seen before.
+        """
+        correlation_cache = {}
+        if os.path.exists(path.exploratory_correlations):
+            with open(path.exploratory_correlations, 'r') as file:
+                correlation_cache = json.load(file)
+        cache_key = self.get_correlation_cache_key()
+        cached_correlations = correlation_cache.get(cache_key)
+        if (cached_correlations is not None and
+                (cached_correlations['P Values'] is not None or not self.calculate_p_values)):
+            self.correlation_matrix = pd.read_json(io.StringIO(cached_correlations['Correlations']),
+                                                   orient='split')
+            if cached_correlations['P Values'] is not None:
+                self.correlation_p_values = pd.read_json(io.StringIO(cached_correlations['P Values']),
+                                                         orient='split')
+            return
+        
+        self.compute_correlations()
+        p_values = None
+        if self.calculate_p_values:
+            p_values = self.correlation_p_values.to_json(orient='split',
+                                                         double_precision=15)
+        correlations = self.correlation_matrix.to_json(orient='split',
+                                                       double_precision=15)
+        correlation_cache[cache_key] = {'Correlations': correlations,
+                                        'P Values': p_values}
+        with open(path.exploratory_correlations, 'w') as file:
+            json.dump(correlation_cache, file)
+    
+    
+    def draw_positive_class_count(self, series_name):
+        """
+        Draws the number of positive class instances (as % of total class
+        instances) of one output.
+        """
+        plt.figure(figsize=(8, 6))
+        chart_title = 'Class Counts: "{}"'.format(series_name)
+        plot = sns.barplot(x=series_name, y=series_name,
+                           data=self.exploratory_df,
+                           estimator=lambda x: len(x) / len(self.exploratory_df) * 100)
+        plot.set_ylabel('Percent (%)', fontsize=20)
+        plot.set_xlabel('')
+        plot.set_ylim([0, 100])
+        plot.set_title(chart_title, fontsize = 25)
+        plot.tick_params(labelsize=15)
+    
+    
     def plot_positive_class_counts(self):
         """
         Creates charts that plot the number of positive class instances
@@ -52,41 +228,45 @@ class ExploratoryAnalysis:
         """
         
         for series_name in self.output_series:
-            plt.figure(figsize=(8, 6))
-            chart_title = 'Class Counts: "{}"'.format(series_name)
-            plot = sns.barplot(x=series_name, y=series_name,
-                               data=self.exploratory_df,
-                               estimator=lambda x: len(x) / len(self.exploratory_df) * 100)
-            plot.set_ylabel('Percent (%)', fontsize=20)
-            plot.set_xlabel('')
-            plot.set_ylim([0, 100])
-            plot.set_title(chart_title, fontsize = 25)
-            plot.tick_params(labelsize=15)
-            self.pdf_object.savefig()
+            self.add_page('draw_positive_class_count', series_name=series_name)
+    
+    
+    def draw_feature_output_correlations(self, output_name):
+        """
+        Draws the correlations of every feature to one output.
+        """
+        correlations = self.correlation_matrix.loc[self.full_feature_columns,
+                                                   [output_name]].T
+        
+        plt.figure(figsize=(50, 10))
+        chart_title = 'Feature Correlations to "{}" Label'.format(output_name)
+        plot = sns.barplot(data=correlations, orient='h')
+        plot.set_ylabel('')
+        plot.set_xlabel('Correlation', fontsize=30)
+        plot.set_title(chart_title, fontsize = 40)
+        plot.tick_params(labelsize=20)
+        plot.set_xlim((-0.7, 0.7))
         
     
     def plot_feature_output_correlations(self):
         """
         Plots feature-output correlations for each feature and output pair.
         """
-        from scipy import stats
-        
         for output_name in self.output_series:
-            correlations = pd.DataFrame()
-            for feature_name in self.full_feature_columns:
-                pearson_corr = stats.pearsonr(self.exploratory_df[feature_name],
-                                              self.exploratory_df[output_name])
-                correlations[feature_name] = [pearson_corr[0]]
-            
-            plt.figure(figsize=(50, 10))
-            chart_title = 'Feature Correlations to "{}" Label'.format(output_name)
-            plot = sns.barplot(data=correlations, orient='h')
-            plot.set_ylabel('')
-            plot.set_xlabel('Correlation', fontsize=30)
-            plot.set_title(chart_title, fontsize = 40)
-            plot.tick_params(labelsize=20)
-            plot.set_xlim((-0.7, 0.7))
-            self.pdf_object.savefig()
+            self.add_page('draw_feature_output_correlations', output_name=output_name)
+    
+    
+    def draw_feature_output_scatterplot(self, output_name, feature_name):
+        """
+        Draws the scatterplot of one feature-output pair.
+        """
+        plt.figure(figsize=(8, 6))
+        chart_title = '{} vs. {}'.format(output_name, feature_name)
+        plot = sns.scatterplot(x=feature_name, y=output_name,
+                               data=self.exploratory_df)
+        plot.set_ylim([-0.1, 1.1])
+        plot.set_title(chart_title, fontsize = 20)
+        plot.tick_params(labelsize=15)
     
     
     def plot_feature_output_scatterplots(self):
@@ -95,33 +275,40 @@ class ExploratoryAnalysis:
         """
         for output_name in self.output_series:
             for feature_name in self.full_feature_columns:
-                
-                plt.figure(figsize=(8, 6))
-                chart_title = '{} vs. {}'.format(output_name, feature_name)
-                plot = sns.scatterplot(x=feature_name, y=output_name,
-                                       data=self.exploratory_df)
-                plot.set_ylim([-0.1, 1.1])
-                plot.set_title(chart_title, fontsize = 20)
-                plot.tick_params(labelsize=15)
-                self.pdf_object.savefig()
+                self.add_page('draw_feature_output_scatterplot',
+                              output_name=output_name, feature_name=feature_name)
     
     
-    def plot_correlation_heatmaps(self):
+    def draw_correlation_heatmap(self, feature_set, chart_title):
         """
-        Plot correlation heatmaps between select individual features.
-        """        
-        feature_set_1 = ['Payrolls_3mo_vs_12mo', 'Real_Fed_Funds_Rate_12mo_chg',
-                         'CPI_3mo_pct_chg_annualized', 'CPI_12mo_pct_chg']
-        correlation_matrix = self.exploratory_df[feature_set_1].corr()
+        Draws the correlation heatmap of a set of features.
+        """
+        correlation_matrix = self.correlation_matrix.loc[feature_set, feature_set]
         plt.figure(figsize=(5, 5))
-        chart_title = 'Correlation Heatmap - Pick Inflation Feature'
         plot = sns.heatmap(correlation_matrix, vmin=-1, vmax=1,
                            xticklabels=correlation_matrix.columns,
                            yticklabels=correlation_matrix.columns,
                            annot=True, fmt='.0%')
         plot.set_title(chart_title, fontsize = 10)
         plot.tick_params(labelsize=4)
-        self.pdf_object.savefig()
+    
+    
+    def draw_scatter_matrix(self, feature_set):
+        """
+        Draws the scatter matrix of a set of features.
+        """
+        pd.plotting.scatter_matrix(self.exploratory_df[feature_set],
+                                   figsize=(18, 18), diagonal='kde')
+    
+    
+    def plot_correlation_heatmaps(self):
+        """
+        Plot correlation heatmaps between select individual features.
+        """        
+        feature_set_1 = ['Payrolls_3mo_vs_12mo', 'Real_Fed_Funds_Rate_12mo_chg',
+                         'CPI_3mo_pct_chg_annualized', 'CPI_12mo_pct_chg']
+        self.add_page('draw_correlation_heatmap', feature_set=feature_set_1,
+                      chart_title='Correlation Heatmap - Pick Inflation Feature')
         
         feature_set_2 = ['Payrolls_3mo_vs_12mo', 'Real_Fed_Funds_Rate_12mo_chg',
                          'CPI_3mo_pct_chg_annualized', 
@@ -130,53 +317,92 @@ class ExploratoryAnalysis:
                          '3M_10Y_Treasury_Spread',
                          '3M_10Y_Treasury_Spread_12mo_chg',
                          '5Y_10Y_Treasury_Spread']
-        correlation_matrix = self.exploratory_df[feature_set_2].corr()
-        plt.figure(figsize=(5, 5))
-        chart_title = 'Correlation Heatmap - Pick Treasury Rate Features'
-        plot = sns.heatmap(correlation_matrix, vmin=-1, vmax=1,
-                           xticklabels=correlation_matrix.columns,
-                           yticklabels=correlation_matrix.columns,
-                           annot=True, fmt='.0%')
-        plot.set_title(chart_title, fontsize = 10)
-        plot.tick_params(labelsize=4)
-        self.pdf_object.savefig()
+        self.add_page('draw_correlation_heatmap', feature_set=feature_set_2,
+                      chart_title='Correlation Heatmap - Pick Treasury Rate Features')
         
         feature_set_3 = ['Payrolls_3mo_vs_12mo', 'Real_Fed_Funds_Rate_12mo_chg',
                          'CPI_3mo_pct_chg_annualized', 
                          '10Y_Treasury_Rate_12mo_chg',
                          '3M_10Y_Treasury_Spread', 'S&P_500_12mo_chg',
                          'S&P_500_3mo_vs_12mo']
-        correlation_matrix = self.exploratory_df[feature_set_3].corr()
-        plt.figure(figsize=(5, 5))
-        chart_title = 'Correlation Heatmap - Pick Stock Market Feature'
-        plot = sns.heatmap(correlation_matrix, vmin=-1, vmax=1,
-                           xticklabels=correlation_matrix.columns,
-                           yticklabels=correlation_matrix.columns,
-                           annot=True, fmt='.0%')
-        plot.set_title(chart_title, fontsize = 10)
-        plot.tick_params(labelsize=4)
-        self.pdf_object.savefig()
+        self.add_page('draw_correlation_heatmap', feature_set=feature_set_3,
+                      chart_title='Correlation Heatmap - Pick Stock Market Feature')
         
         feature_set_4 = ['Payrolls_3mo_vs_12mo', 'Real_Fed_Funds_Rate_12mo_chg',
                          'CPI_3mo_pct_chg_annualized', 
                          '10Y_Treasury_Rate_12mo_chg',
                          '3M_10Y_Treasury_Spread', 'S&P_500_12mo_chg']
-        pd.plotting.scatter_matrix(self.exploratory_df[feature_set_4],
-                                  figsize=(18, 18), diagonal='kde')
-        self.pdf_object.savefig()
+        self.add_page('draw_scatter_matrix', feature_set=feature_set_4)
+    
+    
+    def render_pages_serially(self):
+        """
+        Draws every queued page into the PDF in this process, closing each
+        figure as soon as it is saved.
+        """
+        self.pdf_object = PdfPages(path.exploratory_plots)
+        for page_number, (draw_method, kwargs) in enumerate(self.pages):
+            with span(draw_method, 'page', page=page_number):
+                getattr(self, draw_method)(**kwargs)
+                self.pdf_object.savefig()
+                plt.close('all')
+        self.pdf_object.close()
+    
+    
+    def render_pages(self):
+        """
+        Draws every queued page in worker processes, and merges the
+        single-page PDFs, in order, into the exploratory PDF.
+        """
+        try:
+            from PyPDF2 import PdfFileMerger
+        except ImportError:
+            PdfFileMerger = None
+        if PdfFileMerger is None or self.workers is None or self.workers <= 1:
+            self.render_pages_serially()
+            return
+        
+        from concurrent.futures import ProcessPoolExecutor
+        
+        page_directory = tempfile.mkdtemp()
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers,
+                                     initializer=start_page_worker,
+                                     initargs=(self.exploratory_df,
+                                               self.correlation_matrix,
+                                               tracer.enabled)) as executor:
+                rendered_pages = list(executor.map(render_page, range(len(self.pages)),
+                                                   self.pages,
+                                                   [page_directory] * len(self.pages)))
+            with span('merge pages', 'io'):
+                merger = PdfFileMerger()
+                for page_path, page_records in rendered_pages:
+                    tracer.add_records(page_records)
+                    merger.append(page_path)
+                merger.write(path.exploratory_plots)
+                merger.close()
+        finally:
+            shutil.rmtree(page_directory, ignore_errors=True)
         
         
-    def explore_dataset(self):
+    def explore_dataset(self, df=None):
         """
         Performs exploratory analysis on the final dataset.
+        
+        df: dataframe, the final dataset, with the 'Dates' column and
+        secondary features of the saved final dataset. If None, the saved
+        final dataset is read
         """
-        self.final_df_output = pd.read_json(path.data_final)
-        self.final_df_output.sort_index(inplace=True)
+        if df is None:
+            df = pd.read_json(path.data_final)
+        self.final_df_output = df.sort_index()
         end_date_condition = self.final_df_output['Dates'] <= self.end_date
         self.exploratory_df = self.final_df_output[end_date_condition]
+        with span('correlations'):
+            self.load_correlations()
         
         print('\nCreating exploratory plots...')
-        self.pdf_object = PdfPages(path.exploratory_plots)
+        self.pages = []
         print('\t|--Plotting "Positive Class" instances, for each Output Type...')
         self.plot_positive_class_counts()
         print('\t|--Plotting pairwise correlations, for each Output Type, by each Feature...')
@@ -184,9 +410,10 @@ class ExploratoryAnalysis:
         print('\t|--Plotting pairwise scatterplots, for each Output Type, by each Feature...')
         self.plot_feature_output_scatterplots()
         print('\t|--Plotting feature correlation heatmaps...')
-        self.plot_correlation_heatmaps()        
+        self.plot_correlation_heatmaps()
+        print('\t|--Rendering {} pages...'.format(len(self.pages)))
+        self.render_pages()
         print('Plots completed and saved to {}'.format(path.exploratory_plots))
-        self.pdf_object.close()
         
 #MIT License
 #
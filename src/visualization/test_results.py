@@ -9,6 +9,9 @@ import matplotlib.pyplot as plt
 from sklearn.metrics import log_loss
 
 import RecessionPredictor_paths as path
+from models.prediction_store import PredictionStore
+from src.utils.smoothing import exponential_smoother
+from src.utils.timing import span
 
 
 class TestResultPlots:
@@ -20,6 +23,15 @@ class TestResultPlots:
     def __init__(self):
         """
         prediction_names: used to re-label chart data
+        
+        average_method: how the Grand Average aggregates model outputs,
+        either 'mean', 'median' or 'trimmed_mean'
+        
+        trim_fraction: share of model outputs cut from each end, for
+        'trimmed_mean'
+        
+        excluded_models: names of models left out of the Grand Average.
+        Individual predictions can also be masked by setting them to NaN
         """
         self.pdf_object = ''
         self.prediction_names = {'Pred_Recession_within_6mo': 'Within 6 Months',
@@ -27,6 +39,9 @@ class TestResultPlots:
                                  'Pred_Recession_within_24mo': 'Within 24 Months',
                                  'True_Recession': 'Recession'}
         self.average_model = pd.DataFrame()
+        self.average_method = 'mean'
+        self.trim_fraction = 0.2
+        self.excluded_models = []
     
     
     def calculate_log_loss_weights(self, y_true):
@@ -52,44 +67,14 @@ class TestResultPlots:
         return(log_loss_weights)
     
     
-    def exponential_smoother(self, raw_data, half_life):
-        """
-        Purpose: performs exponential smoothing on "raw_data". Begins recursion
-        with the first data item (i.e. assumes that data in "raw_data" is listed
-        in chronological order).
-        
-        raw_data: iterable, the data to be smoothed
-        
-        half_life: float, the half-life for the smoother. The smoothing factor
-        (alpha) is calculated as alpha = 1 - exp(ln(0.5) / half_life)
-        """
-        import math
-        
-        raw_data = list(raw_data)
-        half_life = float(half_life)
-        
-        smoothing_factor = 1 - math.exp(math.log(0.5) / half_life)
-        smoothed_values = [raw_data[0]]
-        for index in range(1, len(raw_data)):
-            previous_smooth_value = smoothed_values[-1]
-            new_unsmooth_value = raw_data[index]
-            new_smooth_value = ((smoothing_factor * new_unsmooth_value)
-                + ((1 - smoothing_factor) * previous_smooth_value))
-            smoothed_values.append(new_smooth_value)
-        
-        return(smoothed_values)
-    
-    
     def exponential_conversion(self, dataframe):
         """
         Performs exponential smoothing on specific columns of the dataframe.
         """
-        dataframe['Within 6 Months'] = self.exponential_smoother(raw_data=dataframe['Within 6 Months'],
-                                                                 half_life=3)
-        dataframe['Within 12 Months'] = self.exponential_smoother(raw_data=dataframe['Within 12 Months'],
-                                                                  half_life=3)
-        dataframe['Within 24 Months'] = self.exponential_smoother(raw_data=dataframe['Within 24 Months'],
-                                                                  half_life=3)
+        smoothed_columns = ['Within 6 Months', 'Within 12 Months',
+                            'Within 24 Months']
+        dataframe[smoothed_columns] = exponential_smoother(raw_data=dataframe[smoothed_columns],
+                                                           half_life=3)
         return(dataframe)
     
     
@@ -107,93 +92,114 @@ class TestResultPlots:
         name = str(name)
         exponential = bool(exponential)
         
-        dataframe.rename(columns=self.prediction_names, inplace=True)
-        if exponential == True:
-            dataframe = self.exponential_conversion(dataframe=dataframe)
-        is_recession = dataframe['Recession'] == 1
-        is_not_recession = dataframe['Recession'] == 0
-        dataframe.loc[is_recession, 'Recession'] = 100
-        dataframe.loc[is_not_recession, 'Recession'] = -1
+        with span(name, 'page', exponential=exponential):
+            dataframe.rename(columns=self.prediction_names, inplace=True)
+            if exponential == True:
+                dataframe = self.exponential_conversion(dataframe=dataframe)
+            is_recession = dataframe['Recession'] == 1
+            is_not_recession = dataframe['Recession'] == 0
+            dataframe.loc[is_recession, 'Recession'] = 100
+            dataframe.loc[is_not_recession, 'Recession'] = -1
                 
-        log_loss_weights_6mo = self.calculate_log_loss_weights(y_true=dataframe['True_Recession_within_6mo'])
-        log_loss_weights_12mo = self.calculate_log_loss_weights(y_true=dataframe['True_Recession_within_12mo'])
-        log_loss_weights_24mo = self.calculate_log_loss_weights(y_true=dataframe['True_Recession_within_24mo'])
-        loss_6mo = log_loss(y_true=dataframe['True_Recession_within_6mo'],
-                            y_pred=dataframe['Within 6 Months'],
-                            sample_weight=log_loss_weights_6mo)
-        loss_12mo = log_loss(y_true=dataframe['True_Recession_within_12mo'],
-                             y_pred=dataframe['Within 12 Months'],
-                             sample_weight=log_loss_weights_12mo)
-        loss_24mo = log_loss(y_true=dataframe['True_Recession_within_24mo'],
-                             y_pred=dataframe['Within 24 Months'],
-                             sample_weight=log_loss_weights_24mo)
-        dataframe = dataframe[['Dates'] + list(self.prediction_names.values())]
+            log_loss_weights_6mo = self.calculate_log_loss_weights(y_true=dataframe['True_Recession_within_6mo'])
+            log_loss_weights_12mo = self.calculate_log_loss_weights(y_true=dataframe['True_Recession_within_12mo'])
+            log_loss_weights_24mo = self.calculate_log_loss_weights(y_true=dataframe['True_Recession_within_24mo'])
+            loss_6mo = log_loss(y_true=dataframe['True_Recession_within_6mo'],
+                                y_pred=dataframe['Within 6 Months'],
+                                sample_weight=log_loss_weights_6mo)
+            loss_12mo = log_loss(y_true=dataframe['True_Recession_within_12mo'],
+                                 y_pred=dataframe['Within 12 Months'],
+                                 sample_weight=log_loss_weights_12mo)
+            loss_24mo = log_loss(y_true=dataframe['True_Recession_within_24mo'],
+                                 y_pred=dataframe['Within 24 Months'],
+                                 sample_weight=log_loss_weights_24mo)
+            dataframe = dataframe[['Dates'] + list(self.prediction_names.values())]
         
-        chart_title = '{} | 6mo: {} | 12mo: {} | 24mo: {}'.format(name,
-                       round(loss_6mo, 3), round(loss_12mo, 3),
-                       round(loss_24mo, 3))
-        plt.figure(figsize=(15, 5))
-        plot = sns.lineplot(x='Dates', y='value', hue='variable',
-                            data=pd.melt(dataframe, ['Dates']))
-        plot.set_ylabel('Probability')
-        plot.set_title(chart_title, fontsize = 20)
-        plot.set_ylim((0, 1))
-        self.pdf_object.savefig()
+            chart_title = '{} | 6mo: {} | 12mo: {} | 24mo: {}'.format(name,
+                           round(loss_6mo, 3), round(loss_12mo, 3),
+                           round(loss_24mo, 3))
+            plt.figure(figsize=(15, 5))
+            plot = sns.lineplot(x='Dates', y='value', hue='variable',
+                                data=pd.melt(dataframe, ['Dates']))
+            plot.set_ylabel('Probability')
+            plot.set_title(chart_title, fontsize = 20)
+            plot.set_ylim((0, 1))
+            self.pdf_object.savefig()
+    
+    
+    def aggregate_model_outputs(self, stacked_outputs):
+        """
+        Aggregates a (models x rows x horizons) array of predictions across
+        models, ignoring masked (NaN) entries. Returns a (rows x horizons)
+        array.
+        
+        stacked_outputs: array, predictions of each model
+        """
+        import numpy as np
+        
+        if self.average_method == 'mean':
+            return(np.nanmean(stacked_outputs, axis=0))
+        if self.average_method == 'median':
+            return(np.nanmedian(stacked_outputs, axis=0))
+        if self.average_method == 'trimmed_mean':
+            # sorting moves masked entries to the end, so the kept entries of
+            # each (row, horizon) are those ranked in [cut, count - cut)
+            sorted_outputs = np.sort(stacked_outputs, axis=0)
+            counts = (~np.isnan(stacked_outputs)).sum(axis=0)
+            cuts = np.floor(counts * self.trim_fraction).astype(int)
+            ranks = np.arange(len(stacked_outputs))[:, None, None]
+            kept = (ranks >= cuts) & (ranks < counts - cuts)
+            return(np.where(kept, sorted_outputs, 0).sum(axis=0) / kept.sum(axis=0))
+        raise ValueError('Unknown average method: {}'.format(self.average_method))
     
     
     def average_model_outputs(self):
         """
-        Creates outputs for a Grand Average model by averaging across all
-        model outputs.
+        Creates outputs for a Grand Average model by aggregating across all
+        model outputs, as one (models x rows x horizons) array.
         """
-        from statistics import mean
+        import numpy as np
         
         self.average_model['Dates'] = self.knn_test_results['Dates']
         self.average_model['Recession'] = self.knn_test_results['True_Recession']
         self.average_model['True_Recession_within_6mo'] = self.knn_test_results['True_Recession_within_6mo']
         self.average_model['True_Recession_within_12mo'] = self.knn_test_results['True_Recession_within_12mo']
         self.average_model['True_Recession_within_24mo'] = self.knn_test_results['True_Recession_within_24mo']
-        model_outputs = [self.knn_test_results, self.elastic_net_test_results,
-                         self.naive_bayes_test_results, self.svm_test_results,
-                         self.gauss_test_results, self.xgboost_test_results]
-        average_6mo = []
-        average_12mo = []
-        average_24mo = []
-        for index in range(0, len(self.knn_test_results)):
-            outputs_6mo = []
-            outputs_12mo = []
-            outputs_24mo = []
-            for model in model_outputs:
-                outputs_6mo.append(model['Pred_Recession_within_6mo'][index])
-                outputs_12mo.append(model['Pred_Recession_within_12mo'][index])
-                outputs_24mo.append(model['Pred_Recession_within_24mo'][index])
-            average_6mo.append(mean(outputs_6mo))
-            average_12mo.append(mean(outputs_12mo))
-            average_24mo.append(mean(outputs_24mo))
+        model_outputs = {'KNN': self.knn_test_results,
+                         'Elastic_Net': self.elastic_net_test_results,
+                         'Naive_Bayes': self.naive_bayes_test_results,
+                         'SVM': self.svm_test_results,
+                         'Gaussian_Process': self.gauss_test_results,
+                         'XGBoost': self.xgboost_test_results}
+        prediction_columns = ['Pred_Recession_within_6mo',
+                              'Pred_Recession_within_12mo',
+                              'Pred_Recession_within_24mo']
+        stacked_outputs = np.stack([model_outputs[model_name][prediction_columns].to_numpy(dtype=float)
+                                    for model_name in model_outputs
+                                    if model_name not in self.excluded_models])
+        average_outputs = self.aggregate_model_outputs(stacked_outputs)
         
-        self.average_model['Within 6 Months'] = average_6mo
-        self.average_model['Within 12 Months'] = average_12mo
-        self.average_model['Within 24 Months'] = average_24mo
+        self.average_model['Within 6 Months'] = average_outputs[:, 0]
+        self.average_model['Within 12 Months'] = average_outputs[:, 1]
+        self.average_model['Within 24 Months'] = average_outputs[:, 2]
             
     
-    def plot_test_results(self):
+    def plot_test_results(self, prediction_store=None):
         """
         Loads test results for each model, and plots them all into a single PDF.
+        
+        prediction_store: PredictionStore handed over by the backtest. If
+        None, the saved store is memory-mapped
         """
-        self.knn_test_results = pd.read_json(path.knn_test_results)
-        self.knn_test_results.sort_index(inplace=True)
-        self.elastic_net_test_results = pd.read_json(path.elastic_net_test_results)
-        self.elastic_net_test_results.sort_index(inplace=True)
-        self.naive_bayes_test_results = pd.read_json(path.naive_bayes_test_results)
-        self.naive_bayes_test_results.sort_index(inplace=True)
-        self.svm_test_results = pd.read_json(path.svm_test_results)
-        self.svm_test_results.sort_index(inplace=True)
-        self.gauss_test_results = pd.read_json(path.gauss_test_results)
-        self.gauss_test_results.sort_index(inplace=True)
-        self.xgboost_test_results = pd.read_json(path.xgboost_test_results)
-        self.xgboost_test_results.sort_index(inplace=True)
-        self.weighted_average_test_results = pd.read_json(path.weighted_average_test_results)
-        self.weighted_average_test_results.sort_index(inplace=True)
+        if prediction_store is None:
+            prediction_store = PredictionStore().load(path.prediction_store)
+        self.knn_test_results = prediction_store.get_model_frame('KNN')
+        self.elastic_net_test_results = prediction_store.get_model_frame('Elastic_Net')
+        self.naive_bayes_test_results = prediction_store.get_model_frame('Naive_Bayes')
+        self.svm_test_results = prediction_store.get_model_frame('SVM')
+        self.gauss_test_results = prediction_store.get_model_frame('Gaussian_Process')
+        self.xgboost_test_results = prediction_store.get_model_frame('XGBoost')
+        self.weighted_average_test_results = prediction_store.get_model_frame('Weighted_Average')
         
         print('\nPlotting test results...')
         self.pdf_object = PdfPages(path.test_results_plots)
@@ -0,0 +1,43 @@
+"""
+Tests handing a final dataset over to the backtest in memory.
+"""
+from src.data.synthetic_dataset import SyntheticDataset
+from src.models.testing import Backtester
+
+
+def test_backtest_takes_over_final_dataset():
+    df = SyntheticDataset(seed=3).get_labelled_dataset(1)
+    backtester = Backtester()
+    backtester.persist = False
+    backtester.load_dataset(df)
+    
+    feature_store = backtester.feature_store
+    assert feature_store.get_row_count() == len(df)
+    assert feature_store.feature_names == backtester.feature_names
+    assert backtester.prefix_scaler.features.shape == (len(df), len(backtester.feature_names))
+    for test_dates in backtester.testing_dates.values():
+        assert len(feature_store.get_indices(test_dates['cv_start'], test_dates['cv_end'])) > 0
+        assert len(feature_store.get_indices(test_dates['pred_start'], test_dates['pred_end'])) > 0
+
+
+#MIT License
+#
+#Copyright (c) 2019 Terrence Zhang
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
\ No newline at end of file
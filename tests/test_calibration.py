@@ -0,0 +1,60 @@
+"""
+Tests that the SVM calibration hold-out holds both classes, and that
+calibrated probabilities keep the SVM's ranking without reaching 0 or 1.
+"""
+import numpy as np
+
+from models.calibration import CalibratedSVC, get_calibration_cutoff
+
+
+def get_recession_dataset():
+    """
+    Returns features and labels in chronological order, with positives in
+    two episodes, the last one ending 35% of the rows before the end.
+    """
+    random_state = np.random.RandomState(0)
+    y = np.zeros(200, dtype=np.int8)
+    y[40:60] = 1
+    y[110:130] = 1
+    X = random_state.normal(size=(200, 2)) + y[:, None] * 1.5
+    return(X, y)
+
+
+def test_calibration_cutoff_reaches_back_to_both_classes():
+    X, y = get_recession_dataset()
+    assert get_calibration_cutoff(y, 0.2) == 129
+    assert get_calibration_cutoff(y, 0.2, max_holdout_fraction=0.3) == 200
+    assert get_calibration_cutoff(np.zeros(50), 0.2) == 50
+
+
+def test_calibrated_probabilities_keep_ranking():
+    X, y = get_recession_dataset()
+    for method in ['sigmoid', 'isotonic']:
+        svm = CalibratedSVC(method=method, C=1.0, kernel='rbf', gamma='scale',
+                            random_state=0).fit(X, y)
+        positive_probs = svm.predict_proba(X)[:, 1]
+        assert ((positive_probs > 0) & (positive_probs < 1)).all()
+        assert positive_probs[y == 1].mean() > positive_probs[y == 0].mean()
+
+
+#MIT License
+#
+#Copyright (c) 2019 Terrence Zhang
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
\ No newline at end of file
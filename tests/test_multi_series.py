@@ -0,0 +1,76 @@
+"""
+Tests the multi-series deployment dataset, for series with different start
+dates, and that each series' artifacts are kept apart.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+import RecessionPredictor_paths as path
+from src.features.build_features_and_labels import FinalizeDataset
+from src.models.deployment import Deployer, MultiSeriesDeployer, get_artifact_paths
+
+
+def get_staggered_series():
+    """
+    Returns two series on one date index, filled as
+    MakeDataset.get_all_series_data fills them, where 'T10Y3M' starts 12
+    months after 'T10Y2Y'.
+    """
+    dates = pd.date_range('1976-06-01', periods=48, freq='MS')
+    data = pd.DataFrame({'T10Y2Y': np.linspace(1, 2, 48),
+                         'T10Y3M': np.r_[[np.nan] * 12, np.linspace(0, 1, 36)]},
+                        index=dates)
+    return(data.interpolate())
+
+
+def test_series_dataset_starts_at_first_observation():
+    data = get_staggered_series()
+    df = FinalizeDataset(data).create_multi_series_dataset(['T10Y2Y', 'T10Y3M'])
+    deployer = MultiSeriesDeployer(df, ['T10Y2Y', 'T10Y3M'])
+    
+    early_series = deployer.get_series_dataset('T10Y2Y')
+    late_series = deployer.get_series_dataset('T10Y3M')
+    assert len(early_series) == 48
+    assert len(late_series) == 36
+    assert late_series['T10Y3M'].notna().all()
+    assert late_series['date'].iloc[0] == pd.Timestamp('1977-06-01')
+    assert list(late_series.index) == list(range(36))
+
+
+def test_artifacts_are_selected_by_series(tmp_path, monkeypatch):
+    monkeypatch.setattr(path, 'deployment_artifacts', str(tmp_path))
+    default_path = Deployer(pd.DataFrame()).get_artifact_path('0123456789abcdef')
+    series_path = Deployer(pd.DataFrame(), series_key='T10Y3M').get_artifact_path('0123456789abcdef')
+    assert os.path.basename(default_path) == 'deployment_svm_0123456789abcdef.joblib'
+    assert os.path.basename(series_path) == 'deployment_svm_0123456789abcdef_T10Y3M.joblib'
+    for file_path in [default_path, series_path]:
+        open(file_path, 'wb').close()
+    
+    assert get_artifact_paths() == [default_path]
+    assert get_artifact_paths('T10Y3M') == [series_path]
+    assert get_artifact_paths('T10Y2Y') == []
+
+
+#MIT License
+#
+#Copyright (c) 2019 Terrence Zhang
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
\ No newline at end of file
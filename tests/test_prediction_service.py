@@ -0,0 +1,75 @@
+"""
+Tests that the prediction service keeps hot-reloading after it fails to read
+an artifact, e.g. one that is still being written.
+"""
+import asyncio
+
+import joblib
+import numpy as np
+from sklearn.preprocessing import StandardScaler
+from sklearn.naive_bayes import GaussianNB
+
+import RecessionPredictor_paths as path
+from src.models.prediction_service import PredictionService
+
+
+def save_artifact(file_path, version):
+    """
+    Saves a minimal deployment artifact of the default series.
+    """
+    X = np.arange(20, dtype=float).reshape(-1, 1)
+    y = (X[:, 0] > 9).astype(int)
+    scaler = StandardScaler().fit(X)
+    model = GaussianNB().fit(scaler.transform(X), y)
+    joblib.dump({'Version': version, 'Feature Names': ['10Y_Treasury_Rate'],
+                 'Fitted Models': {'Recession_in_12mo': {'SVM': {'Scaler': scaler,
+                                                                 'Model': model}}}},
+                file_path)
+
+
+def test_watcher_survives_unreadable_artifact(tmp_path, monkeypatch):
+    monkeypatch.setattr(path, 'deployment_artifacts', str(tmp_path))
+    artifact_path = str(tmp_path / 'deployment_svm_0123456789abcdef.joblib')
+    with open(artifact_path, 'wb') as file:
+        file.write(b'truncated')
+    
+    async def run_service():
+        service = PredictionService(port=0)
+        service.reload_interval = 0.01
+        await service.start()
+        await asyncio.sleep(0.05)
+        assert service.model is None and not service.watcher.done()
+        save_artifact(artifact_path, '0123456789abcdef')
+        for _ in range(200):
+            if service.model is not None:
+                break
+            await asyncio.sleep(0.01)
+        await service.shutdown()
+        return(service)
+    
+    service = asyncio.run(run_service())
+    assert service.artifact_version == '0123456789abcdef'
+    assert service.watcher is None
+
+
+#MIT License
+#
+#Copyright (c) 2019 Terrence Zhang
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
\ No newline at end of file
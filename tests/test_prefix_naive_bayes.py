@@ -0,0 +1,45 @@
+"""
+Tests that the prefix Naive Bayes model, like sklearn's GaussianNB, rejects
+labels that it was not fit on.
+"""
+import numpy as np
+import pytest
+
+from models.prefix_naive_bayes import PrefixGaussianNB
+
+
+def test_partial_fit_rejects_unseen_labels():
+    random_state = np.random.RandomState(0)
+    model = PrefixGaussianNB().fit(X=random_state.normal(size=(20, 2)),
+                                   y=np.zeros(20, dtype=np.int8))
+    
+    with pytest.raises(ValueError, match='do not exist in the initial classes'):
+        model.partial_fit(X=random_state.normal(size=(5, 2)),
+                          y=np.array([0, 0, 1, 0, 1], dtype=np.int8))
+    assert len(model.counts) == 21
+    
+    model.partial_fit(X=random_state.normal(size=(5, 2)), y=np.zeros(5, dtype=np.int8))
+    assert len(model.counts) == 26
+
+
+#MIT License
+#
+#Copyright (c) 2019 Terrence Zhang
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
\ No newline at end of file